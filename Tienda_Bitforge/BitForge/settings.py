@@ -123,3 +123,16 @@ LOGIN_URL = 'login'  # A dónde redirigir si no está logueado
 LOGIN_REDIRECT_URL = 'home'  # A dónde ir después de login
 LOGOUT_REDIRECT_URL = 'home'  # A dónde ir después de logout
 
+# Autocompletado de la búsqueda en vivo (índice en memoria por worker)
+AUTOCOMPLETADO_MEMORIA_MAX_MB = 64  # Si se supera, se usa la búsqueda full-text
+
+# Reservas de stock: minutos que se apartan las unidades al entrar al checkout
+RESERVA_STOCK_MINUTOS = 15
+
+# Exportaciones de reportes en segundo plano (csv.gz, jsonl.gz, parquet, npz)
+EXPORTACIONES_DIR = BASE_DIR / 'exportaciones'
+
+# Numeración de pedidos (Snowflake): id de worker 0-255 distinto por proceso.
+# Por defecto cada proceso toma un id libre de la tabla WorkerNumeracion (lease);
+# para fijarlo a mano (un solo proceso por id) usar esto o la variable BITFORGE_WORKER_ID.
+# PEDIDO_WORKER_ID = 0
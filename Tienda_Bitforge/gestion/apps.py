@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class GestionConfig(AppConfig):
     name = 'gestion'
+
+    def ready(self):
+        # Registrar señales (índices de búsqueda, etc.)
+        from . import signals  # noqa: F401
+        # Registrar las tareas en segundo plano (tareas_service.REGISTRO)
+        from . import tareas  # noqa: F401
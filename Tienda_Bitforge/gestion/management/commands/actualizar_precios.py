@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.services import precios_masivos_service
+
+
+class Command(BaseCommand):
+    help = 'Aplica una fluctuación de precios a los productos disponibles (UPDATE por lotes, con --simular para ver sin guardar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minimo', type=float, default=0.95, help='Factor mínimo (0.95 = -5%%)')
+        parser.add_argument('--maximo', type=float, default=1.05, help='Factor máximo (1.05 = +5%%)')
+        parser.add_argument('--semilla', type=int, default=None, help='Semilla para repetir la misma fluctuación')
+        parser.add_argument('--simular', action='store_true', help='Calcular los precios sin guardarlos')
+
+    def handle(self, *args, **options):
+        try:
+            resultado = precios_masivos_service.aplicar_fluctuacion(
+                options['minimo'], options['maximo'], simular=options['simular'], semilla=options['semilla']
+            )
+        except precios_masivos_service.ErrorPrecios as error:
+            raise CommandError(str(error))
+
+        for pid, antes, despues in resultado.muestra[:10]:
+            self.stdout.write(f'  Producto {pid}: {antes} -> {despues}')
+        accion = 'simulados (sin guardar)' if resultado.simulado else 'actualizados'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado.modificados} de {resultado.productos} precios {accion} en {resultado.segundos:.2f}s '
+            f'({resultado.filas_por_segundo:,.0f} filas/s)'
+        ))
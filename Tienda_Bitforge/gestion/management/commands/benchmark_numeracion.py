@@ -0,0 +1,68 @@
+"""
+Benchmark de throughput del generador de numero_pedido.
+
+Lanza N procesos (cada uno con su worker id) que generan números en paralelo:
+    python manage.py benchmark_numeracion --procesos 4 --cantidad 1000000
+
+Verifica que cada proceso produzca números estrictamente crecientes (únicos) y
+que no se repitan entre procesos (el worker id forma parte del número).
+"""
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.services.numeracion_service import GeneradorSnowflake, descomponer
+
+
+def _generar(worker_id, cantidad, formatear):
+    generador = GeneradorSnowflake(worker_id=worker_id)
+    siguiente = generador.siguiente if formatear else generador.siguiente_entero
+    inicio = time.perf_counter()
+    anterior = None
+    crecientes = True
+    for _ in range(cantidad):
+        actual = siguiente()
+        if anterior is not None and actual <= anterior:
+            crecientes = False
+        anterior = actual
+    segundos = time.perf_counter() - inicio
+    ultimo = anterior if formatear else f'BF{anterior:018d}'
+    return worker_id, segundos, crecientes, ultimo
+
+
+class Command(BaseCommand):
+    help = 'Mide cuántos números de pedido por segundo genera el generador Snowflake'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--cantidad', type=int, default=1_000_000, help='Números por proceso')
+        parser.add_argument('--enteros', action='store_true',
+                            help='Mide solo la generación del entero (sin formatear el texto BF...)')
+
+    def handle(self, *args, **options):
+        procesos = options['procesos']
+        cantidad = options['cantidad']
+        formatear = not options['enteros']
+        if not 1 <= procesos <= 256:
+            raise CommandError('--procesos debe estar entre 1 y 256 (un worker id por proceso)')
+
+        self.stdout.write(f'Generando {cantidad:,} números en cada uno de {procesos} procesos...')
+        inicio = time.perf_counter()
+        with multiprocessing.Pool(procesos) as pool:
+            resultados = pool.starmap(_generar, [(i, cantidad, formatear) for i in range(procesos)])
+        total_segundos = time.perf_counter() - inicio
+
+        for worker_id, segundos, crecientes, ultimo in resultados:
+            estado = 'ok' if crecientes else 'NO CRECIENTE'
+            self.stdout.write(
+                f'  worker {worker_id:3d}: {cantidad / segundos:>12,.0f} números/s  último={ultimo}  {estado}'
+            )
+            if not crecientes or descomponer(ultimo)[1] != worker_id:
+                raise CommandError(f'El worker {worker_id} generó números repetidos o desordenados')
+
+        total = cantidad * procesos
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total:,} números únicos en {total_segundos:.2f}s '
+            f'({total / total_segundos:,.0f} números/s en total, incluido el arranque de procesos)'
+        ))
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark de la cotización del carrito.
+
+Compara el cálculo anterior (traer los items con sus productos y sumar en Python)
+con precios_service (una consulta agregada) para carritos de distintos tamaños:
+    python manage.py benchmark_precios --tamanos 1 10 50 200 --repeticiones 200
+
+Los datos de prueba se crean dentro de una transacción que se revierte al final.
+"""
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion.models import CarritoItem, Categoria, Producto
+from gestion.services import precios_service
+
+
+def _subtotal_en_python(usuario):
+    items = CarritoItem.objects.filter(usuario=usuario).select_related('producto')
+    return sum(item.subtotal() for item in items)
+
+
+class Command(BaseCommand):
+    help = 'Mide la cotización del carrito (suma en Python vs consulta agregada)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[1, 10, 50, 200])
+        parser.add_argument('--repeticiones', type=int, default=200)
+
+    def _medir(self, funcion, repeticiones):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            resultado = funcion()
+        return (time.perf_counter() - inicio) / repeticiones * 1_000_000, resultado
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        self.stdout.write(f'{"items":>6} {"python µs":>11} {"agregado µs":>12} {"mejora":>7}')
+
+        with transaction.atomic():
+            categoria = Categoria.objects.create(nombre='Benchmark')
+            productos = Producto.objects.bulk_create([
+                Producto(nombre=f'Producto benchmark {i}', precio=Decimal('19.99') + i,
+                         stock=100, categoria=categoria)
+                for i in range(max(options['tamanos']))
+            ])
+
+            for tamano in options['tamanos']:
+                usuario = User.objects.create(username=f'benchmark_precios_{tamano}')
+                CarritoItem.objects.bulk_create([
+                    CarritoItem(usuario=usuario, producto=producto, cantidad=2)
+                    for producto in productos[:tamano]
+                ])
+
+                python_us, esperado = self._medir(lambda: _subtotal_en_python(usuario), repeticiones)
+                agregado_us, cotizacion = self._medir(
+                    lambda: precios_service.cotizar_carrito_usuario(usuario), repeticiones
+                )
+                if cotizacion.subtotal != esperado:
+                    raise AssertionError(f'Subtotales distintos: {cotizacion.subtotal} != {esperado}')
+                self.stdout.write(
+                    f'{tamano:6d} {python_us:11.1f} {agregado_us:12.1f} {python_us / agregado_us:6.1f}x'
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark terminado (datos de prueba revertidos)'))
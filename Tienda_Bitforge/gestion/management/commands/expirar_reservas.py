@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.services import reservas_service
+
+
+class Command(BaseCommand):
+    help = 'Borra las reservas de stock vencidas (ejecutar con cron cada minuto o con --cada)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=int, default=0,
+                            help='Repetir el barrido cada N segundos (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        while True:
+            eliminadas = reservas_service.expirar_reservas()
+            self.stdout.write(self.style.SUCCESS(f'✅ Reservas vencidas eliminadas: {eliminadas}'))
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
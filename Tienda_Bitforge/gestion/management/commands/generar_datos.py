@@ -0,0 +1,453 @@
+"""
+Generador de datos sintéticos a gran escala para pruebas de rendimiento.
+
+Ejemplo (≈1M de filas):
+    python manage.py generar_datos --productos 50000 --usuarios 20000 --pedidos 200000 --semilla 42
+
+Todo se inserta con bulk_create por lotes dentro de una transacción, y con la
+misma semilla se generan exactamente los mismos datos. Las filas llevan la
+semilla en emails, usuarios y códigos: volver a correr con una semilla ya
+cargada falla de entrada; con --limpiar se borran y se regeneran.
+"""
+import bisect
+import itertools
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from gestion.models import (
+    Producto, CarritoItem, Categoria, Proveedor,
+    Pedido, PedidoItem, Resena, ListaDeseos,
+    Cupon, PerfilUsuario, Devolucion, MovimientoStock, HistorialPrecio
+)
+from gestion.services import busqueda_service, autocompletado_service, validadores_service, ventas_service
+
+CATEGORIAS = [
+    ('Tarjetas Gráficas', 'GPU', (250, 1.0)),
+    ('Procesadores', 'CPU', (200, 0.8)),
+    ('Memoria RAM', 'RAM', (80, 0.6)),
+    ('Almacenamiento', 'SSD', (90, 0.7)),
+    ('Motherboards', 'MB', (180, 0.6)),
+    ('Fuentes de Poder', 'PSU', (90, 0.5)),
+    ('Gabinetes', 'Case', (80, 0.5)),
+    ('Refrigeración', 'Cooler', (60, 0.6)),
+    ('Monitores', 'Monitor', (250, 0.7)),
+    ('Periféricos', 'Periférico', (40, 0.8)),
+    ('Kits', 'Kit', (700, 0.4)),
+    ('PCs Armadas', 'PC', (1500, 0.4)),
+]
+
+MARCAS = ['NVIDIA', 'AMD', 'Intel', 'ASUS', 'MSI', 'Gigabyte', 'Corsair', 'Kingston',
+          'Samsung', 'WD', 'Seagate', 'Crucial', 'G.Skill', 'EVGA', 'NZXT', 'Cooler Master',
+          'Logitech', 'Razer', 'HyperX', 'BitForge']
+LINEAS = ['Pro', 'Ultra', 'Gaming', 'Elite', 'Titan', 'Phoenix', 'Nova', 'Storm', 'Vortex', 'Prime']
+CIUDADES = ['Guayaquil', 'Quito', 'Cuenca', 'Manta', 'Machala', 'Ambato', 'Loja', 'Portoviejo']
+ESTADOS_PEDIDO = ['pendiente', 'procesando', 'enviado', 'entregado', 'cancelado']
+PESOS_ESTADO = [10, 8, 12, 65, 5]
+ROLES = ['cliente', 'bodeguero', 'supervisor', 'admin']
+PESOS_ROL = [97, 1.5, 1, 0.5]
+MOTIVOS_DEVOLUCION = ['defectuoso', 'incorrecto', 'danado', 'no_satisface', 'otro']
+PESOS_CALIFICACION = [4, 5, 12, 35, 44]  # Sesgo real: la mayoría de reseñas son 4-5 estrellas
+
+
+class sin_auto_now_add:
+    """Desactiva auto_now_add para poder insertar fechas históricas con bulk_create"""
+
+    def __init__(self, *campos):
+        self.campos = campos
+
+    def __enter__(self):
+        for field in self.campos:
+            field.auto_now_add = False
+
+    def __exit__(self, *exc):
+        for field in self.campos:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos masivos (productos, usuarios, pedidos, reseñas...) para pruebas de rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=5000)
+        parser.add_argument('--proveedores', type=int, default=30)
+        parser.add_argument('--usuarios', type=int, default=2000)
+        parser.add_argument('--pedidos', type=int, default=20000)
+        parser.add_argument('--items-max', type=int, default=5, help='Máximo de items por pedido')
+        parser.add_argument('--resenas', type=int, default=10000)
+        parser.add_argument('--deseos', type=int, default=10000)
+        parser.add_argument('--carritos', type=int, default=500, help='Usuarios con carrito activo')
+        parser.add_argument('--cupones', type=int, default=50)
+        parser.add_argument('--devoluciones', type=float, default=3.0,
+                            help='Porcentaje de pedidos entregados con devolución')
+        parser.add_argument('--dias', type=int, default=365, help='Días de historia de pedidos')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help='Tamaño de lote de bulk_create')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Borra antes los datos ya generados con la misma semilla')
+
+    # ----------------------------------------
+    # Utilidades
+    # ----------------------------------------
+
+    def _bulk(self, modelo, objetos, etiqueta):
+        """Inserta un iterable de objetos en lotes y devuelve la lista creada (con ids)"""
+        inicio = time.perf_counter()
+        creados = []
+        lote = self.lote
+        it = iter(objetos)
+        while True:
+            bloque = list(itertools.islice(it, lote))
+            if not bloque:
+                break
+            creados.extend(modelo.objects.bulk_create(bloque, batch_size=lote))
+        segundos = time.perf_counter() - inicio
+        velocidad = len(creados) / segundos if segundos else 0
+        self.stdout.write(f'  {etiqueta}: {len(creados)} filas en {segundos:.1f}s ({velocidad:,.0f} filas/s)')
+        self.total_filas += len(creados)
+        return creados
+
+    def _fecha_historica(self):
+        """Fecha en los últimos N días con más tráfico reciente, en fin de semana y de noche"""
+        rng = self.rng
+        dias_atras = min(int(rng.expovariate(1 / (self.dias / 3))), self.dias - 1)
+        fecha = self.ahora - timedelta(days=dias_atras)
+        if fecha.weekday() < 5 and rng.random() < 0.2:
+            fecha += timedelta(days=5 - fecha.weekday())  # Empuja parte del tráfico al sábado
+        hora = int(rng.triangular(8, 23, 20))
+        fecha = fecha.replace(hour=hora, minute=rng.randrange(60), second=rng.randrange(60))
+        return min(fecha, self.ahora)
+
+    def _elegir_producto(self):
+        """Popularidad tipo Zipf: pocos productos concentran la mayoría de ventas"""
+        return self.productos[bisect.bisect_left(self.pesos_acumulados, self.rng.random() * self.pesos_acumulados[-1])]
+
+    # ----------------------------------------
+    # Datos de una semilla ya cargada
+    # ----------------------------------------
+
+    def _sinteticos(self):
+        """Querysets de las filas identificables de esta semilla (el resto cuelga de ellas)"""
+        return {
+            'usuarios': User.objects.filter(username__startswith=f'sint{self.semilla}_'),
+            'proveedores': Proveedor.objects.filter(email__startswith=f'proveedor{self.semilla}_'),
+            'cupones': Cupon.objects.filter(codigo__startswith=f'S{self.semilla}C'),
+            # Prefijo con semilla % 1000: otra semilla puede compartirlo
+            'pedidos': Pedido.objects.filter(numero_pedido__startswith=f'SY{self.semilla % 1000:03d}'),
+        }
+
+    def _limpiar(self):
+        """
+        Borra los datos de esta semilla. Los usuarios arrastran pedidos, reseñas,
+        deseos y carritos; los productos (todos con proveedor sintético)
+        arrastran kardex e historial. Las categorías se comparten y quedan.
+        """
+        sinteticos = self._sinteticos()
+        borrados = sinteticos['usuarios'].delete()[0]
+        borrados += Producto.objects.filter(proveedor__in=sinteticos['proveedores']).delete()[0]
+        borrados += sinteticos['proveedores'].delete()[0]
+        borrados += sinteticos['cupones'].delete()[0]
+        self.stdout.write(f'  Limpieza de la semilla {self.semilla}: {borrados} filas borradas')
+
+    def _verificar_libre(self):
+        existentes = [nombre for nombre, queryset in self._sinteticos().items() if queryset.exists()]
+        if existentes:
+            raise CommandError(
+                f'Ya hay datos sintéticos de la semilla {self.semilla} ({", ".join(existentes)}). '
+                'Use --limpiar para regenerarlos u otra --semilla'
+            )
+
+    # ----------------------------------------
+    # Generadores por entidad
+    # ----------------------------------------
+
+    def _generar_catalogo(self, num_productos, num_proveedores):
+        rng = self.rng
+        # Las categorías se reutilizan por nombre entre corridas y semillas
+        existentes = {}
+        for categoria in Categoria.objects.filter(nombre__in=[nombre for nombre, _, _ in CATEGORIAS]).order_by('id'):
+            existentes.setdefault(categoria.nombre, categoria)
+        nuevas = iter(self._bulk(Categoria, (
+            Categoria(nombre=nombre, descripcion=f'Productos de {nombre}', icono=prefijo.lower())
+            for nombre, prefijo, _ in CATEGORIAS if nombre not in existentes
+        ), 'Categorías'))
+        categorias = [existentes.get(nombre) or next(nuevas) for nombre, _, _ in CATEGORIAS]
+        proveedores = self._bulk(Proveedor, (
+            Proveedor(
+                nombre=f'{rng.choice(MARCAS)} Distribuidor {i}',
+                email=f'proveedor{self.semilla}_{i}@sintetico.bitforge.com',
+                telefono=f'09{rng.randrange(10**7, 10**8)}',
+                direccion=f'Av. {rng.choice(LINEAS)} {rng.randrange(1, 999)}, {rng.choice(CIUDADES)}',
+                activo=rng.random() > 0.1,
+            )
+            for i in range(num_proveedores)
+        ), 'Proveedores')
+
+        def producto(i):
+            categoria = rng.choice(categorias)
+            _, prefijo, (mediana, sigma) = CATEGORIAS[categorias.index(categoria)]
+            # Precio log-normal alrededor de la mediana de la categoría
+            precio = Decimal(str(round(max(5.0, rng.lognormvariate(math.log(mediana), sigma)), 2)))
+            # Stock: muchos con poco stock y algunos agotados
+            stock = 0 if rng.random() < 0.08 else min(int(rng.expovariate(1 / 15)), 500)
+            tipo = 'kit' if prefijo == 'Kit' else 'pc_armada' if prefijo == 'PC' else 'componente'
+            nombre = f'{rng.choice(MARCAS)} {prefijo} {rng.choice(LINEAS)} {rng.randrange(100, 9999)}'
+            return Producto(
+                nombre=nombre[:50],
+                descripcion=f'{nombre} - hardware de alto rendimiento, garantía {rng.choice([1, 2, 3])} años',
+                precio=precio,
+                stock=stock,
+                categoria=categoria,
+                proveedor=rng.choice(proveedores),
+                tipo=tipo,
+                disponible=rng.random() > 0.03,
+                fecha_creacion=self._fecha_historica(),
+            )
+
+        with sin_auto_now_add(Producto._meta.get_field('fecha_creacion')):
+            self.productos = self._bulk(Producto, (producto(i) for i in range(num_productos)), 'Productos')
+        # Kardex: el stock generado entra como movimiento inicial en la fecha de creación
+        self._bulk(MovimientoStock, (
+            MovimientoStock(producto=p, cantidad=p.stock, tipo='inicial', referencia='Datos sintéticos',
+                            fecha=p.fecha_creacion)
+            for p in self.productos if p.stock
+        ), 'Movimientos de stock')
+        self._bulk(HistorialPrecio, (
+            HistorialPrecio(producto=p, precio=p.precio, fecha=p.fecha_creacion, origen='inicial')
+            for p in self.productos
+        ), 'Historial de precios')
+
+        # Pesos Zipf (s=1.1) en orden aleatorio para la popularidad de ventas
+        orden = list(range(len(self.productos)))
+        rng.shuffle(orden)
+        pesos = [0.0] * len(orden)
+        for rango, idx in enumerate(orden, start=1):
+            pesos[idx] = 1 / rango ** 1.1
+        self.pesos_acumulados = list(itertools.accumulate(pesos))
+
+    def _generar_usuarios(self, num_usuarios):
+        rng = self.rng
+        password = make_password('bitforge1470')  # Un solo hash para todos (hashear 1M veces tomaría horas)
+        prefijo = f'sint{self.semilla}'
+
+        def usuario(i):
+            return User(
+                username=f'{prefijo}_{i}',
+                email=f'{prefijo}_{i}@sintetico.bitforge.com',
+                password=password,
+                first_name=rng.choice(['Ana', 'Luis', 'María', 'José', 'Carla', 'Pedro', 'Sofía', 'Diego']),
+                last_name=rng.choice(['Pérez', 'García', 'Mora', 'Vera', 'Castro', 'Zambrano', 'Torres']),
+                date_joined=self._fecha_historica(),
+            )
+
+        self.usuarios = self._bulk(User, (usuario(i) for i in range(num_usuarios)), 'Usuarios')
+        roles = rng.choices(ROLES, weights=PESOS_ROL, k=len(self.usuarios))
+        self._bulk(PerfilUsuario, (
+            PerfilUsuario(
+                usuario=user, rol=rol,
+                telefono=f'09{rng.randrange(10**7, 10**8)}',
+                ciudad=rng.choice(CIUDADES),
+                direccion=f'Calle {rng.randrange(1, 200)} y Av. {rng.choice(LINEAS)}',
+            )
+            for user, rol in zip(self.usuarios, roles)
+        ), 'Perfiles')
+        staff_ids = [user.id for user, rol in zip(self.usuarios, roles) if rol != 'cliente']
+        User.objects.filter(id__in=staff_ids).update(is_staff=True)
+        self.clientes = [user for user, rol in zip(self.usuarios, roles) if rol == 'cliente'] or self.usuarios
+        # Actividad tipo Pareto: algunos clientes compran mucho más que otros
+        self.pesos_clientes = list(itertools.accumulate(rng.paretovariate(1.5) for _ in self.clientes))
+
+    def _elegir_cliente(self):
+        return self.clientes[bisect.bisect_left(self.pesos_clientes, self.rng.random() * self.pesos_clientes[-1])]
+
+    def _pares_unicos(self, cantidad):
+        """Pares (usuario, producto) sin repetir, para modelos con unique_together"""
+        vistos = set()
+        intentos = 0
+        while len(vistos) < cantidad and intentos < cantidad * 5:
+            intentos += 1
+            par = (self._elegir_cliente(), self._elegir_producto())
+            clave = (par[0].id, par[1].id)
+            if clave not in vistos:
+                vistos.add(clave)
+                yield par
+
+    def _generar_cupones(self, num_cupones):
+        rng = self.rng
+        hoy = self.ahora.date()
+        self.cupones = self._bulk(Cupon, (
+            Cupon(
+                codigo=f'S{self.semilla}C{i}'[:20],
+                descripcion=f'Cupón sintético {i}',
+                descuento_porcentaje=rng.choice([5, 10, 15, 20, 25, 30]),
+                descuento_maximo=Decimal(rng.choice([50, 100, 200])) if rng.random() < 0.6 else None,
+                compra_minima=Decimal(rng.choice([0, 50, 100, 300])),
+                activo=rng.random() > 0.2,
+                fecha_expiracion=hoy + timedelta(days=rng.randrange(-90, 180)),
+                usos_maximos=rng.choice([50, 100, 500, 1000]),
+                usos_actuales=0,
+            )
+            for i in range(num_cupones)
+        ), 'Cupones')
+
+    def _generar_pedidos(self, num_pedidos, items_max):
+        rng = self.rng
+        pedidos = []
+        items_por_pedido = []
+
+        for i in range(num_pedidos):
+            user = self._elegir_cliente()
+            cantidad_items = min(1 + int(rng.expovariate(1 / 1.2)), items_max)
+            items = []
+            subtotal = Decimal('0')
+            # dict.fromkeys y no set: el orden no debe depender de los ids (misma semilla, mismos datos)
+            for producto in dict.fromkeys(self._elegir_producto() for _ in range(cantidad_items)):
+                cantidad = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                items.append((producto, cantidad))
+                subtotal += producto.precio * cantidad
+
+            cupon = None
+            descuento = Decimal('0')
+            if self.cupones and rng.random() < 0.15:
+                cupon = rng.choice(self.cupones)
+                descuento = (subtotal * cupon.descuento_porcentaje / 100).quantize(Decimal('0.01'))
+                if cupon.descuento_maximo and descuento > cupon.descuento_maximo:
+                    descuento = cupon.descuento_maximo
+
+            fecha = self._fecha_historica()
+            estado = rng.choices(ESTADOS_PEDIDO, weights=PESOS_ESTADO)[0]
+            # Los pedidos recientes todavía no llegaron
+            if (self.ahora - fecha).days < 3 and estado == 'entregado':
+                estado = rng.choice(['pendiente', 'procesando', 'enviado'])
+
+            pedidos.append(Pedido(
+                usuario=user,
+                numero_pedido=f'SY{self.semilla % 1000:03d}{i:011d}'[:20],
+                total=subtotal - descuento,
+                estado=estado,
+                nombre_completo=f'{user.first_name} {user.last_name}',
+                telefono=f'09{rng.randrange(10**7, 10**8)}',
+                direccion=f'Calle {rng.randrange(1, 200)}',
+                ciudad=rng.choice(CIUDADES),
+                fecha_pedido=fecha,
+                cupon_aplicado=cupon,
+                descuento_aplicado=descuento,
+            ))
+            items_por_pedido.append(items)
+
+        with sin_auto_now_add(Pedido._meta.get_field('fecha_pedido')):
+            self.pedidos = self._bulk(Pedido, pedidos, 'Pedidos')
+
+        self._bulk(PedidoItem, (
+            PedidoItem(
+                pedido=pedido, producto=producto, nombre_producto=producto.nombre,
+                cantidad=cantidad, precio_unitario=producto.precio,
+            )
+            for pedido, items in zip(self.pedidos, items_por_pedido)
+            for producto, cantidad in items
+        ), 'Items de pedido')
+
+        # Usos de cupones coherentes con los pedidos generados
+        usos = {}
+        for pedido in self.pedidos:
+            if pedido.cupon_aplicado_id:
+                usos[pedido.cupon_aplicado_id] = usos.get(pedido.cupon_aplicado_id, 0) + 1
+        for cupon in self.cupones:
+            cupon.usos_actuales = usos.get(cupon.id, 0)
+            cupon.usos_maximos = max(cupon.usos_maximos, cupon.usos_actuales)
+        Cupon.objects.bulk_update(self.cupones, ['usos_actuales', 'usos_maximos'], batch_size=self.lote)
+
+    def _generar_devoluciones(self, porcentaje):
+        rng = self.rng
+        entregados = [p for p in self.pedidos if p.estado == 'entregado']
+
+        def devolucion(pedido):
+            estado = rng.choices(['pendiente', 'aprobada', 'rechazada', 'completada'], weights=[20, 15, 25, 40])[0]
+            fecha = min(pedido.fecha_pedido + timedelta(days=rng.randint(3, 30)), self.ahora)
+            resuelta = estado != 'pendiente'
+            return Devolucion(
+                pedido=pedido,
+                usuario_id=pedido.usuario_id,
+                motivo=rng.choice(MOTIVOS_DEVOLUCION),
+                descripcion='El producto presentó fallas',
+                estado=estado,
+                respuesta_admin='Revisado por soporte' if resuelta else None,
+                monto_reembolso=pedido.total if estado in ('aprobada', 'completada') else None,
+                fecha_solicitud=fecha,
+                fecha_resolucion=fecha + timedelta(days=rng.randint(1, 7)) if resuelta else None,
+            )
+
+        with sin_auto_now_add(Devolucion._meta.get_field('fecha_solicitud')):
+            self._bulk(Devolucion, (
+                devolucion(p) for p in entregados if rng.random() * 100 < porcentaje
+            ), 'Devoluciones')
+
+    def _generar_interacciones(self, num_resenas, num_deseos, num_carritos):
+        rng = self.rng
+        titulos = ['Excelente', 'Muy bueno', 'Cumple', 'Regular', 'No lo recomiendo']
+
+        def resena(user, producto):
+            calificacion = rng.choices(range(1, 6), weights=PESOS_CALIFICACION)[0]
+            return Resena(
+                usuario=user, producto=producto, calificacion=calificacion,
+                titulo=titulos[5 - calificacion], comentario='Reseña generada para pruebas',
+                fecha=self._fecha_historica(),
+            )
+
+        with sin_auto_now_add(Resena._meta.get_field('fecha')):
+            self._bulk(Resena, (resena(u, p) for u, p in self._pares_unicos(num_resenas)), 'Reseñas')
+
+        self._bulk(ListaDeseos, (
+            ListaDeseos(usuario=u, producto=p) for u, p in self._pares_unicos(num_deseos)
+        ), 'Listas de deseos')
+
+        def carrito(user):
+            productos = dict.fromkeys(self._elegir_producto() for _ in range(rng.randint(1, 6)))
+            return [CarritoItem(usuario=user, producto=p, cantidad=rng.randint(1, 3)) for p in productos]
+
+        con_carrito = rng.sample(self.clientes, min(num_carritos, len(self.clientes)))
+        self._bulk(CarritoItem, (item for user in con_carrito for item in carrito(user)), 'Items de carrito')
+
+    def handle(self, *args, **options):
+        self.semilla = options['semilla']
+        self.rng = random.Random(self.semilla)
+        self.lote = options['lote']
+        self.dias = max(options['dias'], 1)
+        self.total_filas = 0
+        # Fecha de referencia truncada al día: misma semilla y mismo día -> mismos datos
+        self.ahora = timezone.now().replace(hour=23, minute=59, second=0, microsecond=0)
+
+        inicio = time.perf_counter()
+        self.stdout.write(f'Generando datos sintéticos (semilla={self.semilla}, lote={self.lote})...')
+
+        with transaction.atomic():
+            if options['limpiar']:
+                self._limpiar()
+            self._verificar_libre()
+            self._generar_catalogo(options['productos'], options['proveedores'])
+            self._generar_usuarios(options['usuarios'])
+            self._generar_cupones(options['cupones'])
+            self._generar_pedidos(options['pedidos'], options['items_max'])
+            self._generar_devoluciones(options['devoluciones'])
+            self._generar_interacciones(options['resenas'], options['deseos'], options['carritos'])
+
+        # bulk_create no dispara señales: reconstruir índices derivados
+        indexados = busqueda_service.reconstruir_indice()
+        autocompletado_service.marcar_catalogo_modificado()
+        validadores_service.registrar_cambio(*validadores_service.ENTIDADES, *validadores_service.ENTIDADES_REPORTES)
+        self.stdout.write(f'  Índice de búsqueda: {indexados} productos')
+        horas, filas_producto = ventas_service.reconstruir()
+        self.stdout.write(f'  Resumen de ventas: {horas} horas, {filas_producto} filas de producto por día')
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {self.total_filas:,} filas generadas en {segundos:.1f}s'
+        ))
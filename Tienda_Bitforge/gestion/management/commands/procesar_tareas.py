@@ -0,0 +1,98 @@
+"""
+Worker de la cola de tareas en segundo plano.
+
+    python manage.py procesar_tareas                      # 1 proceso, 2 hilos
+    python manage.py procesar_tareas --procesos 4 --hilos 2
+    python manage.py procesar_tareas --una-vez            # vacía la cola y termina (cron)
+
+Las tareas de red (importar desde APIs) aprovechan los hilos; las de CPU
+conviene repartirlas en procesos. Cada hilo usa su propia conexión a la BD.
+Con SQLite las escrituras se serializan: dos tareas que escriben a la vez
+pueden fallar con "database is locked" y se reintentan solas; en ese caso
+conviene un solo hilo.
+"""
+import multiprocessing
+import threading
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _ejecutar_hilos(hilos, intervalo, una_vez, detener):
+    from gestion.services import tareas_service
+
+    def trabajar():
+        try:
+            tareas_service.bucle_worker(intervalo=intervalo, una_vez=una_vez, detener=detener)
+        finally:
+            connections.close_all()
+
+    trabajadores = [threading.Thread(target=trabajar, daemon=True) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        # join con timeout para que Ctrl+C llegue al hilo principal
+        while trabajador.is_alive():
+            trabajador.join(0.5)
+
+
+def _proceso(hilos, intervalo, una_vez, detener):
+    """Punto de entrada de cada proceso hijo (con spawn hay que configurar Django de nuevo)"""
+    django.setup()
+    try:
+        _ejecutar_hilos(hilos, intervalo, una_vez, detener)
+    except KeyboardInterrupt:
+        detener.set()
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano encoladas desde el panel de staff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos worker')
+        parser.add_argument('--hilos', type=int, default=2, help='Hilos por proceso')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar lo pendiente y terminar')
+
+    def handle(self, *args, **options):
+        procesos = options['procesos']
+        hilos = options['hilos']
+        if procesos < 1 or hilos < 1:
+            raise CommandError('--procesos y --hilos deben ser al menos 1')
+        parametros = (hilos, options['intervalo'], options['una_vez'])
+
+        self.stdout.write(f'Procesando tareas con {procesos} proceso(s) x {hilos} hilo(s)... (Ctrl+C para salir)')
+        try:
+            if procesos == 1:
+                detener = threading.Event()
+                try:
+                    _ejecutar_hilos(*parametros, detener)
+                except KeyboardInterrupt:
+                    detener.set()
+                    raise
+            else:
+                detener = multiprocessing.Event()
+                # Los hijos de un fork no deben heredar las conexiones abiertas del padre
+                connections.close_all()
+                hijos = [
+                    multiprocessing.Process(target=_proceso, args=(*parametros, detener))
+                    for _ in range(procesos)
+                ]
+                for hijo in hijos:
+                    hijo.start()
+                try:
+                    for hijo in hijos:
+                        hijo.join()
+                except KeyboardInterrupt:
+                    detener.set()
+                    for hijo in hijos:
+                        hijo.join()
+                    raise
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('⏹️ Worker detenido'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('✅ Cola de tareas procesada'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from gestion.services import busqueda_service, autocompletado_service
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda full-text (FTS5) de productos'
+
+    def handle(self, *args, **options):
+        # Los workers reconstruyen también el autocompletado en su próxima búsqueda
+        autocompletado_service.marcar_catalogo_modificado()
+
+        if not busqueda_service.fts_disponible():
+            self.stdout.write(self.style.WARNING(
+                'El índice FTS5 no está disponible en esta base de datos; se usa búsqueda con icontains.'
+            ))
+            return
+
+        total = busqueda_service.reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f'✅ Índice de búsqueda reconstruido: {total} productos indexados'))
@@ -0,0 +1,42 @@
+"""
+Reconstruye los resúmenes de ventas (VentaHoraria y VentaDiariaProducto)
+desde el historial de pedidos, items y devoluciones.
+
+    python manage.py reconstruir_ventas                                    # Todo el historial
+    python manage.py reconstruir_ventas --desde 2025-01-01 --hasta 2025-01-31
+
+Usar después de importar pedidos con bulk_create o si los resúmenes se
+desincronizaron; en el día a día se mantienen solos (checkout, cancelaciones
+y devoluciones).
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.services import ventas_service, dashboard_service
+
+
+def _fecha(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise CommandError(f'Fecha inválida (usar AAAA-MM-DD): {texto}')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes de ventas por hora y por producto desde los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=_fecha, help='Primer día a reconstruir (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a reconstruir (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+
+        horas, productos = ventas_service.reconstruir(desde, hasta)
+        dashboard_service.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Resumen de ventas reconstruido: {horas} horas y {productos} filas de producto por día'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gestion.services import kardex_service
+
+
+class Command(BaseCommand):
+    help = 'Guarda la foto del stock de los productos con movimientos nuevos (ejecutar con cron, p. ej. cada noche)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help='Fotografiar todos los productos, tengan o no movimientos nuevos')
+
+    def handle(self, *args, **options):
+        total = kardex_service.tomar_fotos(solo_con_movimientos=not options['todos'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Fotos de stock guardadas: {total} productos'))
@@ -0,0 +1,42 @@
+# Índice de búsqueda full-text de productos (SQLite FTS5)
+
+from django.db import migrations, OperationalError
+
+
+def crear_indice_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS gestion_producto_fts USING fts5("
+                "nombre, descripcion, categoria, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            # SQLite compilado sin FTS5: la búsqueda usa icontains
+            return
+        cursor.execute(
+            "INSERT INTO gestion_producto_fts (rowid, nombre, descripcion, categoria) "
+            "SELECT p.id, p.nombre, COALESCE(p.descripcion, ''), COALESCE(c.nombre, '') "
+            "FROM gestion_producto p LEFT JOIN gestion_categoria c ON c.id = p.categoria_id"
+        )
+
+
+def eliminar_indice_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS gestion_producto_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0007_devolucion'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice_fts, eliminar_indice_fts),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0008_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', models.CharField(choices=[('producto', 'Producto'), ('resena', 'Reseña'), ('categoria', 'Categoría')], max_length=20, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('fecha_modificacion', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Marcas del Catálogo',
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_tarea'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['estado', 'fecha_solicitud', 'id'], name='gestion_dev_estado_1ae289_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devolucion',
+            index=models.Index(fields=['fecha_solicitud', 'id'], name='gestion_dev_fecha_s_ac339e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['estado', 'fecha_pedido', 'id'], name='gestion_ped_estado_73cc59_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', 'fecha_pedido', 'id'], name='gestion_ped_usuario_88db00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_pedido', 'id'], name='gestion_ped_fecha_p_09d42e_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0013_indices_listados_pedidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaHoraria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(unique=True)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('pedidos_cancelados', models.PositiveIntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('descuentos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('monto_cancelado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('reembolsos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Ventas por hora',
+                'ordering': ['hora'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('nombre_producto', models.CharField(max_length=100)),
+                ('unidades', models.IntegerField(default=0)),
+                ('ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='gestion.categoria')),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='gestion.producto')),
+            ],
+            options={
+                'verbose_name_plural': 'Ventas diarias por producto',
+                'ordering': ['-fecha'],
+                'unique_together': {('fecha', 'nombre_producto')},
+            },
+        ),
+    ]
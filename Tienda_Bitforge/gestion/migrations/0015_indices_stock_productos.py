@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_resumen_ventas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['stock', 'id'], name='gestion_pro_stock_8a3e62_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'stock', 'id'], name='gestion_pro_categor_c9fcbd_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_stock_inicial(apps, schema_editor):
+    # El kardex arranca con el stock actual de cada producto como movimiento inicial
+    Producto = apps.get_model('gestion', 'Producto')
+    MovimientoStock = apps.get_model('gestion', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create(
+        (MovimientoStock(producto_id=pid, cantidad=stock, tipo='inicial', referencia='Inicio del kardex')
+         for pid, stock in Producto.objects.exclude(stock=0).values_list('id', 'stock').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_indices_stock_productos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FotoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.BigIntegerField()),
+                ('ultimo_movimiento', models.BigIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fotos_stock', to='gestion.producto')),
+            ],
+            options={
+                'verbose_name_plural': 'Fotos de stock',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='gestion_fot_product_2a91c1_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cantidad', models.BigIntegerField()),
+                ('tipo', models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('cancelacion', 'Cancelación de pedido'), ('entrada', 'Entrada'), ('salida', 'Salida'), ('conteo', 'Conteo físico'), ('importacion', 'Importación'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('referencia', models.CharField(blank=True, max_length=100)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='gestion.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Movimientos de stock',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['producto', 'id'], name='gestion_mov_product_2e39c7_idx'), models.Index(fields=['producto', 'fecha'], name='gestion_mov_product_e1ea79_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_stock_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def registrar_precio_inicial(apps, schema_editor):
+    # Antes de esta migración no había historial y no se sabe desde cuándo rige el
+    # precio actual: no se lo fecha hacia atrás (precio_en() devolvería hoy el precio
+    # de antes). Los puntos anteriores salen de las ventas (precio_unitario con la
+    # fecha del pedido, uno cada vez que cambia) y el precio actual rige desde ahora.
+    # Antes de la primera venta de un producto no hay dato (precio_en no lo incluye).
+    Producto = apps.get_model('gestion', 'Producto')
+    PedidoItem = apps.get_model('gestion', 'PedidoItem')
+    HistorialPrecio = apps.get_model('gestion', 'HistorialPrecio')
+    ahora = django.utils.timezone.now()
+    ultimo_vendido = {}
+
+    def filas():
+        ventas = PedidoItem.objects.filter(producto__isnull=False).order_by(
+            'producto_id', 'pedido__fecha_pedido', 'id'
+        ).values_list('producto_id', 'precio_unitario', 'pedido__fecha_pedido')
+        for pid, precio, fecha in ventas.iterator(chunk_size=1000):
+            if ultimo_vendido.get(pid) != precio:
+                ultimo_vendido[pid] = precio
+                yield HistorialPrecio(producto_id=pid, precio=precio, fecha=min(fecha, ahora), origen='inicial')
+        for pid, precio in Producto.objects.values_list('id', 'precio').iterator(chunk_size=1000):
+            if ultimo_vendido.get(pid) != precio:
+                yield HistorialPrecio(producto_id=pid, precio=precio, fecha=ahora, origen='inicial')
+
+    HistorialPrecio.objects.bulk_create(filas(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_kardex_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialPrecio',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('origen', models.CharField(choices=[('inicial', 'Precio inicial'), ('edicion', 'Edición'), ('fluctuacion', 'Fluctuación de mercado'), ('importacion', 'Importación')], default='edicion', max_length=20)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historial_precios', to='gestion.producto')),
+            ],
+            options={
+                'verbose_name_plural': 'Historial de precios',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='gestion_his_product_3e246c_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_precio_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_historial_precios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='marcacatalogo',
+            name='entidad',
+            field=models.CharField(choices=[('producto', 'Producto'), ('resena', 'Reseña'), ('categoria', 'Categoría'), ('autocompletado', 'Autocompletado')], max_length=20, unique=True),
+        ),
+    ]
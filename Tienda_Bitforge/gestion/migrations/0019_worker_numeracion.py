@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_marca_autocompletado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerNumeracion',
+            fields=[
+                ('worker_id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('propietario', models.CharField(max_length=100)),
+                ('vence', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'Workers de Numeración',
+            },
+        ),
+    ]
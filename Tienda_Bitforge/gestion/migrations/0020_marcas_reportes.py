@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_worker_numeracion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='marcacatalogo',
+            name='entidad',
+            field=models.CharField(choices=[('producto', 'Producto'), ('resena', 'Reseña'), ('categoria', 'Categoría'), ('autocompletado', 'Autocompletado'), ('usuario', 'Usuario')], max_length=20, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['fecha_actualizacion'], name='gestion_ped_fecha_a_c5d21e_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0020_marcas_reportes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['fecha_creacion', 'id'], name='producto_cat_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['precio', 'id'], name='producto_cat_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['nombre', 'id'], name='producto_cat_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['categoria', 'fecha_creacion', 'id'], name='producto_cat_cfecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['categoria', 'precio', 'id'], name='producto_cat_cprecio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('disponible', True)), fields=['categoria', 'nombre', 'id'], name='producto_cat_cnombre_idx'),
+        ),
+    ]
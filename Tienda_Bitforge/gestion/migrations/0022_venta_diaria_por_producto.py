@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0021_indices_catalogo_keyset'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ventadiariaproducto',
+            unique_together={('fecha', 'producto')},
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User 
+from django.utils import timezone
 
 # Create your models here.
 
@@ -54,18 +55,74 @@ class Producto(models.Model):
     disponible = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True) #auto_now_add=True crea un campo que almacena la fecha y hora de creacion del objeto
 
+    # Stock desde el que un producto se considera "últimas unidades" (tienda, panel y bodega)
+    UMBRAL_BAJO_STOCK = 3
+
+    # Campos que usa el autocompletado en memoria (autocompletado_service)
+    CAMPOS_AUTOCOMPLETADO = ('nombre', 'descripcion', 'precio', 'imagen_url', 'disponible', 'categoria_id')
+
     def __str__(self):
         return f"{self.nombre} - {self.precio}"
 
+    def datos_autocompletado(self):
+        return tuple(self.__dict__.get(campo) for campo in self.CAMPOS_AUTOCOMPLETADO)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Stock leído de la BD: al guardar, el kardex registra la diferencia (signals)
+        instancia._stock_guardado = instancia.__dict__.get('stock')
+        # Precio leído de la BD: al guardar, el historial registra solo si cambió (signals)
+        instancia._precio_guardado = instancia.__dict__.get('precio')
+        # Campos del autocompletado: un save() que no los cambia no invalida el índice (signals)
+        instancia._autocompletado_guardado = instancia.datos_autocompletado()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or 'stock' in fields:
+            self._stock_guardado = self.__dict__.get('stock')
+        if fields is None or 'precio' in fields:
+            self._precio_guardado = self.__dict__.get('precio')
+        self._autocompletado_guardado = self.datos_autocompletado()
+
+    @property
+    def stock_disponible(self):
+        # stock menos reservas activas (lo asigna reservas_service.anotar_disponible)
+        return getattr(self, '_stock_disponible', self.stock)
+
+    @stock_disponible.setter
+    def stock_disponible(self, valor):
+        self._stock_disponible = valor
+
     def get_estado_stock(self):
         # para que se muestre el estado al cliente
-        if self.stock == 0:
+        if self.stock_disponible <= 0:
             return "Agotado"
-        elif self.stock <= 3:
+        elif self.stock_disponible <= self.UMBRAL_BAJO_STOCK:
             return "ultimas unidades"
         else:
             return "Disponible"
 
+    class Meta:
+        indexes = [
+            # Bodega: listado por stock paginado por cursor (stock + id)
+            models.Index(fields=['stock', 'id']),  # Todos los productos
+            models.Index(fields=['categoria', 'stock', 'id']),  # Filtrado por categoría
+            # Catálogo: un índice por orden de paginacion_service, parciales porque
+            # el catálogo siempre filtra disponible=True (en SQLite ese filtro es
+            # la columna sola y no sirve como prefijo de un índice)
+            models.Index(fields=['fecha_creacion', 'id'], condition=models.Q(disponible=True), name='producto_cat_fecha_idx'),
+            models.Index(fields=['precio', 'id'], condition=models.Q(disponible=True), name='producto_cat_precio_idx'),
+            models.Index(fields=['nombre', 'id'], condition=models.Q(disponible=True), name='producto_cat_nombre_idx'),
+            models.Index(fields=['categoria', 'fecha_creacion', 'id'], condition=models.Q(disponible=True),
+                         name='producto_cat_cfecha_idx'),  # Filtrado por categoría
+            models.Index(fields=['categoria', 'precio', 'id'], condition=models.Q(disponible=True),
+                         name='producto_cat_cprecio_idx'),
+            models.Index(fields=['categoria', 'nombre', 'id'], condition=models.Q(disponible=True),
+                         name='producto_cat_cnombre_idx'),
+        ]
+
 #modelo de solicitud
 class Solicitud(models.Model):
     #Estados de la solicitud
@@ -141,12 +198,19 @@ class Pedido(models.Model):
     class Meta:
         ordering = ['-fecha_pedido']
         verbose_name_plural = "Pedidos"
+        # Listados paginados por cursor (fecha_pedido + id), con y sin filtro
+        indexes = [
+            models.Index(fields=['estado', 'fecha_pedido', 'id']),  # Staff: pedidos por estado
+            models.Index(fields=['usuario', 'fecha_pedido', 'id']),  # Cliente: mis pedidos
+            models.Index(fields=['fecha_pedido', 'id']),  # Staff: todos los pedidos
+            models.Index(fields=['fecha_actualizacion']),  # Firma de los reportes: MAX sin recorrer la tabla
+        ]
     
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
-            import random
-            import string
-            self.numero_pedido = 'BF' + ''.join(random.choices(string.digits, k=8))
+            # Único sin consultar la BD (ms + worker + secuencia, ver numeracion_service)
+            from .services import numeracion_service
+            self.numero_pedido = numeracion_service.siguiente_numero()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -342,6 +406,233 @@ class Devolucion(models.Model):
     class Meta:
         ordering = ['-fecha_solicitud']
         verbose_name_plural = "Devoluciones"
+        indexes = [
+            models.Index(fields=['estado', 'fecha_solicitud', 'id']),  # Pendientes y filtros por estado
+            models.Index(fields=['fecha_solicitud', 'id']),  # Listado paginado del staff
+        ]
     
     def __str__(self):
         return f"Devolución #{self.id} - Pedido #{self.pedido.numero_pedido}"
+
+
+# Marca de cambios del catálogo (validadores ETag / Last-Modified)
+class MarcaCatalogo(models.Model):
+    ENTIDAD_CHOICES = [
+        ('producto', 'Producto'),
+        ('resena', 'Reseña'),
+        ('categoria', 'Categoría'),
+        ('autocompletado', 'Autocompletado'),  # Versión del índice en memoria de la búsqueda en vivo
+        ('usuario', 'Usuario'),  # Firma de los reportes exportados (username, email)
+    ]
+    
+    entidad = models.CharField(max_length=20, choices=ENTIDAD_CHOICES, unique=True)
+    version = models.PositiveBigIntegerField(default=0)  # Se incrementa en cada cambio
+    fecha_modificacion = models.DateTimeField()
+    
+    class Meta:
+        verbose_name_plural = "Marcas del Catálogo"
+    
+    def __str__(self):
+        return f"{self.entidad} v{self.version}"
+
+
+# Reserva temporal de stock (desde el checkout hasta el pago)
+class ReservaStock(models.Model):
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('usuario', 'producto')  # Una reserva por producto y usuario (se renueva)
+        indexes = [
+            models.Index(fields=['producto', 'expira']),  # Reservas activas de un producto
+            models.Index(fields=['expira']),  # Barrido de reservas vencidas
+        ]
+        verbose_name_plural = "Reservas de Stock"
+    
+    def __str__(self):
+        return f"{self.usuario.username} reserva {self.producto.nombre} x{self.cantidad}"
+
+
+# Clave de idempotencia del pago (un doble clic no crea dos pedidos)
+class ClaveIdempotencia(models.Model):
+    clave = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE)
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name_plural = "Claves de Idempotencia"
+    
+    def __str__(self):
+        return f"{self.clave} -> {self.pedido_id}"
+
+
+# Id de worker de la numeración de pedidos tomado por un proceso (ver numeracion_service)
+class WorkerNumeracion(models.Model):
+    worker_id = models.PositiveSmallIntegerField(primary_key=True)  # 0 a 255
+    propietario = models.CharField(max_length=100)  # host:pid:aleatorio del proceso
+    vence = models.DateTimeField()  # El proceso lo renueva; vencido, otro lo puede tomar
+    
+    class Meta:
+        verbose_name_plural = "Workers de Numeración"
+    
+    def __str__(self):
+        return f"Worker {self.worker_id} ({self.propietario})"
+
+
+# Tarea en segundo plano (cola en base de datos, ver tareas_service y procesar_tareas)
+class Tarea(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    tipo = models.CharField(max_length=50)  # Nombre registrado en gestion/tareas.py
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0 a 100
+    mensaje = models.TextField(blank=True)  # Último avance, resultado o error
+    resultado = models.JSONField(null=True, blank=True)
+    
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    disponible_desde = models.DateTimeField(default=timezone.now)  # Reintentos con espera exponencial
+    
+    # Worker que la está ejecutando y hasta cuándo (si se cae, otro la retoma)
+    worker = models.CharField(max_length=100, blank=True)
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True)
+    
+    creada_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),  # Próxima tarea a ejecutar
+        ]
+        verbose_name_plural = "Tareas"
+    
+    def __str__(self):
+        return f"Tarea #{self.id} {self.tipo} ({self.estado})"
+
+
+# Modelo de resumen de ventas por hora (lo mantiene ventas_service)
+class VentaHoraria(models.Model):
+    hora = models.DateTimeField(unique=True)  # Inicio de la hora (UTC)
+    pedidos = models.PositiveIntegerField(default=0)  # Creados en esa hora, incluidos los cancelados
+    pedidos_cancelados = models.PositiveIntegerField(default=0)
+    # Montos netos: los pedidos cancelados se restan de la hora en que se crearon
+    unidades = models.IntegerField(default=0)
+    ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    descuentos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    monto_cancelado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    reembolsos = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Devoluciones aprobadas
+    
+    class Meta:
+        ordering = ['hora']
+        verbose_name_plural = "Ventas por hora"
+    
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H:00} - {self.pedidos} pedidos, ${self.ventas}"
+
+
+# Modelo de resumen de ventas por día y producto (lo mantiene ventas_service)
+class VentaDiariaProducto(models.Model):
+    fecha = models.DateField()  # Día local del pedido
+    nombre_producto = models.CharField(max_length=100)  # Solo para mostrar (igual que PedidoItem)
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True, blank=True)
+    categoria = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True)
+    unidades = models.IntegerField(default=0)
+    ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        # La fila es del producto, no del nombre: dos productos con el mismo nombre no se mezclan.
+        # Las filas de productos eliminados quedan con producto NULL y se distinguen por nombre.
+        unique_together = ('fecha', 'producto')
+        ordering = ['-fecha']
+        verbose_name_plural = "Ventas diarias por producto"
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.nombre_producto} x{self.unidades}"
+
+
+# Modelo de movimiento de stock (kardex). Solo se agregan filas, nunca se editan.
+class MovimientoStock(models.Model):
+    TIPO_CHOICES = [
+        ('inicial', 'Stock inicial'),
+        ('venta', 'Venta'),
+        ('cancelacion', 'Cancelación de pedido'),
+        ('entrada', 'Entrada'),
+        ('salida', 'Salida'),
+        ('conteo', 'Conteo físico'),
+        ('importacion', 'Importación'),
+        ('ajuste', 'Ajuste'),
+    ]
+    id = models.BigAutoField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    cantidad = models.BigIntegerField()  # Positiva entra, negativa sale
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    referencia = models.CharField(max_length=100, blank=True)  # Pedido, solicitud, tarea...
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['producto', 'id']),  # Movimientos posteriores a una foto
+            models.Index(fields=['producto', 'fecha']),  # Kardex de un producto por fechas
+        ]
+        verbose_name_plural = "Movimientos de stock"
+    
+    def __str__(self):
+        return f"{self.producto_id} {self.cantidad:+d} ({self.tipo})"
+
+
+# Modelo de foto periódica del stock (kardex_service.tomar_fotos)
+class FotoStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='fotos_stock')
+    fecha = models.DateTimeField()
+    stock = models.BigIntegerField()
+    ultimo_movimiento = models.BigIntegerField(default=0)  # Id del último movimiento incluido
+    
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['producto', 'fecha']),  # Última foto antes de una fecha
+        ]
+        verbose_name_plural = "Fotos de stock"
+    
+    def __str__(self):
+        return f"{self.producto_id} = {self.stock} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+# Modelo de historial de precios: una fila por cambio real de precio (solo se agregan)
+class HistorialPrecio(models.Model):
+    ORIGEN_CHOICES = [
+        ('inicial', 'Precio inicial'),
+        ('edicion', 'Edición'),
+        ('fluctuacion', 'Fluctuación de mercado'),
+        ('importacion', 'Importación'),
+    ]
+    id = models.BigAutoField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='historial_precios')
+    precio = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha = models.DateTimeField(default=timezone.now)  # Desde cuándo rige el precio
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES, default='edicion')
+    
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['producto', 'fecha']),  # Precio vigente en una fecha y series por rango
+        ]
+        verbose_name_plural = "Historial de precios"
+    
+    def __str__(self):
+        return f"{self.producto_id} = {self.precio} ({self.fecha:%Y-%m-%d %H:%M})"
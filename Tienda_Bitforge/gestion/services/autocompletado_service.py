@@ -0,0 +1,300 @@
+"""
+Servicio de autocompletado en memoria para la búsqueda en vivo
+Cada worker construye (la primera vez que se usa) un índice de prefijos sobre
+las palabras del nombre, la descripción y la categoría de los productos
+disponibles y responde busqueda_ajax sin leer productos de la base de datos.
+
+- Se actualiza de forma incremental con las señales post_save/post_delete,
+  solo cuando cambia un campo indexado (no en los cambios de stock).
+- La versión del índice es la fila 'autocompletado' de MarcaCatalogo. Cada
+  worker la vuelve a leer como mucho cada TTL_VERSION segundos (las búsquedas
+  intermedias no tocan la base de datos): los cambios de otros procesos
+  (generar_datos, reconstruir_indice_busqueda, otros workers) se ven con ese
+  retraso; los del mismo proceso, en la búsqueda siguiente.
+- Las búsquedas leen el índice bajo su lock, el mismo con el que se aplican
+  los cambios incrementales (on_commit, desde otros hilos).
+- Si el índice supera el presupuesto de memoria se desactiva y la búsqueda
+  vuelve al índice full-text (busqueda_service).
+"""
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Fila de MarcaCatalogo con la versión del índice
+ENTIDAD = 'autocompletado'
+
+# Segundos durante los que un worker confía en la última versión leída
+TTL_VERSION = getattr(settings, 'AUTOCOMPLETADO_TTL_VERSION', 2)
+
+# Presupuesto de memoria aproximado por worker (MB)
+MEMORIA_MAX_MB = getattr(settings, 'AUTOCOMPLETADO_MEMORIA_MAX_MB', 64)
+
+# Costo aproximado en bytes de cada estructura (para el presupuesto)
+_BYTES_POR_PRODUCTO = 250
+_BYTES_POR_TOKEN = 90
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Gráficas' -> 'graficas'"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+class IndiceAutocompletado:
+    """Índice de prefijos por palabra: token -> ids de productos"""
+
+    def __init__(self, version):
+        self.version = version
+        self.productos = {}      # id -> (nombre, precio, imagen, nombre normalizado, tokens)
+        self.tokens = {}         # token -> set de ids
+        self.ordenados = []      # tokens ordenados para buscar prefijos con bisect
+        self.bytes_estimados = 0
+        self.excedido = False
+        self._lock = threading.Lock()  # Búsquedas contra cambios incrementales
+
+    def _costo(self, nombre, imagen, tokens):
+        return _BYTES_POR_PRODUCTO + 2 * len(nombre) + len(imagen) + _BYTES_POR_TOKEN * len(tokens)
+
+    def agregar(self, producto_id, nombre, precio, imagen, descripcion='', categoria=''):
+        self.quitar(producto_id)
+        imagen = imagen or ''
+        tokens = tuple(set(tokenizar(nombre)) | set(tokenizar(descripcion)) | set(tokenizar(categoria)))
+        self.productos[producto_id] = (nombre, str(precio), imagen, normalizar(nombre), tokens)
+        for token in tokens:
+            ids = self.tokens.get(token)
+            if ids is None:
+                ids = self.tokens[token] = set()
+                insort(self.ordenados, token)
+            ids.add(producto_id)
+        self.bytes_estimados += self._costo(nombre, imagen, tokens)
+        if self.bytes_estimados > MEMORIA_MAX_MB * 1024 * 1024:
+            self.excedido = True
+
+    def quitar(self, producto_id):
+        datos = self.productos.pop(producto_id, None)
+        if datos is None:
+            return
+        nombre, _, imagen, _, tokens = datos
+        for token in tokens:
+            ids = self.tokens.get(token)
+            if ids is None:
+                continue
+            ids.discard(producto_id)
+            if not ids:
+                del self.tokens[token]
+                pos = bisect_left(self.ordenados, token)
+                if pos < len(self.ordenados) and self.ordenados[pos] == token:
+                    del self.ordenados[pos]
+        self.bytes_estimados -= self._costo(nombre, imagen, tokens)
+
+    def aplicar(self, producto_id, datos):
+        """Cambio incremental bajo el lock: datos=None quita el producto"""
+        with self._lock:
+            if datos is None:
+                self.quitar(producto_id)
+            else:
+                self.agregar(producto_id, *datos)
+
+    def _ids_con_prefijo(self, prefijo):
+        ids = set()
+        pos = bisect_left(self.ordenados, prefijo)
+        while pos < len(self.ordenados) and self.ordenados[pos].startswith(prefijo):
+            ids |= self.tokens[self.ordenados[pos]]
+            pos += 1
+        return ids
+
+    def buscar(self, texto, limite=10):
+        """
+        Todas las palabras deben aparecer; la última se compara como prefijo.
+        Devuelve una lista de dicts listos para el JSON de busqueda_ajax.
+        """
+        terminos = tokenizar(texto)
+        if not terminos:
+            return []
+
+        # Foto de los candidatos bajo el lock; el orden se calcula fuera
+        with self._lock:
+            candidatos = None
+            # Primero los términos completos (conjuntos más pequeños), luego el prefijo
+            for termino in terminos[:-1]:
+                ids = self.tokens.get(termino, set())
+                candidatos = set(ids) if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+            ids = self._ids_con_prefijo(terminos[-1])
+            candidatos = ids if candidatos is None else candidatos & ids
+            filas = [(pid, self.productos[pid]) for pid in candidatos]
+
+        consulta = normalizar(texto).strip()
+
+        def relevancia(fila):
+            # Primero los que coinciden en el nombre, después por descripción o categoría
+            nombre_normalizado = fila[1][3]
+            return (
+                not nombre_normalizado.startswith(consulta),
+                consulta not in nombre_normalizado,
+                len(nombre_normalizado),
+                nombre_normalizado,
+            )
+
+        resultados = []
+        for pid, (nombre, precio, imagen, _, _) in sorted(filas, key=relevancia)[:limite]:
+            resultados.append({'id': pid, 'nombre': nombre, 'precio': precio, 'imagen': imagen})
+        return resultados
+
+
+_indice = None
+_lock = threading.Lock()
+_version_leida = None  # (versión, time.monotonic() de la lectura)
+
+
+def version_catalogo():
+    """
+    Versión compartida del índice: (version, fecha) de la fila 'autocompletado'
+    de MarcaCatalogo, o (0, None) si todavía no hubo cambios. La fecha distingue
+    una base recreada (flush, tests) que vuelve a empezar desde la versión 0.
+    """
+    from ..models import MarcaCatalogo
+
+    return MarcaCatalogo.objects.filter(entidad=ENTIDAD).values_list('version', 'fecha_modificacion').first() or (0, None)
+
+
+def _version_vigente():
+    """version_catalogo() leída como mucho una vez cada TTL_VERSION segundos por worker"""
+    global _version_leida
+    leida = _version_leida
+    ahora = time.monotonic()
+    if leida is None or ahora - leida[1] >= TTL_VERSION:
+        leida = _version_leida = (version_catalogo(), ahora)
+    return leida[0]
+
+
+def olvidar_version():
+    """La próxima búsqueda vuelve a leer la versión de la base de datos"""
+    global _version_leida
+    _version_leida = None
+
+
+def marcar_catalogo_modificado():
+    """
+    Incrementa la versión del índice en la base de datos (dentro de la
+    transacción actual: si se revierte, la versión tampoco cambia). Usar también
+    después de cambios masivos de nombre, precio, imagen o disponibilidad
+    (update/bulk_create) que no disparan señales.
+
+    Returns:
+        Tupla (versión anterior, versión nueva)
+    """
+    from ..models import MarcaCatalogo
+
+    # Este proceso ve su propio cambio sin esperar el TTL (si se revierte,
+    # solo cuesta una lectura de más)
+    olvidar_version()
+    ahora = timezone.now()
+    with transaction.atomic(savepoint=False):
+        marca = MarcaCatalogo.objects.select_for_update().filter(entidad=ENTIDAD).first()
+        if marca is None:
+            marca, creada = MarcaCatalogo.objects.get_or_create(
+                entidad=ENTIDAD, defaults={'version': 1, 'fecha_modificacion': ahora}
+            )
+            if creada:
+                return (0, None), (1, ahora)
+            marca = MarcaCatalogo.objects.select_for_update().get(id=marca.id)
+        anterior = (marca.version, marca.fecha_modificacion)
+        MarcaCatalogo.objects.filter(id=marca.id).update(version=marca.version + 1, fecha_modificacion=ahora)
+    return anterior, (marca.version + 1, ahora)
+
+
+def construir_indice(version):
+    """Construye el índice completo desde la base de datos"""
+    from ..models import Producto
+
+    indice = IndiceAutocompletado(version)
+    filas = Producto.objects.filter(disponible=True).values_list(
+        'id', 'nombre', 'precio', 'imagen_url', 'descripcion', 'categoria__nombre'
+    ).iterator(chunk_size=2000)
+    for producto_id, nombre, precio, imagen, descripcion, categoria in filas:
+        indice.agregar(producto_id, nombre, precio, imagen, descripcion, categoria)
+        if indice.excedido:
+            # Sobre el presupuesto: liberar memoria y usar búsqueda full-text
+            indice.productos, indice.tokens, indice.ordenados = {}, {}, []
+            break
+    return indice
+
+
+def obtener_indice():
+    """Devuelve el índice vigente del worker, reconstruyéndolo si quedó desactualizado"""
+    global _indice
+    version = _version_vigente()
+    indice = _indice
+    # Un índice que superó el presupuesto no se reintenta hasta reiniciar el worker
+    if indice is not None and (indice.excedido or indice.version == version):
+        return indice
+    with _lock:
+        if _indice is None or not (_indice.excedido or _indice.version == version):
+            _indice = construir_indice(version)
+        return _indice
+
+
+def buscar(texto, limite=10):
+    """
+    Autocompletado sin consultas a la base de datos.
+    Devuelve None si el índice está desactivado por memoria (usar busqueda_service).
+    """
+    indice = obtener_indice()
+    if indice.excedido:
+        return None
+    return indice.buscar(texto, limite)
+
+
+def _aplicar_cambio(anterior, nueva, producto_id, datos):
+    with _lock:
+        indice = _indice
+        # Solo se aplica en incremental si este worker no se perdió cambios intermedios;
+        # si no, la próxima búsqueda lo reconstruye completo
+        if indice is None or indice.excedido or indice.version != anterior:
+            return
+        indice.aplicar(producto_id, datos)
+        if not indice.excedido:
+            indice.version = nueva
+
+
+def actualizar_producto(producto, creado=False):
+    """
+    Registra un alta/cambio de producto (llamado desde señales).
+    Si no cambió ningún campo indexado (Producto.CAMPOS_AUTOCOMPLETADO, p. ej.
+    un cambio de stock) no hace nada.
+    La versión se incrementa en la misma transacción; el cambio se aplica al
+    índice local solo si la transacción confirma.
+    """
+    actuales = producto.datos_autocompletado()
+    guardado = None if creado else getattr(producto, '_autocompletado_guardado', None)
+    if actuales == guardado:
+        return
+    producto._autocompletado_guardado = actuales
+    estaba_disponible = guardado is not None and guardado[producto.CAMPOS_AUTOCOMPLETADO.index('disponible')]
+    if not producto.disponible and (creado or (guardado is not None and not estaba_disponible)):
+        return  # No disponible antes ni ahora: no está en el índice
+    anterior, nueva = marcar_catalogo_modificado()
+    if producto.disponible:
+        categoria = producto.categoria.nombre if producto.categoria_id else ''
+        datos = (producto.nombre, producto.precio, producto.imagen_url, producto.descripcion, categoria)
+    else:
+        datos = None
+    transaction.on_commit(lambda: _aplicar_cambio(anterior, nueva, producto.id, datos))
+
+
+def eliminar_producto(producto_id):
+    """Registra la eliminación de un producto (llamado desde señales)"""
+    anterior, nueva = marcar_catalogo_modificado()
+    transaction.on_commit(lambda: _aplicar_cambio(anterior, nueva, producto_id, None))
@@ -0,0 +1,157 @@
+"""
+Servicio de búsqueda full-text para BitForge
+Usa una tabla virtual FTS5 de SQLite (gestion_producto_fts) sobre el nombre,
+la descripción y el nombre de la categoría del producto. El rowid de la tabla
+es el id del producto. Se mantiene sincronizada con las señales de gestion/signals.py.
+Si la base de datos no es SQLite o no tiene FTS5, se usa icontains como antes.
+"""
+import re
+
+from django.db import connection, OperationalError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+TABLA_FTS = 'gestion_producto_fts'
+
+# Pesos bm25 por columna: nombre, descripcion, categoria
+PESOS_BM25 = (10.0, 1.0, 3.0)
+
+MAX_TERMINOS = 8
+
+_fts_disponible = None
+
+
+def fts_disponible():
+    """Indica si el índice FTS5 existe en la base de datos actual (se cachea por proceso)"""
+    global _fts_disponible
+    if _fts_disponible is None:
+        if connection.vendor != 'sqlite':
+            _fts_disponible = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABLA_FTS]
+                )
+                _fts_disponible = cursor.fetchone() is not None
+    return _fts_disponible
+
+
+def construir_consulta(texto):
+    """
+    Convierte el texto del usuario en una expresión MATCH segura.
+    Todos los términos deben aparecer; el último se busca como prefijo
+    ("rtx 40" -> "rtx" "40"*) porque es el que el usuario sigue escribiendo.
+    Devuelve None si no hay términos válidos.
+    """
+    terminos = re.findall(r'\w+', (texto or '').lower())[:MAX_TERMINOS]
+    if not terminos:
+        return None
+    partes = [f'"{t}"' for t in terminos[:-1]]
+    partes.append(f'"{terminos[-1]}"*')
+    return ' '.join(partes)
+
+
+def _filtro_icontains(texto):
+    return Q(nombre__icontains=texto) | Q(descripcion__icontains=texto)
+
+
+def buscar_productos(texto, limite=10):
+    """
+    Busca productos disponibles ordenados por relevancia (bm25).
+    Una sola consulta: el índice FTS5 unido con gestion_producto.
+    """
+    from ..models import Producto
+
+    if not fts_disponible():
+        return list(Producto.objects.filter(_filtro_icontains(texto), disponible=True)[:limite])
+
+    consulta = construir_consulta(texto)
+    if not consulta:
+        return []
+
+    pesos = ', '.join(str(p) for p in PESOS_BM25)
+    sql = (
+        f'SELECT p.* FROM gestion_producto p '
+        f'JOIN {TABLA_FTS} ON {TABLA_FTS}.rowid = p.id '
+        f'WHERE {TABLA_FTS} MATCH %s AND p.disponible '
+        f'ORDER BY bm25({TABLA_FTS}, {pesos}) LIMIT %s'
+    )
+    try:
+        return list(Producto.objects.raw(sql, [consulta, limite]))
+    except OperationalError:
+        # Expresión que FTS5 no pudo interpretar: sin resultados en vez de error 500
+        return []
+
+
+def filtrar_queryset(queryset, texto):
+    """Restringe un queryset de productos a los que coinciden con el texto (sin alterar su orden)"""
+    if not fts_disponible():
+        return queryset.filter(nombre__icontains=texto)
+
+    consulta = construir_consulta(texto)
+    if not consulta:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta]
+    ))
+
+
+# ============================================
+# MANTENIMIENTO DEL ÍNDICE
+# ============================================
+
+_SQL_INSERTAR = (
+    f'INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria) '
+    f'SELECT p.id, p.nombre, COALESCE(p.descripcion, \'\'), COALESCE(c.nombre, \'\') '
+    f'FROM gestion_producto p LEFT JOIN gestion_categoria c ON c.id = p.categoria_id'
+)
+
+
+def indexar_producto(producto):
+    """Inserta o reemplaza un producto en el índice"""
+    if not fts_disponible():
+        return
+    categoria = producto.categoria.nombre if producto.categoria_id else ''
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [producto.id])
+        cursor.execute(
+            f'INSERT INTO {TABLA_FTS} (rowid, nombre, descripcion, categoria) VALUES (%s, %s, %s, %s)',
+            [producto.id, producto.nombre, producto.descripcion or '', categoria]
+        )
+
+
+def eliminar_producto(producto_id):
+    """Quita un producto del índice"""
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS} WHERE rowid = %s', [producto_id])
+
+
+def reindexar_categoria(categoria_id):
+    """Reindexa todos los productos de una categoría (p. ej. cuando cambia su nombre)"""
+    if not fts_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLA_FTS} WHERE rowid IN '
+            f'(SELECT id FROM gestion_producto WHERE categoria_id = %s)', [categoria_id]
+        )
+        cursor.execute(f'{_SQL_INSERTAR} WHERE p.categoria_id = %s', [categoria_id])
+
+
+def reconstruir_indice():
+    """
+    Reconstruye el índice completo desde gestion_producto y lo optimiza.
+
+    Returns:
+        Cantidad de productos indexados
+    """
+    if not fts_disponible():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA_FTS}')
+        cursor.execute(_SQL_INSERTAR)
+        cursor.execute(f"INSERT INTO {TABLA_FTS} ({TABLA_FTS}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {TABLA_FTS}')
+        return cursor.fetchone()[0]
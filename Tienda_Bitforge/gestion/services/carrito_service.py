@@ -0,0 +1,51 @@
+"""
+Servicio de carrito para BitForge
+Unifica el carrito de usuarios autenticados (modelo CarritoItem) y el de
+invitados (request.session['carrito'] = {producto_id: cantidad}).
+El carrito de sesión se resuelve con UNA consulta (in_bulk) sin importar
+cuántas líneas tenga, en items livianos con la misma interfaz que CarritoItem.
+"""
+from ..models import Producto, CarritoItem
+
+
+class ItemCarritoSesion:
+    """Línea del carrito de invitado: misma interfaz que CarritoItem (producto, cantidad, subtotal())"""
+    __slots__ = ('id', 'producto', 'cantidad')
+
+    def __init__(self, producto, cantidad):
+        self.id = producto.id  # En la sesión las líneas se identifican por producto
+        self.producto = producto
+        self.cantidad = cantidad
+
+    def subtotal(self):
+        return self.producto.precio * self.cantidad
+
+
+def items_sesion(carrito_sesion):
+    """
+    Resuelve el carrito de sesión en una sola consulta.
+    Las líneas cuyo producto ya no existe (o con id inválido) se omiten.
+    """
+    lineas = []
+    for producto_id, cantidad in carrito_sesion.items():
+        try:
+            lineas.append((int(producto_id), int(cantidad)))
+        except (TypeError, ValueError):
+            continue
+    if not lineas:
+        return []
+
+    productos = Producto.objects.in_bulk([producto_id for producto_id, _ in lineas])
+    return [
+        ItemCarritoSesion(productos[producto_id], cantidad)
+        for producto_id, cantidad in lineas
+        if producto_id in productos
+    ]
+
+
+def obtener_items(request):
+    """Items del carrito del usuario actual (autenticado o invitado)"""
+    if request.user.is_authenticated:
+        return list(CarritoItem.objects.filter(usuario=request.user).select_related('producto'))
+    return items_sesion(request.session.get('carrito', {}))
+
@@ -0,0 +1,156 @@
+"""
+Servicio de checkout para BitForge
+Convierte el carrito en un pedido dentro de UNA transacción, con una cantidad
+de consultas constante sin importar cuántos productos tenga el carrito:
+
+1. Carrito + productos (select_related) y cotización sobre esos mismos precios
+2. Descuento de stock en un solo UPDATE condicional (stock >= cantidad + lo que
+   reservaron otros clientes, por fila); si alguna fila no se actualizó, otro
+   comprador se llevó las unidades y se revierte todo
+3. Uso del cupón con un incremento atómico (usos_actuales < usos_maximos)
+4. Pedido + PedidoItem con bulk_create
+5. Resumen de ventas (ventas_service) con incrementos F(), sin releer el pedido,
+   y movimientos de venta del kardex con un bulk_create
+6. Vaciado del carrito y liberación de sus reservas con un DELETE cada uno
+
+Idempotencia: el formulario del checkout trae una clave única. Lo primero que
+hace la transacción es insertar esa clave (índice UNIQUE); un reintento con la
+misma clave choca con el índice (o espera a que termine el primero) y devuelve
+el pedido ya creado sin volver a cotizar, descontar stock ni usar el cupón.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, When
+
+from ..models import Producto, CarritoItem, Cupon, Pedido, PedidoItem, ClaveIdempotencia
+from . import precios_service, validadores_service, reservas_service, dashboard_service, ventas_service, kardex_service
+
+
+class ErrorCheckout(Exception):
+    """Error de negocio del checkout (el mensaje se muestra al cliente)"""
+
+
+def _descontar_stock(usuario, items):
+    """Descuenta el stock de todas las líneas en un UPDATE; devuelve True si alcanzó para todas"""
+    # Las reservas vigentes de otros clientes no se pueden vender
+    reservado = reservas_service.reservado_por_otros(usuario)
+    guarda = Q()
+    for item in items:
+        guarda |= Q(id=item.producto_id, stock__gte=reservado + item.cantidad)
+    actualizados = Producto.objects.filter(guarda).update(stock=Case(
+        *[When(id=item.producto_id, then=F('stock') - item.cantidad) for item in items],
+        default=F('stock'),
+        output_field=Producto._meta.get_field('stock'),
+    ))
+    return actualizados == len(items)
+
+
+def _producto_sin_stock(usuario, items):
+    """Primer producto del carrito que ya no tiene stock suficiente (para el mensaje de error)"""
+    disponible = dict(
+        Producto.objects.filter(id__in=[i.producto_id for i in items])
+        .annotate(libre=F('stock') - reservas_service.reservado_por_otros(usuario))
+        .values_list('id', 'libre')
+    )
+    for item in items:
+        if disponible.get(item.producto_id, 0) < item.cantidad:
+            return item.producto.nombre
+    return None
+
+
+def _usar_cupon(cupon):
+    """Incrementa los usos del cupón solo si todavía le quedan (atómico frente a compras simultáneas)"""
+    return Cupon.objects.filter(
+        id=cupon.id, activo=True, usos_actuales__lt=F('usos_maximos')
+    ).update(usos_actuales=F('usos_actuales') + 1) == 1
+
+
+def pedido_de_clave(usuario, clave):
+    """Id del pedido ya creado con esta clave de idempotencia (o None). Una consulta."""
+    if not clave:
+        return None
+    return ClaveIdempotencia.objects.filter(
+        clave=clave, usuario=usuario, pedido__isnull=False
+    ).values_list('pedido_id', flat=True).first()
+
+
+def procesar_pedido(usuario, datos_envio, cupon=None, clave=None):
+    """
+    Crea el pedido del carrito del usuario.
+
+    Args:
+        usuario: Usuario autenticado dueño del carrito
+        datos_envio: Dict con nombre_completo, telefono, direccion, ciudad y notas
+        cupon: Cupón de la sesión (o None); solo se usa si aplica a la cotización
+        clave: Clave de idempotencia del formulario (opcional)
+
+    Returns:
+        El Pedido creado (o el que ya se había creado con la misma clave)
+
+    Raises:
+        ErrorCheckout: carrito vacío, sin stock suficiente o cupón agotado
+                       (la transacción se revierte completa, incluida la clave)
+    """
+    try:
+        return _procesar_pedido(usuario, datos_envio, cupon, clave)
+    except IntegrityError:
+        # Otro request con la misma clave ya creó (y confirmó) el pedido
+        pedido_id = pedido_de_clave(usuario, clave)
+        if pedido_id is None:
+            raise
+        return Pedido.objects.get(id=pedido_id)
+
+
+def _procesar_pedido(usuario, datos_envio, cupon, clave):
+    with transaction.atomic():
+        registro = ClaveIdempotencia.objects.create(clave=clave, usuario=usuario) if clave else None
+
+        items = list(CarritoItem.objects.filter(usuario=usuario).select_related('producto'))
+        if not items:
+            raise ErrorCheckout('Tu carrito está vacío')
+
+        cotizacion = precios_service.cotizar_items(items, cupon)
+
+        punto = transaction.savepoint()
+        if not _descontar_stock(usuario, items):
+            # Deshacer las filas que sí se descontaron antes de leer el stock para el mensaje
+            transaction.savepoint_rollback(punto)
+            nombre = _producto_sin_stock(usuario, items)
+            raise ErrorCheckout(f'No hay suficiente stock de {nombre}' if nombre else 'No hay suficiente stock')
+        transaction.savepoint_commit(punto)
+
+        cupon_aplicado = cotizacion.cupon_aplicado
+        if cupon_aplicado and not _usar_cupon(cupon_aplicado):
+            raise ErrorCheckout(f'El cupón {cupon_aplicado.codigo} ya no está disponible')
+
+        pedido = Pedido.objects.create(
+            usuario=usuario,
+            total=cotizacion.total,
+            cupon_aplicado=cupon_aplicado,
+            descuento_aplicado=cotizacion.descuento,
+            **datos_envio
+        )
+        lineas = PedidoItem.objects.bulk_create([
+            PedidoItem(
+                pedido=pedido,
+                producto=item.producto,
+                nombre_producto=item.producto.nombre,
+                cantidad=item.cantidad,
+                precio_unitario=item.producto.precio,
+            )
+            for item in items
+        ])
+        ventas_service.registrar_pedido(pedido, lineas)
+        kardex_service.registrar(
+            [(item.producto_id, -item.cantidad) for item in items],
+            tipo=kardex_service.VENTA, referencia=f'Pedido #{pedido.numero_pedido}', usuario=usuario,
+        )
+        CarritoItem.objects.filter(id__in=[item.id for item in items]).delete()
+        reservas_service.liberar_reservas(usuario)
+        if registro is not None:
+            ClaveIdempotencia.objects.filter(id=registro.id).update(pedido=pedido)
+
+        # El UPDATE masivo no dispara señales: avisar si el catálogo muestra otro estado de stock
+        validadores_service.registrar_cambio_stock({item.producto_id: -item.cantidad for item in items})
+        dashboard_service.invalidar()
+
+    return pedido
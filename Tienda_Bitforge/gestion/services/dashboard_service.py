@@ -0,0 +1,84 @@
+"""
+Servicio de métricas del panel de administración para BitForge
+Calcula todas las cifras del dashboard con agregación condicional
+(Count/Sum con filter=) en lugar de una consulta por número:
+
+    1. Productos: total, agotados y bajo stock
+    2. Ventas: total, del mes, pedidos y pedidos de hoy (resumen VentaHoraria)
+    3. Pedidos pendientes
+    4. Solicitudes pendientes
+    5. Suscriptores activos
+    6. Productos más vendidos del mes (resumen VentaDiariaProducto)
+    7. Últimos pedidos
+
+Las ventas salen de los resúmenes de ventas_service (netas de cancelaciones y
+reembolsos), así el costo no crece con el historial de pedidos.
+
+El resultado se guarda como una "foto" en caché por unos segundos, así varios
+supervisores refrescando el panel no repiten las consultas. Las escrituras de
+pedidos y stock (señales, checkout, cambios masivos) la invalidan.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Producto, Pedido, Solicitud, SuscripcionNewsletter, VentaHoraria
+from . import ventas_service
+
+CLAVE_SNAPSHOT = 'dashboard:snapshot'
+
+# Vida máxima de la foto (otros workers con LocMem no ven la invalidación)
+SNAPSHOT_TTL = 30  # segundos
+
+UMBRAL_BAJO_STOCK = Producto.UMBRAL_BAJO_STOCK
+
+
+def calcular_metricas():
+    """Calcula las métricas del panel directamente de la BD (7 consultas)"""
+    hoy = timezone.localdate()
+    inicio_hoy = ventas_service.inicio_del_dia(hoy)
+    hace_30_dias = hoy - timedelta(days=30)
+    inicio_mes = ventas_service.inicio_del_dia(hace_30_dias)
+    dinero = DecimalField(max_digits=14, decimal_places=2)
+    neto = F('ventas') - F('reembolsos')
+
+    productos = Producto.objects.aggregate(
+        total_productos=Count('id'),
+        productos_agotados=Count('id', filter=Q(stock=0)),
+        productos_bajo_stock=Count('id', filter=Q(stock__gt=0, stock__lte=UMBRAL_BAJO_STOCK)),
+    )
+    ventas = VentaHoraria.objects.aggregate(
+        total_pedidos=Coalesce(Sum('pedidos'), 0),
+        pedidos_hoy=Coalesce(Sum('pedidos', filter=Q(hora__gte=inicio_hoy)), 0),
+        ventas_totales=Coalesce(Sum(neto, output_field=dinero), 0, output_field=dinero),
+        ventas_mes=Coalesce(Sum(neto, filter=Q(hora__gte=inicio_mes), output_field=dinero), 0, output_field=dinero),
+    )
+
+    return {
+        **productos,
+        **ventas,
+        'pedidos_pendientes': Pedido.objects.filter(estado='pendiente').count(),
+        'solicitudes_pendientes': Solicitud.objects.filter(estado='pendiente').count(),
+        'suscriptores': SuscripcionNewsletter.objects.filter(activo=True).count(),
+        'productos_vendidos': ventas_service.mas_vendidos(desde=hace_30_dias),
+        'ultimos_pedidos': list(Pedido.objects.select_related('usuario')[:5]),
+        'generado': timezone.now(),
+    }
+
+
+def obtener_metricas():
+    """Foto de las métricas: desde la caché si está vigente, si no se recalcula"""
+    metricas = cache.get(CLAVE_SNAPSHOT)
+    if metricas is None:
+        metricas = calcular_metricas()
+        cache.set(CLAVE_SNAPSHOT, metricas, SNAPSHOT_TTL)
+    return metricas
+
+
+def invalidar():
+    """Descarta la foto; si hay una transacción abierta, recién al confirmarse"""
+    transaction.on_commit(lambda: cache.delete(CLAVE_SNAPSHOT))
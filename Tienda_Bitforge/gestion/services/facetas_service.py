@@ -0,0 +1,95 @@
+"""
+Servicio de facetas del catálogo para BitForge
+Calcula en UNA sola consulta agrupada (con agregación condicional) los conteos
+por categoría, el histograma por rangos de precio y los productos en stock
+para el filtro actual. El resultado se cachea por clave de filtros normalizada
+y versión del catálogo, así el sidebar es prácticamente gratis en visitas repetidas.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from . import validadores_service
+
+# Rangos de precio del histograma: [mínimo, máximo) - None = sin tope.
+# Los enlaces del catálogo filtran igual: precio_min (>=) y precio_hasta (<).
+RANGOS_PRECIO = [
+    (0, 100),
+    (100, 250),
+    (250, 500),
+    (500, 1000),
+    (1000, None),
+]
+
+CACHE_TTL = 300  # segundos
+
+
+def _clave_cache(filtros):
+    normalizados = json.dumps(filtros, sort_keys=True, default=str)
+    digest = hashlib.sha1(normalizados.encode('utf-8')).hexdigest()
+    # Versión de MarcaCatalogo: cambia también con el stock (faceta en_stock)
+    return f'facetas:{validadores_service.estado_catalogo()[0]}:{digest}'
+
+
+def _filtro_rango(minimo, maximo):
+    condicion = Q(precio__gte=minimo)
+    if maximo is not None:
+        condicion &= Q(precio__lt=maximo)
+    return condicion
+
+
+def _agregar_por_categoria(queryset):
+    """Una fila por categoría con total, en stock y conteo por rango de precio"""
+    agregados = {
+        'total': Count('id'),
+        'en_stock': Count('id', filter=Q(stock__gt=0)),
+    }
+    for i, (minimo, maximo) in enumerate(RANGOS_PRECIO):
+        agregados[f'rango_{i}'] = Count('id', filter=_filtro_rango(minimo, maximo))
+    filas = queryset.order_by().values('categoria_id').annotate(**agregados)
+    return {fila.pop('categoria_id'): fila for fila in filas}
+
+
+def calcular_facetas(queryset, filtros, categoria_id=None):
+    """
+    Calcula las facetas del catálogo.
+
+    Args:
+        queryset: Productos con todos los filtros aplicados EXCEPTO la categoría
+                  (así el sidebar muestra cuántos hay en las otras categorías)
+        filtros: Dict con los filtros ya normalizados (forma la clave de caché)
+        categoria_id: Categoría seleccionada (id) o None
+
+    Returns:
+        Dict con 'categorias' ({id: total}), 'rangos', 'en_stock' y 'total'
+        (estos tres últimos restringidos a la categoría seleccionada)
+    """
+    clave = _clave_cache(filtros)
+    por_categoria = cache.get(clave)
+    if por_categoria is None:
+        por_categoria = _agregar_por_categoria(queryset)
+        cache.set(clave, por_categoria, CACHE_TTL)
+
+    if categoria_id is not None:
+        filas = [por_categoria[categoria_id]] if categoria_id in por_categoria else []
+    else:
+        filas = list(por_categoria.values())
+
+    rangos = []
+    for i, (minimo, maximo) in enumerate(RANGOS_PRECIO):
+        etiqueta = f'${minimo} - ${maximo}' if maximo is not None else f'Más de ${minimo}'
+        rangos.append({
+            'minimo': minimo,
+            'maximo': maximo,
+            'etiqueta': etiqueta,
+            'total': sum(fila[f'rango_{i}'] for fila in filas),
+        })
+
+    return {
+        'categorias': {cid: fila['total'] for cid, fila in por_categoria.items()},
+        'rangos': rangos,
+        'en_stock': sum(fila['en_stock'] for fila in filas),
+        'total': sum(fila['total'] for fila in filas),
+    }
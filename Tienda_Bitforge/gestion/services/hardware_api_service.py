@@ -10,6 +10,8 @@ from decimal import Decimal
 import hashlib
 import random
 
+from . import precios_masivos_service
+
 # API Keys y URLs
 DUMMYJSON_BASE = 'https://dummyjson.com'
 PIXABAY_API_KEY = '54315660-127b2955583a72e4ac73f6889'  # API Key real de Pixabay
@@ -238,25 +240,16 @@ def importar_productos_api(Producto, Categoria, tipo='cpu', limite=5):
     return creados, actualizados
 
 
-def actualizar_precios_api(Producto):
+def actualizar_precios_api(Producto, simular=False):
     """
     Actualiza precios de productos existentes con variaciones realistas.
-    Simula fluctuaciones del mercado basadas en demanda.
+    Simula fluctuaciones del mercado basadas en demanda (-3% a +5%), con el
+    motor masivo de precios_masivos_service (UPDATE por lotes, no save() por fila).
     """
-    actualizados = 0
-    
-    for producto in Producto.objects.filter(disponible=True):
-        try:
-            # Fluctuación realista: -3% a +5%
-            factor = Decimal(str(random.uniform(0.97, 1.05)))
-            nuevo_precio = producto.precio * factor
-            producto.precio = round(nuevo_precio, 2)
-            producto.save()
-            actualizados += 1
-        except Exception as e:
-            print(f"Error actualizando precio de {producto.nombre}: {e}")
-    
-    return actualizados
+    resultado = precios_masivos_service.aplicar_fluctuacion(
+        0.97, 1.05, queryset=Producto.objects.filter(disponible=True), simular=simular
+    )
+    return resultado.productos
 
 
 def buscar_productos_api(termino, limite=10):
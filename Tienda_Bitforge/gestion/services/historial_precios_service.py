@@ -0,0 +1,177 @@
+"""
+Servicio de historial de precios para BitForge
+Producto.precio guarda solo el precio actual; HistorialPrecio guarda una fila
+(producto, precio, fecha desde la que rige) por cada cambio real de precio,
+indexada por (producto, fecha):
+
+- Los save() de Producto (admin, importadores) los registra la señal solo si
+  el precio cambió respecto al leído de la BD. Dentro de `with origen(...)`
+  llevan ese origen (p. ej. importación).
+- La actualización masiva (precios_masivos_service) registra sus cambios con
+  un INSERT ... SELECT por lote (registrar_actuales).
+
+Consultas (una cada una, sin importar cuántos productos):
+    precio_en(ids, momento)     precio vigente de cada producto en un momento
+    series(ids, desde, hasta)   precio vigente en desde + cambios del rango
+    anotar_tendencia(productos) variación contra el precio de hace N días
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from ..models import HistorialPrecio, Producto
+
+INICIAL = 'inicial'
+EDICION = 'edicion'
+FLUCTUACION = 'fluctuacion'
+IMPORTACION = 'importacion'
+
+LOTE = 1000
+
+# Productos por consulta de series / precio_en
+MAX_PRODUCTOS = 1000
+
+# Días contra los que se compara la tendencia del catálogo
+DIAS_TENDENCIA = 30
+
+_local = threading.local()
+
+CENTAVO = Decimal('0.01')
+
+
+@contextmanager
+def origen(nombre):
+    """Origen de los cambios de precio registrados por la señal dentro del bloque"""
+    anterior = getattr(_local, 'origen', None)
+    _local.origen = nombre
+    try:
+        yield
+    finally:
+        _local.origen = anterior
+
+
+def registrar(cambios, origen=EDICION, fecha=None):
+    """
+    Agrega filas al historial.
+
+    Args:
+        cambios: iterable de (producto_id, precio)
+        origen: INICIAL, EDICION, FLUCTUACION o IMPORTACION
+        fecha: desde cuándo rige el precio (por defecto ahora)
+    """
+    fecha = fecha or timezone.now()
+    HistorialPrecio.objects.bulk_create(
+        [HistorialPrecio(producto_id=pid, precio=precio, fecha=fecha, origen=origen) for pid, precio in cambios],
+        batch_size=LOTE,
+    )
+
+
+def registrar_actuales(producto_ids, origen, fecha=None):
+    """
+    Agrega al historial el precio actual de los productos indicados con un
+    INSERT ... SELECT por lote (sin armar objetos en Python). Para después de
+    un UPDATE masivo de precios, dentro de la misma transacción.
+    """
+    fecha = fecha or timezone.now()
+    campos = {campo.name: connection.ops.quote_name(campo.column) for campo in HistorialPrecio._meta.concrete_fields}
+    tabla = connection.ops.quote_name(HistorialPrecio._meta.db_table)
+    productos = connection.ops.quote_name(Producto._meta.db_table)
+    precio = connection.ops.quote_name(Producto._meta.get_field('precio').column)
+    clave = connection.ops.quote_name(Producto._meta.pk.column)
+    valor_fecha = HistorialPrecio._meta.get_field('fecha').get_db_prep_value(fecha, connection)
+    ids = list(producto_ids)
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(ids), LOTE):
+            lote = ids[inicio:inicio + LOTE]
+            cursor.execute(
+                f'INSERT INTO {tabla} ({campos["producto"]}, {campos["precio"]}, {campos["fecha"]}, {campos["origen"]}) '
+                f'SELECT {clave}, {precio}, %s, %s FROM {productos} WHERE {clave} IN ({", ".join(["%s"] * len(lote))})',
+                [valor_fecha, origen] + lote,
+            )
+
+
+def registrar_guardado(producto, creado):
+    """Fila de historial por un save() de Producto si el precio cambió (lo llama la señal post_save)"""
+    if producto.__dict__.get('precio') is None:
+        return  # Instancia sin precio leído de la BD (p. ej. .only())
+    precio = Producto._meta.get_field('precio').to_python(producto.precio).quantize(CENTAVO)
+    if not creado and precio == getattr(producto, '_precio_guardado', None):
+        return
+    producto._precio_guardado = precio
+    registrar([(producto.id, precio)], INICIAL if creado else getattr(_local, 'origen', None) or EDICION)
+
+
+def _ids(productos):
+    ids = list(dict.fromkeys(productos))
+    if len(ids) > MAX_PRODUCTOS:
+        raise ValueError(f'Máximo {MAX_PRODUCTOS} productos por consulta')
+    return ids
+
+
+def _vigente(momento):
+    """Subconsulta: última fila del historial del producto externo con fecha <= momento"""
+    return HistorialPrecio.objects.filter(producto=OuterRef('pk'), fecha__lte=momento).order_by('-fecha', '-id')
+
+
+def precio_en(producto_ids, momento):
+    """
+    Precio vigente de cada producto en un momento (una consulta).
+
+    Returns:
+        Dict {producto_id: precio}; los productos sin historial hasta ese
+        momento (creados después) no aparecen
+    """
+    filas = Producto.objects.filter(id__in=_ids(producto_ids)).annotate(
+        precio_vigente=Subquery(_vigente(momento).values('precio')[:1])
+    ).order_by().values_list('id', 'precio_vigente')
+    # En SQLite las subconsultas decimales no vuelven con los 2 decimales del campo
+    return {pid: precio.quantize(CENTAVO) for pid, precio in filas if precio is not None}
+
+
+def series(producto_ids, desde, hasta):
+    """
+    Serie de precios de varios productos entre desde y hasta (una consulta):
+    el precio vigente en desde más cada cambio del rango.
+
+    Returns:
+        Dict {producto_id: [(fecha, precio), ...]} en orden de fecha; el primer
+        punto lleva la fecha desde si el precio ya regía antes del rango
+    """
+    ids = _ids(producto_ids)
+    vigente = _vigente(desde)
+    apertura = Producto.objects.filter(id__in=ids).annotate(
+        fecha_vigente=Subquery(vigente.values('fecha')[:1]),
+        precio_vigente=Subquery(vigente.values('precio')[:1]),
+    ).order_by().values_list('id', 'fecha_vigente', 'precio_vigente')
+    rango = HistorialPrecio.objects.filter(
+        producto_id__in=ids, fecha__gt=desde, fecha__lte=hasta
+    ).order_by().values_list('producto_id', 'fecha', 'precio')
+
+    resultado = {pid: [] for pid in ids}
+    for pid, fecha, precio in rango.union(apertura, all=True).order_by('producto_id', 'fecha'):
+        if fecha is None:
+            continue  # Sin precio antes del rango (producto creado después de desde)
+        resultado[pid].append((max(fecha, desde), precio))
+    return resultado
+
+
+def anotar_tendencia(productos, dias=DIAS_TENDENCIA):
+    """
+    Asigna producto.precio_anterior (precio de hace `dias` días o None) y
+    producto.variacion_precio (porcentaje, None si no cambió o no hay dato) a
+    una lista de productos, con una consulta.
+    """
+    productos = list(productos)
+    anteriores = precio_en((p.id for p in productos), timezone.now() - timedelta(days=dias)) if productos else {}
+    for producto in productos:
+        anterior = anteriores.get(producto.id)
+        producto.precio_anterior = anterior
+        producto.variacion_precio = None
+        if anterior and anterior != producto.precio:
+            producto.variacion_precio = round((producto.precio - anterior) / anterior * 100, 1)
+    return productos
@@ -0,0 +1,245 @@
+"""
+Servicio de inventario masivo para BitForge (bodega)
+Aplica muchos cambios de stock a la vez, por ejemplo después de un conteo o de
+recibir un pedido del proveedor:
+
+    fijar   el stock pasa a ser el valor indicado (conteo físico)
+    sumar   se suma el valor (positivo al recibir mercadería, negativo por mermas)
+
+- Todo o nada: si un cambio no es válido (producto inexistente, stock negativo)
+  no se aplica ninguno y se devuelven los errores.
+- Una transacción con un SELECT ... FOR UPDATE de los productos afectados y un
+  UPDATE ... CASE por lote de productos, en vez de un save() por producto.
+- Cada cambio queda en el kardex (conteo, entrada o salida) con un bulk_create.
+- Los cambios pueden venir de la grilla de gestion_stock, de un CSV
+  (producto_id,stock o producto_id,delta) o de la API JSON.
+"""
+import csv
+import io
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Case, Count, Q, When
+
+from ..models import Producto
+from . import validadores_service, dashboard_service, kardex_service
+
+FIJAR = 'fijar'
+SUMAR = 'sumar'
+
+# Productos por UPDATE (límite de parámetros de SQLite)
+LOTE_PRODUCTOS = 500
+
+# Cambios máximos por envío (grilla, CSV o API)
+MAX_CAMBIOS = 5000
+
+# Umbral de la vista de bodega: el mismo de la tienda y el panel
+UMBRAL_BAJO_STOCK = Producto.UMBRAL_BAJO_STOCK
+
+
+class ErrorInventario(ValueError):
+    """Cambios de stock inválidos; errores es la lista de mensajes por fila"""
+
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__('; '.join(errores[:5]))
+
+
+@dataclass(frozen=True)
+class CambioStock:
+    producto_id: int
+    modo: str
+    valor: int
+
+
+def _entero(valor, campo, referencia, errores):
+    try:
+        return int(str(valor).strip())
+    except (TypeError, ValueError):
+        errores.append(f'{referencia}: {campo} "{valor}" no es un número entero')
+        return None
+
+
+def _cambio(producto_id, stock, delta, referencia, errores):
+    """Arma un CambioStock desde valores de texto (stock o delta, no ambos)"""
+    pid = _entero(producto_id, 'producto_id', referencia, errores)
+    tiene_stock = stock not in (None, '')
+    tiene_delta = delta not in (None, '')
+    if tiene_stock == tiene_delta:
+        errores.append(f'{referencia}: indica stock o delta (uno de los dos)')
+        return None
+    valor = _entero(stock if tiene_stock else delta, 'stock' if tiene_stock else 'delta', referencia, errores)
+    if pid is None or valor is None:
+        return None
+    return CambioStock(pid, FIJAR if tiene_stock else SUMAR, valor)
+
+
+def leer_json(datos):
+    """Cambios desde la API: {"cambios": [{"producto_id": 1, "stock": 5}, {"producto_id": 2, "delta": -1}]}"""
+    filas = datos.get('cambios') if isinstance(datos, dict) else None
+    if not isinstance(filas, list):
+        raise ErrorInventario(['Se esperaba {"cambios": [...]}'])
+    errores = []
+    cambios = []
+    for i, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            errores.append(f'Cambio {i}: se esperaba un objeto')
+            continue
+        cambio = _cambio(fila.get('producto_id'), fila.get('stock'), fila.get('delta'), f'Cambio {i}', errores)
+        if cambio:
+            cambios.append(cambio)
+    if errores:
+        raise ErrorInventario(errores)
+    return cambios
+
+
+def leer_csv(archivo):
+    """Cambios desde un CSV con encabezado producto_id y stock y/o delta"""
+    try:
+        texto = archivo.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ErrorInventario(['El archivo no está en UTF-8'])
+    lector = csv.DictReader(io.StringIO(texto))
+    columnas = set(lector.fieldnames or ())
+    if 'producto_id' not in columnas or not columnas & {'stock', 'delta'}:
+        raise ErrorInventario(['El CSV debe tener las columnas producto_id y stock o delta'])
+    errores = []
+    cambios = []
+    for fila in lector:
+        referencia = f'Línea {lector.line_num}'
+        cambio = _cambio(fila.get('producto_id'), fila.get('stock'), fila.get('delta'), referencia, errores)
+        if cambio:
+            cambios.append(cambio)
+    if errores:
+        raise ErrorInventario(errores)
+    return cambios
+
+
+def leer_grilla(post):
+    """
+    Cambios desde la grilla: nuevo_<id> (con original_<id> para saber si se
+    editó) y delta_<id>; el delta tiene prioridad si ambos vienen llenos.
+    """
+    errores = []
+    cambios = []
+    for clave, original in post.items():
+        if not clave.startswith('original_'):
+            continue
+        pid = clave[len('original_'):]
+        delta = post.get(f'delta_{pid}', '').strip()
+        nuevo = post.get(f'nuevo_{pid}', '').strip()
+        if delta:
+            cambio = _cambio(pid, None, delta, f'Producto {pid}', errores)
+        elif nuevo and nuevo != original.strip():
+            cambio = _cambio(pid, nuevo, None, f'Producto {pid}', errores)
+        else:
+            continue
+        if cambio:
+            cambios.append(cambio)
+    if errores:
+        raise ErrorInventario(errores)
+    return cambios
+
+
+def aplicar_cambios(cambios, usuario=None, referencia=''):
+    """
+    Aplica los cambios de stock en una transacción.
+
+    Si un producto aparece varias veces, se aplican en orden (fijar y luego
+    sumar, etc.). usuario y referencia quedan en los movimientos del kardex.
+
+    Returns:
+        Lista de dicts (id, nombre, categoria, stock_anterior, stock_nuevo) de
+        los productos cuyo stock cambió, en el orden en que aparecieron
+
+    Raises:
+        ErrorInventario: si algún cambio no es válido (no se aplica ninguno)
+    """
+    if len(cambios) > MAX_CAMBIOS:
+        raise ErrorInventario([f'Demasiados cambios en un envío (máximo {MAX_CAMBIOS})'])
+    ids = list(dict.fromkeys(cambio.producto_id for cambio in cambios))
+    if not ids:
+        return []
+
+    with transaction.atomic():
+        actuales = {
+            pid: (nombre, categoria, stock)
+            for pid, nombre, categoria, stock in Producto.objects.select_for_update()
+            .filter(id__in=ids).values_list('id', 'nombre', 'categoria__nombre', 'stock')
+        }
+        errores = []
+        nuevos = {pid: actuales[pid][2] for pid in ids if pid in actuales}
+        for cambio in cambios:
+            if cambio.producto_id not in actuales:
+                errores.append(f'Producto {cambio.producto_id}: no existe')
+                continue
+            if cambio.modo == FIJAR:
+                nuevos[cambio.producto_id] = cambio.valor
+            else:
+                nuevos[cambio.producto_id] += cambio.valor
+            if nuevos[cambio.producto_id] < 0:
+                errores.append(
+                    f'{actuales[cambio.producto_id][0]}: el stock quedaría en {nuevos[cambio.producto_id]}'
+                )
+        if errores:
+            raise ErrorInventario(list(dict.fromkeys(errores)))
+
+        modificados = [pid for pid in ids if nuevos[pid] != actuales[pid][2]]
+        for inicio in range(0, len(modificados), LOTE_PRODUCTOS):
+            lote = modificados[inicio:inicio + LOTE_PRODUCTOS]
+            Producto.objects.filter(id__in=lote).update(stock=Case(
+                *[When(id=pid, then=nuevos[pid]) for pid in lote],
+                output_field=Producto._meta.get_field('stock'),
+            ))
+
+        fijados = {c.producto_id for c in cambios if c.modo == FIJAR}
+        with kardex_service.lote(usuario=usuario, referencia=referencia):
+            for pid in modificados:
+                diferencia = nuevos[pid] - actuales[pid][2]
+                if pid in fijados:
+                    tipo = kardex_service.CONTEO
+                else:
+                    tipo = kardex_service.ENTRADA if diferencia > 0 else kardex_service.SALIDA
+                kardex_service.registrar([(pid, diferencia)], tipo=tipo)
+
+        if modificados:
+            # El UPDATE masivo no dispara señales; el catálogo solo cambia si se nota el stock
+            if any(validadores_service.stock_visible(actuales[pid][2], nuevos[pid]) for pid in modificados):
+                validadores_service.registrar_cambio('producto')
+            dashboard_service.invalidar()
+
+    return [
+        {
+            'id': pid,
+            'nombre': actuales[pid][0],
+            'categoria': actuales[pid][1],
+            'stock_anterior': actuales[pid][2],
+            'stock_nuevo': nuevos[pid],
+        }
+        for pid in modificados
+    ]
+
+
+def filtrar(queryset, categoria=None, umbral=None):
+    """Filtra productos por categoría (id) y stock máximo; ignora valores inválidos"""
+    try:
+        if categoria:
+            queryset = queryset.filter(categoria_id=int(categoria))
+    except (TypeError, ValueError):
+        pass
+    try:
+        if umbral not in (None, ''):
+            queryset = queryset.filter(stock__lte=int(umbral))
+    except (TypeError, ValueError):
+        pass
+    return queryset
+
+
+def resumen(queryset):
+    """Totales de la bodega (agotados, bajo stock, OK) en una consulta"""
+    return queryset.aggregate(
+        total=Count('id'),
+        agotados=Count('id', filter=Q(stock=0)),
+        bajo_stock=Count('id', filter=Q(stock__gt=0, stock__lte=UMBRAL_BAJO_STOCK)),
+        stock_ok=Count('id', filter=Q(stock__gt=UMBRAL_BAJO_STOCK)),
+    )
@@ -0,0 +1,224 @@
+"""
+Servicio de kardex (movimientos de stock) para BitForge
+Cada cambio de stock deja una fila en MovimientoStock (solo se agregan, nunca
+se editan) y cada tanto se toma una FotoStock por producto:
+
+    stock en la fecha X = última foto antes de X + movimientos posteriores hasta X
+
+así la consulta lee una foto y una cantidad acotada de movimientos (los que
+hubo desde esa foto), no todo el historial.
+
+Quién registra:
+- Los cambios masivos (checkout, cancelaciones, inventario) llaman a
+  registrar() con todas sus líneas: un INSERT por operación.
+- Los save() de Producto (admin, importadores, solicitudes) los registra la
+  señal con la diferencia contra el stock leído. Dentro de `with lote(...)`
+  llevan el tipo y la referencia del lote y se insertan al final en un solo
+  bulk_create, en la misma transacción que los save().
+- `python manage.py tomar_fotos_stock` (cron) guarda las fotos.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import FotoStock, MovimientoStock, Producto
+
+INICIAL = 'inicial'
+VENTA = 'venta'
+CANCELACION = 'cancelacion'
+ENTRADA = 'entrada'
+SALIDA = 'salida'
+CONTEO = 'conteo'
+IMPORTACION = 'importacion'
+AJUSTE = 'ajuste'
+
+LOTE = 1000
+
+# Movimientos listados en la vista de kardex de un producto
+MAX_MOVIMIENTOS = 1000
+
+_local = threading.local()
+
+
+def _lote_actual():
+    pila = getattr(_local, 'lotes', None)
+    return pila[-1] if pila else None
+
+
+@contextmanager
+def lote(tipo=AJUSTE, referencia='', usuario=None, agrupar=True):
+    """
+    Tipo, referencia y usuario para los movimientos registrados adentro
+    (también los de la señal de Producto.save).
+
+    Con agrupar=True el bloque es una transacción: los movimientos se juntan y
+    se insertan al final con un bulk_create, junto con los cambios de stock.
+    Con agrupar=False (bloques con llamadas lentas, p. ej. a APIs externas)
+    cada movimiento se inserta en el momento.
+    """
+    actual = {
+        'tipo': tipo,
+        'referencia': referencia[:100],
+        'usuario': usuario if usuario is not None and usuario.is_authenticated else None,
+        'movimientos': [] if agrupar else None,
+    }
+    _local.lotes = getattr(_local, 'lotes', []) + [actual]
+    try:
+        if not agrupar:
+            yield actual
+            return
+        with transaction.atomic():
+            yield actual
+            MovimientoStock.objects.bulk_create(actual['movimientos'], batch_size=LOTE)
+    finally:
+        _local.lotes = _local.lotes[:-1]
+
+
+def registrar(cambios, tipo=None, referencia=None, usuario=None):
+    """
+    Registra movimientos de stock.
+
+    Args:
+        cambios: iterable de (producto_id, cantidad); las cantidades 0 se ignoran
+        tipo, referencia, usuario: por defecto los del lote actual (o AJUSTE)
+    """
+    actual = _lote_actual()
+    ahora = timezone.now()
+    if usuario is not None and not usuario.is_authenticated:
+        usuario = None
+    movimientos = [
+        MovimientoStock(
+            producto_id=producto_id,
+            cantidad=cantidad,
+            tipo=tipo or (actual['tipo'] if actual else AJUSTE),
+            referencia=(referencia if referencia is not None else (actual['referencia'] if actual else ''))[:100],
+            usuario=usuario or (actual['usuario'] if actual else None),
+            fecha=ahora,
+        )
+        for producto_id, cantidad in cambios
+        if cantidad
+    ]
+    if actual is not None and actual['movimientos'] is not None:
+        actual['movimientos'].extend(movimientos)
+    elif movimientos:
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=LOTE)
+
+
+def registrar_guardado(producto, creado):
+    """Movimiento por un save() de Producto (lo llama la señal post_save)"""
+    anterior = 0 if creado else getattr(producto, '_stock_guardado', None)
+    if anterior is None or producto.stock is None:
+        return  # Instancia sin stock leído de la BD (p. ej. .only()): no hay con qué comparar
+    diferencia = producto.stock - anterior
+    producto._stock_guardado = producto.stock
+    if diferencia:
+        registrar([(producto.id, diferencia)], tipo=INICIAL if creado else None)
+
+
+def tomar_fotos(solo_con_movimientos=True):
+    """
+    Guarda la foto del stock actual de los productos.
+
+    Args:
+        solo_con_movimientos: solo los productos con movimientos desde su última
+            foto (los demás siguen valiendo con la foto anterior)
+
+    Returns:
+        Cantidad de fotos guardadas
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        # En la misma transacción: el stock leído y el último movimiento son coherentes
+        ultimo = MovimientoStock.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+        productos = Producto.objects.all()
+        if solo_con_movimientos:
+            ultima_foto = FotoStock.objects.filter(producto=OuterRef('pk')).order_by('-fecha').values(
+                'ultimo_movimiento'
+            )[:1]
+            productos = productos.annotate(desde=Coalesce(Subquery(ultima_foto), Value(0))).filter(
+                movimientos__id__gt=F('desde'), movimientos__id__lte=ultimo
+            ).distinct()
+        fotos = (
+            FotoStock(producto_id=pid, fecha=ahora, stock=stock, ultimo_movimiento=ultimo)
+            for pid, stock in productos.order_by().values_list('id', 'stock').iterator(chunk_size=LOTE)
+        )
+        total = 0
+        bloque = []
+        for foto in fotos:
+            bloque.append(foto)
+            if len(bloque) == LOTE:
+                total += len(FotoStock.objects.bulk_create(bloque))
+                bloque = []
+        total += len(FotoStock.objects.bulk_create(bloque))
+    return total
+
+
+def stock_en(momento, productos=None):
+    """
+    Stock de cada producto en un momento dado, en una consulta: última foto
+    antes del momento + suma de los movimientos posteriores a esa foto.
+
+    Args:
+        productos: queryset o lista de ids (None para todos)
+
+    Returns:
+        Dict {producto_id: stock}
+    """
+    foto = FotoStock.objects.filter(producto=OuterRef('pk'), fecha__lte=momento).order_by('-fecha')
+    qs = Producto.objects.all() if productos is None else (
+        productos if hasattr(productos, 'model') else Producto.objects.filter(id__in=list(productos))
+    )
+    qs = qs.annotate(
+        foto_stock=Coalesce(Subquery(foto.values('stock')[:1]), Value(0), output_field=BigIntegerField()),
+        foto_movimiento=Coalesce(Subquery(foto.values('ultimo_movimiento')[:1]), Value(0), output_field=BigIntegerField()),
+    )
+    delta = MovimientoStock.objects.filter(
+        producto=OuterRef('pk'), id__gt=OuterRef('foto_movimiento'), fecha__lte=momento
+    ).order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    qs = qs.annotate(stock_en=F('foto_stock') + Coalesce(Subquery(delta), Value(0), output_field=BigIntegerField()))
+    return dict(qs.order_by().values_list('id', 'stock_en'))
+
+
+def resumen_movimientos(producto_id, desde, hasta):
+    """Unidades por tipo de movimiento entre desde y hasta (una consulta sobre producto+fecha)"""
+    return {
+        fila['tipo']: fila['total']
+        for fila in MovimientoStock.objects.filter(producto_id=producto_id, fecha__gte=desde, fecha__lte=hasta)
+        .values('tipo').annotate(total=Sum('cantidad')).order_by()
+    }
+
+
+def kardex(producto_id, desde, hasta, limite=MAX_MOVIMIENTOS):
+    """
+    Kardex de un producto entre desde y hasta.
+
+    Returns:
+        Dict con saldo_inicial (stock justo antes de desde), movimientos (con el
+        saldo después de cada uno, del más antiguo al más nuevo, hasta limite),
+        truncado, resumen por tipo y saldo_final
+    """
+    saldo = stock_en(desde - timedelta(microseconds=1), [producto_id]).get(producto_id, 0)
+    saldo_inicial = saldo
+    filas = list(
+        MovimientoStock.objects.filter(producto_id=producto_id, fecha__gte=desde, fecha__lte=hasta)
+        .select_related('usuario').order_by('fecha', 'id')[:limite + 1]
+    )
+    truncado = len(filas) > limite
+    movimientos = []
+    for movimiento in filas[:limite]:
+        saldo += movimiento.cantidad
+        movimiento.saldo = saldo
+        movimientos.append(movimiento)
+    resumen = resumen_movimientos(producto_id, desde, hasta)
+    return {
+        'saldo_inicial': saldo_inicial,
+        'movimientos': movimientos,
+        'truncado': truncado,
+        'resumen': resumen,
+        'saldo_final': saldo_inicial + sum(resumen.values()),
+    }
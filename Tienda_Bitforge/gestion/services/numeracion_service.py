@@ -0,0 +1,192 @@
+"""
+Servicio de numeración de pedidos para BitForge
+Genera numero_pedido únicos sin consultar la base de datos por pedido ni
+reintentar, al estilo Snowflake: cada número combina el milisegundo, el id del worker y
+una secuencia dentro del milisegundo.
+
+    BF + 18 dígitos  (ej. BF000123456789012345 -> 20 caracteres, cabe en el campo)
+
+    | 40 bits: ms desde EPOCA | 8 bits: worker | 11 bits: secuencia |
+
+- 40 bits de milisegundos alcanzan ~34 años desde la época (2025-01-01).
+- 256 workers. Cada proceso toma un id libre de la tabla WorkerNumeracion la
+  primera vez que numera (un lease que renueva cada DURACION_LEASE / 2 y que
+  otro proceso solo puede tomar cuando vence), así dos procesos vivos nunca
+  comparten id, aunque estén en servidores distintos. BITFORGE_WORKER_ID /
+  settings.PEDIDO_WORKER_ID fijan el id a mano (un proceso por id). Si no hay
+  ids libres se lanza ErrorNumeracion: nunca se usa un id que podría repetirse.
+- El lease se toma o renueva dentro de la transacción en curso: hasta que esa
+  transacción confirma, cada número vuelve a comprobarlo (un UPDATE); después
+  numerar no consulta la base de datos.
+- 2048 números por milisegundo y worker; si se agota la secuencia se toma
+  prestado el milisegundo siguiente en lugar de esperar.
+- Como el ancho es fijo, ordenar por numero_pedido ordena (aprox.) por fecha.
+
+El generador se puede reemplazar con settings.GENERADOR_NUMERO_PEDIDO
+(ruta a una clase con un método siguiente()).
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+PREFIJO = 'BF'
+DIGITOS = 18
+
+EPOCA_MS = 1735689600000  # 2025-01-01 00:00:00 UTC
+BITS_WORKER = 8
+BITS_SECUENCIA = 11
+MAX_WORKER = (1 << BITS_WORKER) - 1
+MAX_SECUENCIA = (1 << BITS_SECUENCIA) - 1
+DESPLAZAMIENTO_TIEMPO = BITS_WORKER + BITS_SECUENCIA
+
+
+# Vigencia del id de worker tomado de la base de datos
+DURACION_LEASE = timedelta(minutes=10)
+
+
+class ErrorNumeracion(Exception):
+    """No se pudo obtener un id de worker que no se repita"""
+
+
+def worker_id_configurado():
+    """Id fijado con BITFORGE_WORKER_ID / settings.PEDIDO_WORKER_ID, o None"""
+    configurado = os.environ.get('BITFORGE_WORKER_ID', getattr(settings, 'PEDIDO_WORKER_ID', None))
+    if configurado is None:
+        return None
+    try:
+        worker = int(configurado)
+    except ValueError:
+        worker = -1
+    if not 0 <= worker <= MAX_WORKER:
+        raise ImproperlyConfigured(f'BITFORGE_WORKER_ID / PEDIDO_WORKER_ID debe estar entre 0 y {MAX_WORKER}')
+    return worker
+
+
+def tomar_worker_id(propietario):
+    """
+    Toma un id de worker libre (sin fila o con el lease vencido) para el proceso.
+
+    Raises:
+        ErrorNumeracion: si los 256 ids están tomados por procesos vivos
+    """
+    from ..models import WorkerNumeracion
+
+    ahora = timezone.now()
+    vence = ahora + DURACION_LEASE
+    for worker_id, vencido in WorkerNumeracion.objects.filter(vence__lt=ahora).values_list('worker_id', 'vence'):
+        # Comparar y reemplazar: si otro proceso lo tomó primero, no se actualiza nada
+        if WorkerNumeracion.objects.filter(worker_id=worker_id, vence=vencido).update(
+            propietario=propietario, vence=vence
+        ):
+            return worker_id
+    usados = set(WorkerNumeracion.objects.values_list('worker_id', flat=True))
+    for worker_id in range(MAX_WORKER + 1):
+        if worker_id in usados:
+            continue
+        try:
+            with transaction.atomic():
+                WorkerNumeracion.objects.create(worker_id=worker_id, propietario=propietario, vence=vence)
+            return worker_id
+        except IntegrityError:
+            continue  # Lo creó otro proceso al mismo tiempo
+    raise ErrorNumeracion(f'Los {MAX_WORKER + 1} ids de worker de la numeración de pedidos están en uso')
+
+
+def renovar_worker_id(worker_id, propietario):
+    """Extiende el lease; False si el id ya no es del proceso (venció y otro lo tomó)"""
+    from ..models import WorkerNumeracion
+
+    return bool(WorkerNumeracion.objects.filter(worker_id=worker_id, propietario=propietario).update(
+        vence=timezone.now() + DURACION_LEASE
+    ))
+
+
+class GeneradorSnowflake:
+    """Números crecientes y únicos por worker, sin base de datos (salvo el lease del id)"""
+
+    def __init__(self, worker_id=None):
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER:
+            raise ValueError(f'worker_id debe estar entre 0 y {MAX_WORKER}')
+        self.worker_fijo = worker_id if worker_id is not None else worker_id_configurado()
+        self._reiniciar()
+        if hasattr(os, 'register_at_fork'):
+            # El hijo de un fork (p. ej. workers de gunicorn) no debe repetir la secuencia ni el id del padre
+            os.register_at_fork(after_in_child=self._reiniciar)
+
+    def _reiniciar(self):
+        self._lock = threading.Lock()
+        self.worker_id = self.worker_fijo
+        self.propietario = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[-100:]
+        self.confirmado = False
+        self.renovar_en = 0
+        self.ultimo_ms = -1
+        self.secuencia = 0
+
+    def _confirmar(self):
+        self.confirmado = True
+
+    def _asegurar_worker_id(self):
+        """Toma o renueva el lease del id cuando hace falta (llamar con el lock tomado)"""
+        if self.worker_fijo is not None:
+            return
+        if self.worker_id is not None and self.confirmado and time.monotonic() < self.renovar_en:
+            return
+        if self.worker_id is None or not renovar_worker_id(self.worker_id, self.propietario):
+            self.worker_id = tomar_worker_id(self.propietario)
+        self.renovar_en = time.monotonic() + DURACION_LEASE.total_seconds() / 2
+        # Si la transacción en curso se revierte, el lease también: se comprueba de nuevo
+        self.confirmado = False
+        transaction.on_commit(self._confirmar)
+
+    def siguiente_entero(self):
+        with self._lock:
+            self._asegurar_worker_id()
+            ahora = time.time_ns() // 1_000_000 - EPOCA_MS
+            if ahora > self.ultimo_ms:
+                self.ultimo_ms = ahora
+                self.secuencia = 0
+            else:
+                # Mismo milisegundo (o el reloj retrocedió): seguir la secuencia del último
+                self.secuencia += 1
+                if self.secuencia > MAX_SECUENCIA:
+                    self.ultimo_ms += 1
+                    self.secuencia = 0
+            return (self.ultimo_ms << DESPLAZAMIENTO_TIEMPO) | (self.worker_id << BITS_SECUENCIA) | self.secuencia
+
+    def siguiente(self):
+        return f'{PREFIJO}{self.siguiente_entero():0{DIGITOS}d}'
+
+
+def descomponer(numero_pedido):
+    """Devuelve (milisegundo unix, worker_id, secuencia) de un número generado"""
+    valor = int(numero_pedido[len(PREFIJO):])
+    return (
+        (valor >> DESPLAZAMIENTO_TIEMPO) + EPOCA_MS,
+        (valor >> BITS_SECUENCIA) & MAX_WORKER,
+        valor & MAX_SECUENCIA,
+    )
+
+
+_generador = None
+
+
+def obtener_generador():
+    global _generador
+    if _generador is None:
+        ruta = getattr(settings, 'GENERADOR_NUMERO_PEDIDO', None)
+        _generador = import_string(ruta)() if ruta else GeneradorSnowflake()
+    return _generador
+
+
+def siguiente_numero():
+    """Próximo numero_pedido del generador configurado"""
+    return obtener_generador().siguiente()
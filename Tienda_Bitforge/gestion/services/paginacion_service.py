@@ -0,0 +1,173 @@
+"""
+Servicio de paginación por cursor (keyset) para BitForge
+En vez de OFFSET, cada página filtra a partir del último producto visto
+usando el campo de orden + id como desempate, así la página N cuesta
+lo mismo que la página 1 aunque el catálogo tenga decenas de miles de productos.
+
+También lo usan los listados de pedidos y devoluciones (orden_fijo), junto con
+contar_cacheado() para no hacer un COUNT(*) sobre millones de filas en cada visita.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+
+# Modos de orden del catálogo: orden -> (campo, descendente)
+ORDENES = {
+    'precio_asc': ('precio', False),
+    'precio_desc': ('precio', True),
+    'nombre': ('nombre', False),
+}
+ORDEN_DEFECTO = ('fecha_creacion', True)  # Más recientes primero
+
+POR_PAGINA = 24
+
+# Segundos que se reutiliza un conteo de filas (el total del listado es aproximado)
+CONTEO_TTL = 60
+
+
+class PaginaKeyset:
+    """Resultado de una página: los items y los cursores para navegar"""
+
+    def __init__(self, items, cursor_siguiente=None, cursor_anterior=None):
+        self.items = items
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def resolver_orden(orden):
+    """Devuelve (campo, descendente) para un modo de orden del catálogo"""
+    return ORDENES.get(orden, ORDEN_DEFECTO)
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()  # Sin perder microsegundos (el desempate depende de esto)
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(orden, valor, pk, direccion):
+    """Codifica la posición (valor del campo de orden + id) en un token URL-safe"""
+    data = {'o': orden or '', 'v': _serializar(valor), 'id': pk, 'd': direccion}
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Decodifica un cursor. Devuelve None si es inválido o fue manipulado."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        if not isinstance(data, dict) or data.get('d') not in ('sig', 'ant') or not isinstance(data.get('id'), int):
+            return None
+        if not isinstance(data.get('o'), str) or 'v' not in data:
+            return None
+        return data
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def paginar_keyset(queryset, orden=None, cursor=None, por_pagina=POR_PAGINA, orden_fijo=None):
+    """
+    Pagina un queryset de productos por cursor.
+
+    Args:
+        queryset: QuerySet ya filtrado (categoría, precio, stock...)
+        orden: Modo de orden del catálogo (precio_asc, precio_desc, nombre o None)
+        cursor: Token recibido en ?cursor= (None para la primera página)
+        por_pagina: Cantidad de productos por página
+        orden_fijo: (campo, descendente) para listados que no son el catálogo,
+                    p. ej. ('fecha_pedido', True); reemplaza a orden
+
+    Returns:
+        PaginaKeyset con los items y los cursores siguiente/anterior
+    """
+    if orden_fijo:
+        campo, descendente = orden_fijo
+        orden_clave = campo
+    else:
+        campo, descendente = resolver_orden(orden)
+        orden_clave = orden if orden in ORDENES else ''
+    model_field = queryset.model._meta.get_field(campo)
+
+    posicion = decodificar_cursor(cursor)
+    if posicion and posicion['o'] != orden_clave:
+        posicion = None  # El cursor es de otro orden: volvemos a la primera página
+
+    valor = None
+    if posicion:
+        try:
+            valor = model_field.to_python(posicion['v'])
+        except Exception:
+            posicion = None
+
+    hacia_atras = bool(posicion) and posicion['d'] == 'ant'
+    # Al ir hacia atrás se recorre en orden inverso y luego se da vuelta la lista
+    invertido = descendente != hacia_atras
+    if invertido:
+        qs = queryset.order_by(f'-{campo}', '-id')
+    else:
+        qs = queryset.order_by(campo, 'id')
+
+    if posicion:
+        lookup = 'lt' if invertido else 'gt'
+        # (campo, id) > (valor, id): el campo >= valor suelto permite entrar al
+        # índice (campo, id) por rango; el OR solo filtra los empates
+        qs = qs.filter(**{f'{campo}__{lookup}e': valor}).filter(
+            Q(**{f'{campo}__{lookup}': valor}) |
+            Q(**{f'id__{lookup}': posicion['id']})
+        )
+
+    items = list(qs[:por_pagina + 1])
+    hay_mas = len(items) > por_pagina
+    items = items[:por_pagina]
+    if hacia_atras:
+        items.reverse()
+
+    cursor_siguiente = None
+    cursor_anterior = None
+    if items:
+        primero, ultimo = items[0], items[-1]
+        # Si venimos hacia atrás siempre hay página siguiente; si vamos hacia
+        # adelante, hay anterior siempre que no sea la primera página
+        if hacia_atras or hay_mas:
+            cursor_siguiente = codificar_cursor(orden_clave, getattr(ultimo, campo), ultimo.id, 'sig')
+        if (hacia_atras and hay_mas) or (posicion and not hacia_atras):
+            cursor_anterior = codificar_cursor(orden_clave, getattr(primero, campo), primero.id, 'ant')
+
+    return PaginaKeyset(items, cursor_siguiente, cursor_anterior)
+
+
+def contar_cacheado(queryset, clave, ttl=CONTEO_TTL):
+    """
+    Cantidad de filas del queryset, reutilizada durante ttl segundos.
+    Sirve para mostrar "N pedidos" sin contar la tabla completa en cada página.
+    """
+    clave = f'conteo:{clave}'
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, ttl)
+    return total
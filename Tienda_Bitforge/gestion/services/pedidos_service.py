@@ -0,0 +1,170 @@
+"""
+Servicio de estados de pedidos para BitForge
+Cambia el estado de muchos pedidos a la vez validando las transiciones:
+
+    pendiente -> procesando -> enviado -> entregado
+    cualquiera -> cancelado
+
+- Un UPDATE ... WHERE id IN (...) AND estado = <origen> por cada estado de origen,
+  así un pedido que otro admin cambió mientras tanto no se pisa.
+- Al cancelar se repone el stock de todas las líneas de los pedidos cancelados
+  con un incremento F('stock') + unidades por producto, en un solo UPDATE
+  (por lote de productos), y se registran los movimientos en el kardex.
+- Las cancelaciones se restan del resumen de ventas (ventas_service).
+- Devuelve el resultado de cada pedido para informarlo en el panel.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import Case, F, Sum, When
+from django.utils import timezone
+
+from ..models import Pedido, PedidoItem, Producto
+from . import validadores_service, dashboard_service, ventas_service, kardex_service
+
+TRANSICIONES = {
+    'pendiente': ('procesando', 'cancelado'),
+    'procesando': ('enviado', 'cancelado'),
+    'enviado': ('entregado', 'cancelado'),
+    'entregado': ('cancelado',),
+    'cancelado': (),
+}
+
+# Productos por UPDATE al reponer stock (límite de parámetros de SQLite)
+LOTE_PRODUCTOS = 500
+
+ACTUALIZADO = 'actualizado'
+SIN_CAMBIO = 'sin_cambio'
+INVALIDA = 'invalida'
+CONFLICTO = 'conflicto'
+NO_EXISTE = 'no_existe'
+
+DESCRIPCIONES = {
+    ACTUALIZADO: 'actualizado',
+    SIN_CAMBIO: 'ya estaba en ese estado',
+    INVALIDA: 'transición no permitida',
+    CONFLICTO: 'otro usuario lo modificó al mismo tiempo',
+    NO_EXISTE: 'no existe',
+}
+
+
+@dataclass(frozen=True)
+class ResultadoPedido:
+    """Resultado del cambio de estado de un pedido"""
+    pedido_id: int
+    numero_pedido: str
+    estado_anterior: str
+    resultado: str
+
+    @property
+    def ok(self):
+        return self.resultado == ACTUALIZADO
+
+    @property
+    def descripcion(self):
+        return DESCRIPCIONES[self.resultado]
+
+
+def transicion_valida(desde, hacia):
+    return hacia in TRANSICIONES.get(desde, ())
+
+
+def _reponer_stock(pedido_ids):
+    """
+    Devuelve al stock las unidades de los pedidos cancelados (un UPDATE por lote
+    de productos) y registra un movimiento de kardex por pedido y producto.
+
+    Returns:
+        {producto_id: unidades repuestas}
+    """
+    filas = list(
+        PedidoItem.objects.filter(pedido_id__in=pedido_ids, producto__isnull=False)
+        .values('pedido__numero_pedido', 'producto_id').annotate(total=Sum('cantidad')).order_by()
+        .values_list('pedido__numero_pedido', 'producto_id', 'total')
+    )
+    unidades = defaultdict(int)
+    for _, producto_id, total in filas:
+        unidades[producto_id] += total
+    producto_ids = list(unidades)
+    for inicio in range(0, len(producto_ids), LOTE_PRODUCTOS):
+        lote = producto_ids[inicio:inicio + LOTE_PRODUCTOS]
+        Producto.objects.filter(id__in=lote).update(stock=Case(
+            *[When(id=pid, then=F('stock') + unidades[pid]) for pid in lote],
+            default=F('stock'),
+            output_field=Producto._meta.get_field('stock'),
+        ))
+    with kardex_service.lote(kardex_service.CANCELACION):
+        for numero, producto_id, total in filas:
+            kardex_service.registrar([(producto_id, total)], referencia=f'Pedido #{numero}')
+    return unidades
+
+
+def cambiar_estado(pedido_ids, nuevo_estado):
+    """
+    Aplica nuevo_estado a los pedidos indicados.
+
+    Returns:
+        Lista de ResultadoPedido en el mismo orden que pedido_ids
+
+    Raises:
+        ValueError: si nuevo_estado no es un estado de pedido
+    """
+    if nuevo_estado not in TRANSICIONES:
+        raise ValueError(f'Estado de pedido desconocido: {nuevo_estado}')
+    pedido_ids = list(dict.fromkeys(int(pid) for pid in pedido_ids))
+
+    with transaction.atomic():
+        actuales = {
+            pid: (numero, estado)
+            for pid, numero, estado in Pedido.objects.filter(id__in=pedido_ids)
+            .values_list('id', 'numero_pedido', 'estado')
+        }
+        resultados = {}
+        por_origen = defaultdict(list)
+        for pid in pedido_ids:
+            if pid not in actuales:
+                resultados[pid] = NO_EXISTE
+            elif actuales[pid][1] == nuevo_estado:
+                resultados[pid] = SIN_CAMBIO
+            elif transicion_valida(actuales[pid][1], nuevo_estado):
+                por_origen[actuales[pid][1]].append(pid)
+            else:
+                resultados[pid] = INVALIDA
+
+        ahora = timezone.now()
+        cancelados = []
+        for origen, ids in por_origen.items():
+            # update() no pasa por save(): fecha_actualizacion (auto_now) se asigna a mano
+            punto = transaction.savepoint()
+            actualizados = Pedido.objects.filter(id__in=ids, estado=origen).update(
+                estado=nuevo_estado, fecha_actualizacion=ahora
+            )
+            if actualizados == len(ids):
+                transaction.savepoint_commit(punto)
+                aplicados = set(ids)
+            else:
+                # Alguno cambió desde la lectura: no se sabe cuáles, se repite uno por uno
+                transaction.savepoint_rollback(punto)
+                aplicados = {
+                    pid for pid in ids
+                    if Pedido.objects.filter(id=pid, estado=origen).update(
+                        estado=nuevo_estado, fecha_actualizacion=ahora
+                    )
+                }
+            for pid in ids:
+                resultados[pid] = ACTUALIZADO if pid in aplicados else CONFLICTO
+            if nuevo_estado == 'cancelado':
+                cancelados.extend(aplicados)
+
+        if por_origen:
+            dashboard_service.invalidar()
+        ventas_service.registrar_cancelacion(cancelados)
+        if cancelados:
+            # El UPDATE masivo no dispara señales: avisar si el catálogo muestra otro estado de stock
+            validadores_service.registrar_cambio_stock(_reponer_stock(cancelados))
+
+    return [
+        ResultadoPedido(pid, *actuales.get(pid, ('', '')), resultado=resultados[pid])
+        for pid in pedido_ids
+    ]
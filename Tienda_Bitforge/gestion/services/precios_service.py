@@ -0,0 +1,111 @@
+"""
+Servicio de precios (cotización) para BitForge
+Única fuente de verdad para subtotal, descuento por cupón y total del carrito.
+La usan ver_carrito, checkout y procesar_pago (y cualquier API futura).
+
+- El carrito de usuarios autenticados se totaliza en UNA consulta agregada
+  (Sum(F('cantidad') * F('producto__precio'))) sin traer los productos.
+- El cupón de la sesión se resuelve una sola vez por request.
+- El resultado es una Cotizacion inmutable.
+"""
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+from ..models import CarritoItem, Cupon
+from . import carrito_service
+
+CENTAVOS = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class Cotizacion:
+    """Totales del carrito (inmutable)"""
+    subtotal: Decimal
+    descuento: Decimal
+    total: Decimal
+    total_items: int
+    cupon: Cupon = None  # Cupón de la sesión (puede no aplicar, p. ej. por compra mínima)
+
+    @property
+    def cupon_aplicado(self):
+        """Cupón que efectivamente descontó algo (para guardar en el Pedido)"""
+        return self.cupon if self.descuento > 0 else None
+
+    @property
+    def vacia(self):
+        return self.total_items == 0
+
+
+def calcular_descuento(cupon, subtotal):
+    """Aplica vigencia, compra mínima, porcentaje y tope máximo del cupón"""
+    if cupon is None or not cupon.esta_vigente() or subtotal < cupon.compra_minima:
+        return Decimal('0')
+    descuento = (subtotal * Decimal(cupon.descuento_porcentaje) / 100).quantize(CENTAVOS, ROUND_HALF_UP)
+    if cupon.descuento_maximo and descuento > cupon.descuento_maximo:
+        descuento = cupon.descuento_maximo
+    return descuento
+
+
+def resolver_cupon(request):
+    """
+    Cupón guardado en la sesión, consultado una sola vez por request.
+    Si el código ya no existe se quita de la sesión.
+    """
+    if not hasattr(request, '_cupon_sesion'):
+        cupon = None
+        codigo = request.session.get('cupon_codigo')
+        if codigo:
+            cupon = Cupon.objects.filter(codigo=codigo).first()
+            if cupon is None:
+                del request.session['cupon_codigo']
+        request._cupon_sesion = cupon
+    return request._cupon_sesion
+
+
+def _cotizacion(subtotal, total_items, cupon):
+    descuento = calcular_descuento(cupon, subtotal)
+    return Cotizacion(
+        subtotal=subtotal,
+        descuento=descuento,
+        total=subtotal - descuento,
+        total_items=total_items,
+        cupon=cupon,
+    )
+
+
+def cotizar_carrito_usuario(usuario, cupon=None):
+    """Totales del carrito de un usuario en una sola consulta agregada"""
+    totales = CarritoItem.objects.filter(usuario=usuario).aggregate(
+        subtotal=Coalesce(
+            Sum(F('cantidad') * F('producto__precio'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+        total_items=Coalesce(Sum('cantidad'), 0),
+    )
+    return _cotizacion(Decimal(totales['subtotal']).quantize(CENTAVOS), totales['total_items'], cupon)
+
+
+def cotizar_items(items, cupon=None):
+    """Totales de items ya cargados en memoria (p. ej. el carrito de sesión)"""
+    subtotal = sum((item.subtotal() for item in items), Decimal('0'))
+    total_items = sum(item.cantidad for item in items)
+    return _cotizacion(subtotal, total_items, cupon)
+
+
+def cotizar(request, items=None):
+    """
+    Cotización del carrito del request actual.
+
+    Args:
+        items: Solo para invitados - items de sesión ya resueltos (evita resolverlos dos veces)
+    """
+    cupon = resolver_cupon(request)
+    if request.user.is_authenticated:
+        return cotizar_carrito_usuario(request.user, cupon)
+
+    if items is None:
+        items = carrito_service.items_sesion(request.session.get('carrito', {}))
+    return cotizar_items(items, cupon)
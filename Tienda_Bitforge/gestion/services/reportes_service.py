@@ -0,0 +1,379 @@
+"""
+Servicio de reportes exportables para BitForge (panel de staff)
+Cada reporte es una sola consulta con values_list (solo las columnas que se
+escriben, sin instanciar modelos) recorrida con .iterator(chunk_size=...):
+
+    pedidos     número, cliente (JOIN), total, estado, fecha
+    productos   nombre, precio, stock, categoría (JOIN), disponible
+    clientes    username, email, registro y COUNT de pedidos (GROUP BY)
+    ventas      una fila por día desde el resumen VentaHoraria
+
+Formatos:
+- CSV en streaming desde la vista (la memoria no crece con las filas).
+- En segundo plano (tarea 'exportar_reporte'), a un archivo en EXPORTACIONES_DIR:
+    csv.gz      CSV comprimido, con el mismo formato que la descarga directa
+    jsonl.gz    un objeto JSON por fila, valores sin formatear (fechas ISO)
+    parquet     columnar, si pyarrow está instalado (por grupos de filas)
+    npz         columnar, si NumPy está instalado (un arreglo .npy por columna)
+- Cada archivo lleva la "firma" de los datos, hecha con marcas de cambio
+  baratas (MarcaCatalogo, MAX/COUNT indexados, VentaHoraria), nunca
+  recorriendo las filas exportadas. La
+  calcula la tarea, no la vista: si nada cambió desde la última exportación,
+  se reutiliza el archivo en lugar de volver a generarlo.
+"""
+import csv
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Max, Sum
+
+from ..models import Pedido, Producto, Tarea, VentaHoraria
+from . import tareas_service, validadores_service, ventas_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional
+    pa = pq = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+# Filas por lote que trae el cursor de la BD (y por grupo de filas en Parquet)
+LOTE = 2000
+
+# Archivos que se conservan por reporte y formato (los más nuevos)
+ARCHIVOS_POR_REPORTE = 3
+
+ESTADOS_PEDIDO = dict(Pedido.ESTADO_CHOICES)
+
+
+@dataclass(frozen=True)
+class Reporte:
+    """
+    columnas: (nombre, tipo) con tipo texto, entero, decimal, fecha, fecha_hora o booleano
+    consulta: devuelve el values_list con las columnas en ese orden
+    a_csv: convierte una fila al formato legible del CSV
+    firma: valores que cambian cuando cambian los datos del reporte (una consulta)
+    contar: total de filas para el progreso, sin los JOIN ni GROUP BY de la consulta
+    """
+    encabezado: tuple
+    columnas: tuple
+    consulta: Callable
+    a_csv: Callable
+    firma: Callable
+    contar: Callable
+
+
+def _firma_catalogo():
+    return validadores_service.estado_catalogo()[0]
+
+
+def _firma_pedidos_usuarios():
+    # El username sale en los pedidos y el conteo de pedidos en los clientes:
+    # los dos reportes dependen de ambas marcas. Pedido no lleva fila en
+    # MarcaCatalogo (sería una escritura más por compra): fecha_actualizacion
+    # cambia en cada save() y en los update() masivos; COUNT cubre los borrados.
+    return (
+        validadores_service.versiones('usuario'),
+        Pedido.objects.aggregate(Max('fecha_actualizacion'), Count('id')),
+    )
+
+
+REPORTES = {
+    'pedidos': Reporte(
+        encabezado=('Número', 'Cliente', 'Total', 'Estado', 'Fecha'),
+        columnas=(('numero', 'texto'), ('cliente', 'texto'), ('total', 'decimal'),
+                  ('estado', 'texto'), ('fecha', 'fecha_hora')),
+        consulta=lambda: Pedido.objects.order_by('-fecha_pedido').values_list(
+            'numero_pedido', 'usuario__username', 'total', 'estado', 'fecha_pedido'
+        ),
+        a_csv=lambda f: [f[0], f[1], f[2], ESTADOS_PEDIDO.get(f[3], f[3]), f[4].strftime('%d/%m/%Y %H:%M')],
+        firma=_firma_pedidos_usuarios,
+        contar=lambda: Pedido.objects.count(),
+    ),
+    'productos': Reporte(
+        encabezado=('Nombre', 'Precio', 'Stock', 'Categoría', 'Disponible'),
+        columnas=(('nombre', 'texto'), ('precio', 'decimal'), ('stock', 'entero'),
+                  ('categoria', 'texto'), ('disponible', 'booleano')),
+        consulta=lambda: Producto.objects.order_by('id').values_list(
+            'nombre', 'precio', 'stock', 'categoria__nombre', 'disponible'
+        ),
+        a_csv=lambda f: [f[0], f[1], f[2], f[3] or 'N/A', 'Sí' if f[4] else 'No'],
+        firma=_firma_catalogo,
+        contar=lambda: Producto.objects.count(),
+    ),
+    'clientes': Reporte(
+        encabezado=('Username', 'Email', 'Fecha Registro', 'Total Pedidos'),
+        columnas=(('username', 'texto'), ('email', 'texto'), ('fecha_registro', 'fecha_hora'),
+                  ('total_pedidos', 'entero')),
+        consulta=lambda: User.objects.filter(is_staff=False).annotate(
+            total_pedidos=Count('pedido')
+        ).order_by('id').values_list('username', 'email', 'date_joined', 'total_pedidos'),
+        a_csv=lambda f: [f[0], f[1], f[2].strftime('%d/%m/%Y'), f[3]],
+        firma=_firma_pedidos_usuarios,
+        contar=lambda: User.objects.filter(is_staff=False).count(),
+    ),
+    'ventas': Reporte(
+        # Desde el resumen por hora: una fila por día, sin recorrer los pedidos
+        encabezado=('Fecha', 'Pedidos', 'Cancelados', 'Unidades', 'Ventas', 'Descuentos', 'Reembolsos', 'Neto'),
+        columnas=(('fecha', 'fecha'), ('pedidos', 'entero'), ('cancelados', 'entero'), ('unidades', 'entero'),
+                  ('ventas', 'decimal'), ('descuentos', 'decimal'), ('reembolsos', 'decimal'), ('neto', 'decimal')),
+        consulta=lambda: ventas_service.ventas_por_dia().annotate(neto=F('ventas') - F('reembolsos')).values_list(
+            'fecha', 'pedidos', 'pedidos_cancelados', 'unidades', 'ventas', 'descuentos', 'reembolsos', 'neto'
+        ),
+        a_csv=lambda f: [f[0].strftime('%d/%m/%Y'), *f[1:]],
+        firma=lambda: VentaHoraria.objects.aggregate(
+            Count('id'), Sum('pedidos'), Sum('pedidos_cancelados'), Sum('reembolsos')
+        ),
+        contar=lambda: ventas_service.ventas_por_dia().count(),
+    ),
+}
+
+
+def filas(tipo):
+    """Generador de filas del reporte con los valores tal cual salen de la BD"""
+    if tipo not in REPORTES:
+        raise ValueError(f'Reporte desconocido: {tipo}')
+    return REPORTES[tipo].consulta().iterator(chunk_size=LOTE)
+
+
+class _Eco:
+    """Pseudo-archivo: csv.writer escribe y la línea vuelve tal cual"""
+
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(tipo):
+    """Generador de líneas CSV (texto) del reporte; la primera es el encabezado"""
+    reporte = REPORTES[tipo]
+    writer = csv.writer(_Eco())
+    yield writer.writerow(reporte.encabezado)
+    for fila in filas(tipo):
+        yield writer.writerow(reporte.a_csv(fila))
+
+
+# ============== EXPORTACIÓN EN SEGUNDO PLANO ==============
+
+def formatos_disponibles():
+    """Formatos de archivo que se pueden generar con las librerías instaladas"""
+    formatos = ['csv.gz', 'jsonl.gz']
+    if pq is not None:
+        formatos.append('parquet')
+    if np is not None:
+        formatos.append('npz')
+    return formatos
+
+
+def directorio():
+    ruta = Path(getattr(settings, 'EXPORTACIONES_DIR', Path(settings.BASE_DIR) / 'exportaciones'))
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def firma(tipo):
+    """Huella corta del estado actual de los datos del reporte"""
+    valores = REPORTES[tipo].firma()
+    return hashlib.sha1(repr((tipo, valores)).encode()).hexdigest()[:12]
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _escribir_csv_gz(ruta, tipo, avance):
+    reporte = REPORTES[tipo]
+    with gzip.open(ruta, 'wt', encoding='utf-8', newline='') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow(reporte.encabezado)
+        for fila in avance(filas(tipo)):
+            writer.writerow(reporte.a_csv(fila))
+
+
+def _escribir_jsonl_gz(ruta, tipo, avance):
+    nombres = [nombre for nombre, _ in REPORTES[tipo].columnas]
+    with gzip.open(ruta, 'wt', encoding='utf-8') as archivo:
+        for fila in avance(filas(tipo)):
+            archivo.write(json.dumps(dict(zip(nombres, map(_valor_json, fila))), ensure_ascii=False))
+            archivo.write('\n')
+
+
+def _por_lotes(iterable):
+    lote = []
+    for fila in iterable:
+        lote.append(fila)
+        if len(lote) == LOTE:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _escribir_parquet(ruta, tipo, avance):
+    tipos = {
+        'texto': pa.string(), 'entero': pa.int64(), 'decimal': pa.decimal128(14, 2),
+        'fecha': pa.date32(), 'fecha_hora': pa.timestamp('us', tz='UTC'), 'booleano': pa.bool_(),
+    }
+    esquema = pa.schema([(nombre, tipos[tipo_col]) for nombre, tipo_col in REPORTES[tipo].columnas])
+    with pq.ParquetWriter(ruta, esquema, compression='zstd') as writer:
+        # Un grupo de filas por lote: nunca se arma la tabla completa en memoria
+        for lote in _por_lotes(avance(filas(tipo))):
+            writer.write_batch(pa.record_batch(list(map(list, zip(*lote))), schema=esquema))
+
+
+def _escribir_npz(ruta, tipo, avance):
+    """
+    Un .npy por columna dentro del zip. Cada columna se va volcando a un archivo
+    temporal por lotes y al final se copia con su encabezado (ya con el largo).
+    Los textos se guardan como 'U<máximo>' (NumPy no tiene textos de largo variable).
+    """
+    columnas = REPORTES[tipo].columnas
+    dtypes = {'entero': np.int64, 'decimal': np.float64, 'fecha': 'datetime64[D]',
+              'fecha_hora': 'datetime64[us]', 'booleano': np.bool_}
+    with tempfile.TemporaryDirectory(dir=directorio()) as temporal:
+        volcados = [open(os.path.join(temporal, nombre), 'w+b') for nombre, _ in columnas]
+        largos = [0] * len(columnas)
+        total = 0
+        try:
+            for lote in _por_lotes(avance(filas(tipo))):
+                total += len(lote)
+                for i, ((_, tipo_col), valores) in enumerate(zip(columnas, zip(*lote))):
+                    if tipo_col == 'texto':
+                        valores = ['' if v is None else v for v in valores]
+                        largos[i] = max(largos[i], max(map(len, valores)))
+                        volcados[i].write(''.join(json.dumps(v) + '\n' for v in valores).encode())
+                    else:
+                        if tipo_col == 'fecha_hora':
+                            valores = [v.replace(tzinfo=None) for v in valores]  # UTC
+                        np.asarray(valores, dtype=dtypes[tipo_col]).tofile(volcados[i])
+
+            with zipfile.ZipFile(ruta, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as destino:
+                for (nombre, tipo_col), volcado, largo in zip(columnas, volcados, largos):
+                    dtype = np.dtype(f'U{max(largo, 1)}' if tipo_col == 'texto' else dtypes[tipo_col])
+                    volcado.seek(0)
+                    with destino.open(f'{nombre}.npy', 'w', force_zip64=True) as npy:
+                        np.lib.format.write_array_header_1_0(npy, {
+                            'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (total,),
+                        })
+                        if tipo_col == 'texto':
+                            for lote in _por_lotes(volcado):
+                                npy.write(np.array([json.loads(linea) for linea in lote], dtype=dtype).tobytes())
+                        else:
+                            while bloque := volcado.read(1 << 20):
+                                npy.write(bloque)
+        finally:
+            for volcado in volcados:
+                volcado.close()
+
+
+ESCRITORES = {
+    'csv.gz': _escribir_csv_gz,
+    'jsonl.gz': _escribir_jsonl_gz,
+    'parquet': _escribir_parquet,
+    'npz': _escribir_npz,
+}
+
+
+def nombre_archivo(tipo, formato, huella):
+    return f'reporte_{tipo}_{huella}.{formato}'
+
+
+def _limpiar_anteriores(tipo, formato):
+    """Borra las exportaciones viejas de ese reporte y formato (deja las más nuevas)"""
+    archivos = sorted(directorio().glob(f'reporte_{tipo}_*.{formato}'), key=lambda a: a.stat().st_mtime, reverse=True)
+    for archivo in archivos[ARCHIVOS_POR_REPORTE:]:
+        archivo.unlink(missing_ok=True)
+
+
+def exportar(tipo, formato, progreso=None):
+    """
+    Genera el archivo del reporte (o reutiliza el de la misma firma).
+
+    Args:
+        progreso: función (actual, total) para informar el avance
+
+    Returns:
+        Dict con archivo, firma, filas y si se reutilizó
+    """
+    if tipo not in REPORTES:
+        raise ValueError(f'Reporte desconocido: {tipo}')
+    if formato not in formatos_disponibles():
+        raise ValueError(f'Formato no disponible: {formato}')
+
+    # Sin transacción: la tarea escribe su progreso mientras tanto. Si los datos
+    # cambian durante la exportación, la próxima firma ya no coincide y se regenera.
+    huella = firma(tipo)
+    ruta = directorio() / nombre_archivo(tipo, formato, huella)
+    if ruta.exists():
+        return {'archivo': ruta.name, 'firma': huella, 'filas': None, 'reutilizado': True}
+
+    total = REPORTES[tipo].contar()
+    contador = {'filas': 0}
+
+    def avance(iterable):
+        for fila in iterable:
+            yield fila
+            contador['filas'] += 1
+            if progreso and contador['filas'] % LOTE == 0:
+                progreso(contador['filas'], total)
+
+    # Se escribe con otro nombre y se renombra: nadie descarga un archivo a medias
+    temporal = ruta.with_name(f'.{ruta.name}.{os.getpid()}.tmp')
+    try:
+        ESCRITORES[formato](temporal, tipo, avance)
+        os.replace(temporal, ruta)
+    finally:
+        temporal.unlink(missing_ok=True)
+
+    _limpiar_anteriores(tipo, formato)
+    return {'archivo': ruta.name, 'firma': huella, 'filas': contador['filas'], 'reutilizado': False}
+
+
+def solicitar_exportacion(tipo, formato, usuario=None):
+    """
+    Encola la exportación, salvo que ya haya una con los mismos parámetros en
+    cola o en curso. No consulta los datos: la firma la calcula la tarea, que
+    reutiliza el archivo si nada cambió.
+
+    Returns:
+        Tupla (tarea, nueva)
+    """
+    if tipo not in REPORTES:
+        raise ValueError(f'Reporte desconocido: {tipo}')
+    if formato not in formatos_disponibles():
+        raise ValueError(f'Formato no disponible: {formato}')
+
+    parametros = {'tipo': tipo, 'formato': formato}
+    en_curso = Tarea.objects.filter(
+        tipo='exportar_reporte', estado__in=('pendiente', 'en_proceso'), parametros=parametros
+    ).order_by('-id').first()
+    if en_curso:
+        return en_curso, False
+    return tareas_service.encolar('exportar_reporte', parametros, usuario=usuario), True
+
+
+def ruta_descarga(tarea):
+    """Ruta del archivo de una exportación terminada, o None si ya no existe"""
+    archivo = (tarea.resultado or {}).get('archivo')
+    if tarea.tipo != 'exportar_reporte' or tarea.estado != 'completada' or not archivo:
+        return None
+    ruta = directorio() / os.path.basename(archivo)
+    return ruta if ruta.exists() else None
@@ -0,0 +1,179 @@
+"""
+Servicio de reservas de stock para BitForge
+Al entrar al checkout se reservan las cantidades del carrito por unos minutos
+(ReservaStock). El stock disponible para los demás clientes es:
+
+    stock - reservas activas (expira > ahora) de otros usuarios
+
+- Reservar es optimista: se insertan las reservas y luego se verifica con una
+  consulta agregada que no se haya pasado del stock; si se pasó, se retiran.
+- El catálogo y el detalle leen las reservas activas de un contador en caché por
+  producto (cache.get_many), no sumando la tabla en cada visita.
+- Las reservas no cambian la versión del catálogo (ETag, facetas): las páginas
+  que muestran stock disponible suman al ETag validador_reservas(), que solo
+  cambia mientras hay reservas activas y como mucho cada CACHE_TTL_MAX segundos.
+- El comando expirar_reservas borra las reservas vencidas con un solo DELETE.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import IntegerField, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Producto, ReservaStock
+
+# Minutos que dura una reserva desde que el cliente entra al checkout
+MINUTOS_RESERVA = getattr(settings, 'RESERVA_STOCK_MINUTOS', 15)
+
+# Tope de vida del contador en caché (otros workers con LocMem no ven la invalidación)
+CACHE_TTL_MAX = 30  # segundos
+
+# Expiración más lejana de las reservas activas (validador de las páginas con stock)
+CLAVE_VIGENCIA = 'reservas:vigencia'
+
+
+def _clave(producto_id):
+    return f'reservas:{producto_id}'
+
+
+def _reservas_activas(producto_ids):
+    """{producto_id: (unidades reservadas, expiración más próxima)} en una consulta"""
+    reservas = ReservaStock.objects.filter(producto_id__in=producto_ids, expira__gt=timezone.now())
+    filas = reservas.values('producto_id').annotate(total=Sum('cantidad'), proxima=Min('expira'))
+    return {fila['producto_id']: (fila['total'], fila['proxima']) for fila in filas}
+
+
+def invalidar(producto_ids):
+    cache.delete_many([_clave(pid) for pid in producto_ids] + [CLAVE_VIGENCIA])
+
+
+def vigencia_reservas():
+    """Expiración más lejana de las reservas activas, o None (en caché hasta CACHE_TTL_MAX)"""
+    vigencia = cache.get(CLAVE_VIGENCIA, False)  # None también se guarda: sin reservas
+    if vigencia is False:
+        vigencia = ReservaStock.objects.filter(expira__gt=timezone.now()).aggregate(Max('expira'))['expira__max']
+        cache.set(CLAVE_VIGENCIA, vigencia, CACHE_TTL_MAX)
+    return vigencia
+
+
+def validador_reservas():
+    """
+    Parte del ETag de las páginas que muestran stock disponible.
+    Sin reservas activas es fija ('r0'); con reservas cambia una vez por ventana
+    de CACHE_TTL_MAX segundos (el mismo retraso que ya tiene el contador en
+    caché), no en cada checkout.
+
+    Returns:
+        Tupla (etiqueta, inicio de la ventana o None)
+    """
+    vigencia = vigencia_reservas()
+    ahora = timezone.now()
+    if vigencia is None or vigencia <= ahora:
+        return 'r0', None
+    ventana = int(ahora.timestamp()) // CACHE_TTL_MAX
+    return f'r{ventana}', datetime.fromtimestamp(ventana * CACHE_TTL_MAX, tz=dt_timezone.utc)
+
+
+def unidades_reservadas(producto_ids):
+    """
+    Unidades reservadas por producto, desde el contador en caché.
+    Los que no están en caché se calculan en UNA consulta y se guardan hasta que
+    venza su reserva más próxima (así el contador nunca cuenta reservas vencidas).
+    """
+    producto_ids = list(set(producto_ids))
+    if not producto_ids:
+        return {}
+    en_cache = cache.get_many([_clave(pid) for pid in producto_ids])
+    reservadas = {pid: en_cache[_clave(pid)] for pid in producto_ids if _clave(pid) in en_cache}
+
+    faltantes = [pid for pid in producto_ids if pid not in reservadas]
+    if faltantes:
+        activas = _reservas_activas(faltantes)
+        ahora = timezone.now()
+        for pid in faltantes:
+            total, proxima = activas.get(pid, (0, None))
+            reservadas[pid] = total
+            ttl = CACHE_TTL_MAX
+            if proxima is not None:
+                ttl = max(1, min(ttl, int((proxima - ahora).total_seconds())))
+            cache.set(_clave(pid), total, ttl)
+    return reservadas
+
+
+def anotar_disponible(productos):
+    """Asigna producto.stock_disponible (stock - reservas activas) a una lista de productos"""
+    productos = list(productos)
+    reservadas = unidades_reservadas(p.id for p in productos)
+    for producto in productos:
+        producto.stock_disponible = max(0, producto.stock - reservadas.get(producto.id, 0))
+    return productos
+
+
+def reservar_carrito(usuario, items):
+    """
+    Reserva (o renueva) las cantidades del carrito del usuario.
+
+    Returns:
+        Tupla (expira, faltantes, agotados) - faltantes: productos cuyo stock
+        alcanza para la línea pero lo tienen reservado otros clientes; agotados:
+        productos sin stock suficiente aunque nadie más los reserve. Esas líneas
+        quedan sin reservar
+    """
+    expira = timezone.now() + timedelta(minutes=MINUTOS_RESERVA)
+    producto_ids = [item.producto_id for item in items]
+
+    with transaction.atomic():
+        ReservaStock.objects.filter(usuario=usuario).delete()
+        ReservaStock.objects.bulk_create([
+            ReservaStock(usuario=usuario, producto_id=item.producto_id, cantidad=item.cantidad, expira=expira)
+            for item in items
+        ])
+
+        # Verificación optimista: reservas de todos (incluida la nueva) contra el stock actual
+        activas = _reservas_activas(producto_ids)
+        stock = dict(Producto.objects.filter(id__in=producto_ids).values_list('id', 'stock'))
+        faltantes, agotados = [], []
+        for item in items:
+            disponible = stock.get(item.producto_id, 0)
+            if item.cantidad > disponible:
+                agotados.append(item.producto)
+            elif activas.get(item.producto_id, (0, None))[0] > disponible:
+                faltantes.append(item.producto)
+        if faltantes or agotados:
+            ReservaStock.objects.filter(usuario=usuario, producto__in=faltantes + agotados).delete()
+
+        transaction.on_commit(lambda: invalidar(producto_ids))
+
+    return expira, faltantes, agotados
+
+
+def liberar_reservas(usuario):
+    """Libera las reservas del usuario (después de pagar o al vaciar el carrito)"""
+    producto_ids = list(ReservaStock.objects.filter(usuario=usuario).values_list('producto_id', flat=True))
+    if not producto_ids:
+        return 0
+    eliminadas, _ = ReservaStock.objects.filter(usuario=usuario).delete()
+    transaction.on_commit(lambda: invalidar(producto_ids))
+    return eliminadas
+
+
+def reservado_por_otros(usuario):
+    """Subconsulta: unidades reservadas por otros clientes del producto de la fila externa"""
+    reservas = ReservaStock.objects.filter(
+        producto=OuterRef('pk'), expira__gt=timezone.now()
+    ).exclude(usuario=usuario).order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    return Coalesce(Subquery(reservas, output_field=IntegerField()), 0)
+
+
+def expirar_reservas():
+    """Barrido: borra todas las reservas vencidas con un solo DELETE"""
+    vencidas = ReservaStock.objects.filter(expira__lte=timezone.now())
+    producto_ids = list(vencidas.values_list('producto_id', flat=True).distinct())
+    if not producto_ids:
+        return 0
+    eliminadas, _ = vencidas.delete()
+    invalidar(producto_ids)
+    return eliminadas
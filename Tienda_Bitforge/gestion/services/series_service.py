@@ -0,0 +1,240 @@
+"""
+Servicio de series de tiempo de ventas para BitForge (gráficas del panel)
+Devuelve ingresos, pedidos y unidades por intervalo (minuto, hora, día o semana)
+en formato columnar, listo para Chart.js.
+
+- La serie se arma con "segmentos" de tamaño fijo alineados a la época:
+    minuto: segmentos de 1 día, desde Pedido (columnas fecha_pedido/total/unidades)
+    hora/día/semana: segmentos de 7 días de horas, desde el resumen VentaHoraria
+  Cada segmento se guarda en caché; al desplazar la gráfica solo se calculan los
+  segmentos nuevos, y ventas_service invalida los segmentos que toca un cambio.
+  Los segmentos que faltan se calculan juntos, con una sola consulta de rango.
+- Si el rango pide más de max_puntos intervalos, se agrandan los intervalos
+  (downsampling) sumando los contiguos: los totales no cambian.
+- Con NumPy instalado el agrupamiento es vectorial; sin él, Python puro.
+
+Los ingresos son los de pedidos no cancelados (no descuentan reembolsos).
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Pedido, VentaHoraria
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+MINUTO = 60
+HORA = 3600
+
+# granularidad -> (base en segundos, intervalos base por punto)
+GRANULARIDADES = {
+    'minuto': (MINUTO, 1),
+    'hora': (HORA, 1),
+    'dia': (HORA, 24),
+    'semana': (HORA, 24 * 7),
+}
+
+# Intervalos base por segmento en caché
+TAMANO_SEGMENTO = {MINUTO: 24 * 60, HORA: 24 * 7}
+
+# Rango máximo por base (consultas en frío acotadas)
+RANGO_MAXIMO = {MINUTO: timedelta(days=31), HORA: timedelta(days=366 * 5)}
+
+MAX_PUNTOS = 500
+LIMITE_PUNTOS = 5000
+
+SEGMENTO_TTL = 600  # Segmentos cerrados (ventas_service invalida los que cambian)
+SEGMENTO_ABIERTO_TTL = 30  # Segmento que incluye el momento actual
+
+CLAVE_VERSION = 'serie:version'
+
+
+class ErrorSerie(ValueError):
+    """Parámetros inválidos para la serie (el mensaje se devuelve al cliente)"""
+
+
+def _epoca(momento):
+    return int(momento.timestamp())
+
+
+def _version():
+    return cache.get_or_set(CLAVE_VERSION, 1, timeout=None)
+
+
+def _clave(base, indice, version):
+    return f'serie:v{version}:{base}:{indice}'
+
+
+def _indice_segmento(segundos, base):
+    return segundos // (base * TAMANO_SEGMENTO[base])
+
+
+def invalidar(momentos):
+    """Descarta los segmentos (minuto y hora) que contienen esos instantes"""
+    version = _version()
+    claves = {
+        _clave(base, _indice_segmento(_epoca(momento), base), version)
+        for momento in momentos for base in TAMANO_SEGMENTO
+    }
+    cache.delete_many(list(claves))
+
+
+def invalidar_todo():
+    """Descarta todos los segmentos (después de reconstruir los resúmenes)"""
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.set(CLAVE_VERSION, 2, timeout=None)
+
+
+def _agrupar(indices, columnas, cantidad):
+    """Suma cada columna por índice de intervalo -> listas de largo cantidad"""
+    if np is not None and len(indices):
+        idx = np.asarray(indices, dtype=np.int64)
+        return [np.bincount(idx, weights=np.asarray(col, dtype=np.float64), minlength=cantidad).tolist()
+                for col in columnas]
+    resultado = [[0.0] * cantidad for _ in columnas]
+    for fila, i in enumerate(indices):
+        for destino, col in zip(resultado, columnas):
+            destino[i] += col[fila]
+    return resultado
+
+
+def _calcular_segmentos(base, primero, ultimo):
+    """
+    Segmentos primero..ultimo con UNA consulta de rango.
+
+    Returns:
+        Dict {indice: [ingresos, pedidos, unidades] por intervalo base}
+    """
+    tamano = TAMANO_SEGMENTO[base]
+    cantidad = ultimo - primero + 1
+    inicio_s = primero * base * tamano
+    inicio = datetime.fromtimestamp(inicio_s, tz=dt_timezone.utc)
+    fin = inicio + timedelta(seconds=base * tamano * cantidad)
+
+    if base == MINUTO:
+        filas = list(Pedido.objects.filter(fecha_pedido__gte=inicio, fecha_pedido__lt=fin).exclude(
+            estado='cancelado'
+        ).annotate(u=Coalesce(Sum('items__cantidad'), 0)).order_by().values_list('fecha_pedido', 'total', 'u'))
+        fechas = [fila[0] for fila in filas]
+        totales = [fila[1] for fila in filas]
+        unidades = [fila[2] for fila in filas]
+        pedidos = [1] * len(filas)
+    else:
+        filas = VentaHoraria.objects.filter(hora__gte=inicio, hora__lt=fin).values_list(
+            'hora', 'ventas', 'pedidos', 'pedidos_cancelados', 'unidades'
+        )
+        fechas, totales, pedidos, unidades = [], [], [], []
+        for hora, ventas, creados, cancelados, unidades_hora in filas:
+            fechas.append(hora)
+            totales.append(ventas)
+            pedidos.append(creados - cancelados)
+            unidades.append(unidades_hora)
+
+    indices = [(_epoca(fecha) - inicio_s) // base for fecha in fechas]
+    columnas = _agrupar(indices, [[float(t) for t in totales], pedidos, unidades], tamano * cantidad)
+    return {
+        primero + n: [col[n * tamano:(n + 1) * tamano] for col in columnas]
+        for n in range(cantidad)
+    }
+
+
+def _segmentos(base, primero, ultimo, ahora_s, version):
+    """Segmentos primero..ultimo en orden: de la caché, y los que faltan en una consulta"""
+    claves = {indice: _clave(base, indice, version) for indice in range(primero, ultimo + 1)}
+    en_cache = cache.get_many(list(claves.values()))
+    segmentos = {indice: en_cache[clave] for indice, clave in claves.items() if clave in en_cache}
+    faltantes = [indice for indice in claves if indice not in segmentos]
+    if faltantes:
+        # Un solo rango aunque haya segmentos en caché en el medio (se recalculan sin guardarlos)
+        calculados = _calcular_segmentos(base, faltantes[0], faltantes[-1])
+        limite = ahora_s // (base * TAMANO_SEGMENTO[base])  # Segmento abierto (incluye ahora)
+        cerrados = {claves[i]: calculados[i] for i in faltantes if i < limite}
+        abiertos = {claves[i]: calculados[i] for i in faltantes if i >= limite}
+        cache.set_many(cerrados, SEGMENTO_TTL)
+        cache.set_many(abiertos, SEGMENTO_ABIERTO_TTL)
+        segmentos.update((i, calculados[i]) for i in faltantes)
+    return [segmentos[indice] for indice in range(primero, ultimo + 1)]
+
+
+def _alinear(momento, granularidad):
+    """Inicio del intervalo que contiene a momento (día y semana en hora local)"""
+    local = timezone.localtime(momento)
+    if granularidad == 'minuto':
+        return local.replace(second=0, microsecond=0)
+    if granularidad == 'hora':
+        return local.replace(minute=0, second=0, microsecond=0)
+    local = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularidad == 'semana':
+        local -= timedelta(days=local.weekday())  # Lunes
+    return local
+
+
+def serie_ventas(desde, hasta, granularidad='dia', max_puntos=MAX_PUNTOS):
+    """
+    Serie de ventas entre desde y hasta (datetimes aware, hasta exclusivo).
+
+    Returns:
+        Dict columnar: t (ISO), ingresos, pedidos, unidades, paso_segundos y
+        granularidad efectiva (puede ser más gruesa por el downsampling)
+
+    Raises:
+        ErrorSerie: granularidad desconocida, rango vacío o demasiado largo
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ErrorSerie(f'Granularidad inválida: usa {", ".join(GRANULARIDADES)}')
+    if not 1 <= max_puntos <= LIMITE_PUNTOS:
+        raise ErrorSerie(f'max_puntos debe estar entre 1 y {LIMITE_PUNTOS}')
+    base, por_punto = GRANULARIDADES[granularidad]
+    if hasta <= desde:
+        raise ErrorSerie('El rango está vacío: "hasta" debe ser posterior a "desde"')
+    if hasta - desde > RANGO_MAXIMO[base]:
+        raise ErrorSerie(f'Rango demasiado largo para la granularidad {granularidad}')
+
+    inicio = _alinear(desde, granularidad)
+    inicio_s = _epoca(inicio)
+    intervalos = math.ceil((_epoca(hasta) - inicio_s) / (base * por_punto))
+    # Downsampling: juntar intervalos contiguos hasta no pasar de max_puntos
+    factor = math.ceil(intervalos / max_puntos)
+    paso = base * por_punto * factor
+    puntos = math.ceil(intervalos / factor)
+    fin_s = inicio_s + puntos * paso
+
+    # Columnas base contiguas [inicio, fin) armadas con los segmentos en caché
+    version = _version()
+    ahora_s = _epoca(timezone.now())
+    tamano = TAMANO_SEGMENTO[base]
+    primero = _indice_segmento(inicio_s, base)
+    ultimo = _indice_segmento(fin_s - 1, base)
+    columnas = [[], [], []]
+    for segmento in _segmentos(base, primero, ultimo, ahora_s, version):
+        for destino, datos in zip(columnas, segmento):
+            destino.extend(datos)
+    desplazamiento = (inicio_s - primero * base * tamano) // base
+    ancho = paso // base
+    columnas = [col[desplazamiento:desplazamiento + puntos * ancho] for col in columnas]
+
+    if np is not None:
+        sumas = [np.asarray(col).reshape(puntos, ancho).sum(axis=1).tolist() for col in columnas]
+    else:
+        sumas = [[sum(col[i:i + ancho]) for i in range(0, len(col), ancho)] for col in columnas]
+    ingresos, pedidos, unidades = sumas
+
+    return {
+        'granularidad': granularidad if factor == 1 else f'{factor} x {granularidad}',
+        'paso_segundos': paso,
+        'desde': inicio.isoformat(),
+        'hasta': datetime.fromtimestamp(fin_s, tz=inicio.tzinfo).isoformat(),
+        't': [datetime.fromtimestamp(inicio_s + i * paso, tz=inicio.tzinfo).isoformat() for i in range(puntos)],
+        'ingresos': [round(v, 2) for v in ingresos],
+        'pedidos': [int(round(v)) for v in pedidos],
+        'unidades': [int(round(v)) for v in unidades],
+    }
@@ -0,0 +1,250 @@
+"""
+Servicio de tareas en segundo plano para BitForge
+Cola simple sobre la tabla Tarea: las vistas encolan y responden de inmediato,
+y el comando `python manage.py procesar_tareas` las ejecuta con un pool de
+hilos/procesos.
+
+- Las tareas se registran con el decorador @tarea('nombre') (gestion/tareas.py).
+- Reclamar una tarea es un UPDATE condicional (estado pendiente -> en_proceso),
+  así dos workers nunca ejecutan la misma; funciona igual en SQLite y PostgreSQL.
+- Cada tarea tiene un "lease" (bloqueada_hasta): si el worker muere, vence y
+  otro worker la retoma. Mientras la tarea corre, un hilo de latido lo renueva
+  cada INTERVALO_LATIDO aunque la tarea no reporte progreso (p. ej. llamadas
+  HTTP largas). Progreso, resultado y fallo se guardan solo si el
+  lease sigue siendo del worker (mismo worker y mismo intento): un worker
+  lento cuya tarea fue retomada no pisa el estado del nuevo dueño.
+- Si falla, se reintenta con espera exponencial hasta max_intentos.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import Tarea
+
+logger = logging.getLogger(__name__)
+
+# Duración del lease; lo renuevan el latido y cada reporte de progreso
+DURACION_BLOQUEO = timedelta(minutes=10)
+
+# Cada cuánto el latido renueva el lease (varias veces antes de que venza)
+INTERVALO_LATIDO = DURACION_BLOQUEO / 5
+
+# Espera antes del reintento n: BASE_REINTENTO * 2^(n-1)
+BASE_REINTENTO = timedelta(seconds=10)
+
+# Candidatas que se leen por intento de reclamo (evita que todos los workers peleen por la misma)
+CANDIDATAS = 5
+
+REGISTRO = {}
+
+
+class LeasePerdido(Exception):
+    """El lease de la tarea venció y la retomó otro worker"""
+
+
+def tarea(nombre):
+    """Registra una función como tarea: func(contexto, **parametros) -> resultado (JSON)"""
+    def decorador(funcion):
+        REGISTRO[nombre] = funcion
+        return funcion
+    return decorador
+
+
+def encolar(tipo, parametros=None, usuario=None, max_intentos=3):
+    """Crea una tarea pendiente y la devuelve (no espera a que se ejecute)"""
+    if tipo not in REGISTRO:
+        raise ValueError(f'Tarea no registrada: {tipo}')
+    return Tarea.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        max_intentos=max_intentos,
+        disponible_desde=timezone.now(),
+        creada_por=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+
+
+def nombre_worker():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def reclamar(worker):
+    """Toma la próxima tarea disponible para este worker, o None si no hay"""
+    ahora = timezone.now()
+    # Tareas cuyo worker murió y ya agotaron sus intentos: no se retoman más
+    Tarea.objects.filter(
+        estado='en_proceso', bloqueada_hasta__lt=ahora, intentos__gte=F('max_intentos')
+    ).update(estado='fallida', mensaje='El worker se detuvo durante la ejecución', fecha_fin=ahora)
+
+    disponibles = Q(estado='pendiente', disponible_desde__lte=ahora) | Q(
+        estado='en_proceso', bloqueada_hasta__lt=ahora  # Lease vencido: el worker anterior murió
+    )
+    candidatas = Tarea.objects.filter(disponibles).order_by('disponible_desde', 'id').values_list(
+        'id', 'estado', 'bloqueada_hasta'
+    )[:CANDIDATAS]
+    for tarea_id, estado, bloqueada_hasta in candidatas:
+        tomada = Tarea.objects.filter(id=tarea_id, estado=estado, bloqueada_hasta=bloqueada_hasta).update(
+            estado='en_proceso',
+            worker=worker,
+            bloqueada_hasta=ahora + DURACION_BLOQUEO,
+            fecha_inicio=ahora,
+            progreso=0,
+            intentos=F('intentos') + 1,  # Cuenta al reclamar: también si el worker se cae
+        )
+        if tomada:
+            return Tarea.objects.get(id=tarea_id)
+    return None
+
+
+def _del_worker(tarea):
+    """La tarea mientras siga reclamada por este worker (mismo reclamo: worker e intento)"""
+    return Tarea.objects.filter(id=tarea.id, estado='en_proceso', worker=tarea.worker, intentos=tarea.intentos)
+
+
+def renovar_lease(tarea):
+    """Extiende el lease de la tarea; False si ya no es de este worker"""
+    return bool(_del_worker(tarea).update(bloqueada_hasta=timezone.now() + DURACION_BLOQUEO))
+
+
+class Latido:
+    """
+    Hilo que renueva el lease mientras corre la función de la tarea.
+    Si el lease se perdió, marca `perdido` y el próximo progreso() lanza LeasePerdido.
+    """
+
+    def __init__(self, tarea, intervalo=None):
+        self.tarea = tarea
+        self.intervalo = (intervalo or INTERVALO_LATIDO).total_seconds()
+        self.perdido = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._latir, name=f'latido-tarea-{tarea.id}', daemon=True)
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+
+    def _latir(self):
+        try:
+            while not self._detener.wait(self.intervalo):
+                try:
+                    renovada = renovar_lease(self.tarea)
+                except DatabaseError:
+                    # P. ej. SQLite bloqueado por la transacción de la tarea: se reintenta en el próximo latido
+                    logger.warning('No se pudo renovar el lease de la tarea #%s', self.tarea.id, exc_info=True)
+                    continue
+                if not renovada:
+                    self.perdido.set()
+                    return
+        finally:
+            connection.close()  # Conexión propia de este hilo
+
+
+class Contexto:
+    """Se pasa a cada tarea para reportar avance (y renovar el lease)"""
+
+    INTERVALO_MINIMO = 1.0  # segundos entre escrituras de progreso
+
+    def __init__(self, tarea, latido=None):
+        self.tarea = tarea
+        self.latido = latido
+        self._ultimo = 0.0
+
+    @property
+    def parametros(self):
+        return self.tarea.parametros
+
+    def progreso(self, actual, total, mensaje=''):
+        """Guarda el porcentaje de avance (como máximo una vez por segundo)"""
+        if self.latido is not None and self.latido.perdido.is_set():
+            raise LeasePerdido(f'La tarea #{self.tarea.id} fue retomada por otro worker')
+        ahora = time.monotonic()
+        if actual < total and ahora - self._ultimo < self.INTERVALO_MINIMO:
+            return
+        self._ultimo = ahora
+        porcentaje = min(100, int(actual * 100 / total)) if total else 100
+        actualizada = _del_worker(self.tarea).update(
+            progreso=porcentaje,
+            mensaje=mensaje or f'{actual} de {total}',
+            bloqueada_hasta=timezone.now() + DURACION_BLOQUEO,
+        )
+        if not actualizada:
+            # Otro worker la retomó: detener la tarea en vez de seguir en paralelo
+            raise LeasePerdido(f'La tarea #{self.tarea.id} fue retomada por otro worker')
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya reclamada y guarda su resultado o programa el reintento"""
+    funcion = REGISTRO.get(tarea.tipo)
+    intentos = tarea.intentos
+    try:
+        if funcion is None:
+            raise ValueError(f'Tarea no registrada: {tarea.tipo}')
+        with Latido(tarea) as latido:
+            resultado = funcion(Contexto(tarea, latido), **tarea.parametros)
+    except LeasePerdido:
+        logger.warning('La tarea #%s (%s) fue retomada por otro worker; se abandona', tarea.id, tarea.tipo)
+        return False
+    except Exception as error:
+        logger.exception('Falló la tarea #%s (%s)', tarea.id, tarea.tipo)
+        ahora = timezone.now()
+        cambios = {
+            'mensaje': f'{error}\n\n{traceback.format_exc(limit=5)}',
+            'worker': '',
+            'bloqueada_hasta': None,
+        }
+        if intentos < tarea.max_intentos:
+            cambios.update(estado='pendiente', disponible_desde=ahora + BASE_REINTENTO * 2 ** (intentos - 1))
+        else:
+            cambios.update(estado='fallida', fecha_fin=ahora)
+        if not _del_worker(tarea).update(**cambios):
+            logger.warning('La tarea #%s (%s) fue retomada por otro worker; no se guarda el fallo', tarea.id, tarea.tipo)
+        return False
+
+    mensaje = resultado.get('mensaje', '') if isinstance(resultado, dict) else ''
+    guardada = _del_worker(tarea).update(
+        estado='completada',
+        progreso=100,
+        resultado=resultado,
+        mensaje=mensaje,
+        worker='',
+        bloqueada_hasta=None,
+        fecha_fin=timezone.now(),
+    )
+    if not guardada:
+        logger.warning('La tarea #%s (%s) fue retomada por otro worker; no se guarda el resultado', tarea.id, tarea.tipo)
+    return bool(guardada)
+
+
+def procesar_siguiente(worker=None):
+    """Reclama y ejecuta una tarea; devuelve False si la cola estaba vacía"""
+    tarea = reclamar(worker or nombre_worker())
+    if tarea is None:
+        return False
+    ejecutar(tarea)
+    return True
+
+
+def bucle_worker(intervalo=1.0, una_vez=False, detener=None):
+    """Procesa tareas hasta que se pida detener (o hasta vaciar la cola con una_vez)"""
+    worker = nombre_worker()
+    while detener is None or not detener.is_set():
+        close_old_connections()  # Como entre requests: no reutilizar conexiones caídas o viejas
+        if procesar_siguiente(worker):
+            continue
+        if una_vez:
+            return
+        if detener is not None:
+            detener.wait(intervalo)
+        else:
+            time.sleep(intervalo)
@@ -0,0 +1,161 @@
+"""
+Servicio de validadores HTTP (ETag / Last-Modified) para las páginas del catálogo
+La versión del catálogo sale de la tabla MarcaCatalogo (una fila por entidad:
+producto, reseña y categoría), que las señales incrementan dentro de la misma
+transacción del cambio. Leerla es UNA consulta, y si el navegador (o la CDN)
+ya tiene la versión vigente se responde 304 sin ejecutar la vista.
+
+Los cambios de stock (ventas, cancelaciones, bodega) solo cambian la versión
+cuando se notan en el catálogo: el producto se agota, vuelve a tener stock o
+está en "últimas unidades". El resto de las ventas no invalida las páginas
+en caché; el conteo exacto se pone al día con el próximo cambio visible.
+
+La fila de usuario no forma parte de la versión del catálogo: es parte de
+la firma barata de los reportes exportados (reportes_service).
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+ENTIDADES = ('producto', 'resena', 'categoria')
+
+# Marcas fuera del catálogo (firma de los reportes de pedidos y clientes)
+ENTIDADES_REPORTES = ('usuario',)
+
+
+def registrar_cambio(*entidades):
+    """
+    Marca como modificadas las entidades indicadas (por defecto todas).
+    Llamar también después de cambios masivos (update/bulk_create) que no disparan señales.
+    """
+    from ..models import MarcaCatalogo
+
+    ahora = timezone.now()
+    for entidad in entidades or ENTIDADES:
+        actualizadas = MarcaCatalogo.objects.filter(entidad=entidad).update(
+            version=F('version') + 1, fecha_modificacion=ahora
+        )
+        if not actualizadas:
+            MarcaCatalogo.objects.get_or_create(
+                entidad=entidad, defaults={'version': 1, 'fecha_modificacion': ahora}
+            )
+
+
+def stock_visible(antes, despues):
+    """True si pasar de antes a despues se nota en el catálogo (agotado / últimas unidades)"""
+    from ..models import Producto
+
+    return antes != despues and min(antes, despues) <= Producto.UMBRAL_BAJO_STOCK
+
+
+def registrar_cambio_stock(deltas):
+    """
+    Marca 'producto' después de un UPDATE masivo de stock, solo si algún cambio
+    se nota en el catálogo (ver stock_visible). Una consulta, más la marca si hace falta.
+
+    Args:
+        deltas: {producto_id: unidades sumadas (negativo si se descontaron)}, ya aplicadas
+    """
+    from ..models import Producto
+
+    visibles = Q()
+    for producto_id, delta in deltas.items():
+        if delta:
+            # El stock leído ya tiene el cambio: el anterior es stock - delta
+            visibles |= Q(id=producto_id, stock__lte=Producto.UMBRAL_BAJO_STOCK + max(delta, 0))
+    if visibles and Producto.objects.filter(visibles).exists():
+        registrar_cambio('producto')
+
+
+def estado_catalogo():
+    """
+    Versión y fecha de última modificación del catálogo en una sola consulta.
+
+    Returns:
+        Tupla (version, fecha) - version es un string estable y fecha puede ser None
+    """
+    from ..models import MarcaCatalogo
+
+    marcas = {
+        entidad: (version, fecha)
+        for entidad, version, fecha in MarcaCatalogo.objects.filter(entidad__in=ENTIDADES).values_list(
+            'entidad', 'version', 'fecha_modificacion'
+        )
+    }
+    version = '.'.join(str(marcas.get(entidad, (0, None))[0]) for entidad in ENTIDADES)
+    fechas = [fecha for _, fecha in marcas.values() if fecha is not None]
+    return version, max(fechas) if fechas else None
+
+
+def versiones(*entidades):
+    """Versión de cada entidad indicada, en ese orden (una consulta; 0 si nunca cambió)"""
+    from ..models import MarcaCatalogo
+
+    marcas = dict(MarcaCatalogo.objects.filter(entidad__in=entidades).values_list('entidad', 'version'))
+    return tuple(marcas.get(entidad, 0) for entidad in entidades)
+
+
+def _hay_mensajes_pendientes(request):
+    # len() no marca los mensajes como leídos: se siguen mostrando en la respuesta completa
+    return len(messages.get_messages(request)) > 0
+
+
+def condicional_catalogo(por_usuario=True, con_reservas=False):
+    """
+    Decorador para vistas GET que solo dependen del catálogo (y del usuario).
+
+    - ETag: versión del catálogo + usuario (la plantilla cambia según sesión y rol)
+    - Last-Modified: fecha de la última modificación del catálogo
+    - Responde 304 ante If-None-Match / If-Modified-Since vigentes, antes de la vista
+    - Si hay mensajes flash pendientes se genera la página completa para mostrarlos
+
+    Args:
+        por_usuario: False para respuestas iguales para todos (p. ej. JSON de búsqueda)
+        con_reservas: la página muestra stock disponible (descontando reservas);
+                      suma reservas_service.validador_reservas() al ETag
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or _hay_mensajes_pendientes(request):
+                return vista(request, *args, **kwargs)
+
+            version, fecha = estado_catalogo()
+            if por_usuario:
+                usuario = request.user.pk if request.user.is_authenticated else 0
+                etag = f'"cat-{version}-u{usuario}"'
+            else:
+                etag = f'"cat-{version}"'
+            if con_reservas:
+                from . import reservas_service
+
+                etiqueta, inicio = reservas_service.validador_reservas()
+                etag = f'{etag[:-1]}-{etiqueta}"'
+                if inicio is not None:
+                    fecha = max(fecha, inicio) if fecha else inicio
+            ultima_modificacion = int(fecha.timestamp()) if fecha else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=ultima_modificacion
+            )
+            if response is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response.headers.setdefault('ETag', etag)
+            if ultima_modificacion is not None:
+                response.headers.setdefault('Last-Modified', http_date(ultima_modificacion))
+
+            # Siempre revalidar; lo personalizado no se guarda en cachés compartidas
+            if por_usuario and request.user.is_authenticated:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+        return envoltura
+    return decorador
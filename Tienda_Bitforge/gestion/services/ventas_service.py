@@ -0,0 +1,289 @@
+"""
+Servicio de resúmenes de ventas (rollups) para BitForge
+Mantiene dos tablas agregadas para que los reportes no recorran todo el
+historial de Pedido/PedidoItem:
+
+    VentaHoraria          una fila por hora: pedidos, unidades, ventas, descuentos,
+                          cancelaciones y reembolsos
+    VentaDiariaProducto   una fila por día y producto (por producto_id; el nombre
+                          solo se muestra): unidades y ventas
+
+- Se actualizan de forma incremental en la misma transacción del cambio:
+  pedido creado (checkout), pedido cancelado (pedidos_service) y devolución
+  aprobada con reembolso. Cada actualización es "crear la fila si falta"
+  (bulk_create ignore_conflicts) + un UPDATE con incrementos F(), así dos
+  compras simultáneas nunca pisan sus sumas.
+- Los montos son netos: un pedido cancelado se resta de la hora en que se creó
+  y los reembolsos se anotan en la hora del pedido devuelto.
+- reconstruir() (comando reconstruir_ventas) las recalcula desde el historial.
+- El costo de leerlas depende del rango de fechas, no de la cantidad de pedidos.
+- Cada cambio descarta (al confirmarse) los segmentos de series_service afectados.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncDate, TruncHour
+from django.utils import timezone
+
+from ..models import Devolucion, Pedido, PedidoItem, VentaDiariaProducto, VentaHoraria
+from . import series_service
+
+# Estados de devolución en los que el reembolso cuenta
+ESTADOS_REEMBOLSO = ('aprobada', 'completada')
+
+LOTE = 1000
+
+
+def hora_de(momento):
+    """Inicio de la hora (UTC) en la que cae un datetime"""
+    return momento.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def inicio_del_dia(fecha):
+    """Medianoche local de una fecha, como datetime aware"""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _sumar_hora(hora, **deltas):
+    """Suma los deltas a la fila de esa hora (la crea si no existe). Dos consultas."""
+    VentaHoraria.objects.bulk_create([VentaHoraria(hora=hora)], ignore_conflicts=True)
+    VentaHoraria.objects.filter(hora=hora).update(**{campo: F(campo) + valor for campo, valor in deltas.items()})
+
+
+def _sumar_productos(fecha, lineas):
+    """
+    Suma unidades y ventas por producto en la fila de ese día. Dos consultas
+    sin importar cuántos productos tenga el pedido.
+
+    Args:
+        lineas: {producto_id: (nombre, categoria_id, unidades, ventas)} (ver _agrupar_lineas)
+    """
+    borradas = [datos for clave, datos in lineas.items() if not isinstance(clave, int)]
+    vivas = {clave: datos for clave, datos in lineas.items() if isinstance(clave, int)}
+    if borradas:
+        # Producto eliminado: ya no hay id para ubicar su fila, el ajuste queda como fila propia
+        VentaDiariaProducto.objects.bulk_create([
+            VentaDiariaProducto(fecha=fecha, nombre_producto=nombre, categoria_id=categoria_id,
+                                unidades=unidades, ventas=ventas)
+            for nombre, categoria_id, unidades, ventas in borradas
+        ])
+    if not vivas:
+        return
+    VentaDiariaProducto.objects.bulk_create([
+        VentaDiariaProducto(fecha=fecha, nombre_producto=nombre, producto_id=producto_id, categoria_id=categoria_id)
+        for producto_id, (nombre, categoria_id, _, _) in vivas.items()
+    ], ignore_conflicts=True)
+    VentaDiariaProducto.objects.filter(fecha=fecha, producto_id__in=list(vivas)).update(
+        unidades=Case(
+            *[When(producto_id=producto_id, then=F('unidades') + datos[2]) for producto_id, datos in vivas.items()],
+            default=F('unidades'),
+            output_field=VentaDiariaProducto._meta.get_field('unidades'),
+        ),
+        ventas=Case(
+            *[When(producto_id=producto_id, then=F('ventas') + datos[3]) for producto_id, datos in vivas.items()],
+            default=F('ventas'),
+            output_field=VentaDiariaProducto._meta.get_field('ventas'),
+        ),
+    )
+
+
+def _agrupar_lineas(filas, signo=1):
+    """
+    {producto_id: (nombre, categoria_id, unidades, ventas)} a partir de
+    (nombre, producto_id, categoria_id, cantidad, precio). Las líneas de un
+    producto eliminado (producto_id NULL) solo tienen el nombre y se agrupan por él.
+    """
+    lineas = {}
+    for nombre, producto_id, categoria_id, cantidad, precio in filas:
+        clave = producto_id if producto_id is not None else nombre
+        anterior_nombre, _, unidades, ventas = lineas.get(clave, (nombre, None, 0, Decimal('0')))
+        lineas[clave] = (anterior_nombre, categoria_id, unidades + signo * cantidad, ventas + signo * cantidad * precio)
+    return lineas
+
+
+def registrar_pedido(pedido, items):
+    """Suma un pedido recién creado (items: sus PedidoItem con producto cargado)"""
+    _sumar_hora(
+        hora_de(pedido.fecha_pedido),
+        pedidos=1,
+        unidades=sum(item.cantidad for item in items),
+        ventas=pedido.total,
+        descuentos=pedido.descuento_aplicado,
+    )
+    _sumar_productos(timezone.localdate(pedido.fecha_pedido), _agrupar_lineas(
+        (item.nombre_producto, item.producto_id, item.producto.categoria_id if item.producto else None,
+         item.cantidad, item.precio_unitario)
+        for item in items
+    ))
+    transaction.on_commit(lambda: series_service.invalidar([pedido.fecha_pedido]))
+
+
+def registrar_cancelacion(pedido_ids):
+    """Resta pedidos recién cancelados de las horas y días en que se crearon"""
+    if not pedido_ids:
+        return
+    por_hora = defaultdict(lambda: {'pedidos_cancelados': 0, 'unidades': 0, 'ventas': Decimal('0'),
+                                    'descuentos': Decimal('0'), 'monto_cancelado': Decimal('0')})
+    fechas = {}
+    for pid, fecha_pedido, total, descuento in Pedido.objects.filter(id__in=pedido_ids).values_list(
+        'id', 'fecha_pedido', 'total', 'descuento_aplicado'
+    ):
+        deltas = por_hora[hora_de(fecha_pedido)]
+        deltas['pedidos_cancelados'] += 1
+        deltas['ventas'] -= total
+        deltas['descuentos'] -= descuento
+        deltas['monto_cancelado'] += total
+        fechas[pid] = fecha_pedido
+
+    por_dia = defaultdict(list)
+    for pid, nombre, producto_id, categoria_id, cantidad, precio in PedidoItem.objects.filter(
+        pedido_id__in=pedido_ids
+    ).values_list('pedido_id', 'nombre_producto', 'producto_id', 'producto__categoria_id', 'cantidad', 'precio_unitario'):
+        por_hora[hora_de(fechas[pid])]['unidades'] -= cantidad
+        por_dia[timezone.localdate(fechas[pid])].append((nombre, producto_id, categoria_id, cantidad, precio))
+
+    for hora, deltas in por_hora.items():
+        _sumar_hora(hora, **deltas)
+    for fecha, filas in por_dia.items():
+        _sumar_productos(fecha, _agrupar_lineas(filas, signo=-1))
+    transaction.on_commit(lambda: series_service.invalidar(fechas.values()))
+
+
+def registrar_reembolso(pedido, monto):
+    """Anota (o corrige, con monto negativo) un reembolso en la hora del pedido devuelto"""
+    if monto:
+        _sumar_hora(hora_de(pedido.fecha_pedido), reembolsos=monto)
+
+
+def monto_reembolsable(devolucion):
+    """Reembolso que cuenta en los resúmenes según el estado de la devolución"""
+    if devolucion.estado in ESTADOS_REEMBOLSO and devolucion.monto_reembolso:
+        return devolucion.monto_reembolso
+    return Decimal('0')
+
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes desde Pedido/PedidoItem/Devolucion.
+
+    Args:
+        desde, hasta: Fechas locales (inclusive); None para todo el historial
+
+    Returns:
+        Tupla (filas por hora, filas por producto) escritas
+    """
+    pedidos = Pedido.objects.all()
+    items = PedidoItem.objects.all()
+    devoluciones = Devolucion.objects.filter(estado__in=ESTADOS_REEMBOLSO, monto_reembolso__isnull=False)
+    horas = VentaHoraria.objects.all()
+    dias = VentaDiariaProducto.objects.all()
+    if desde:
+        inicio = inicio_del_dia(desde)
+        pedidos = pedidos.filter(fecha_pedido__gte=inicio)
+        items = items.filter(pedido__fecha_pedido__gte=inicio)
+        devoluciones = devoluciones.filter(pedido__fecha_pedido__gte=inicio)
+        horas = horas.filter(hora__gte=inicio)
+        dias = dias.filter(fecha__gte=desde)
+    if hasta:
+        fin = inicio_del_dia(hasta + timedelta(days=1))
+        pedidos = pedidos.filter(fecha_pedido__lt=fin)
+        items = items.filter(pedido__fecha_pedido__lt=fin)
+        devoluciones = devoluciones.filter(pedido__fecha_pedido__lt=fin)
+        horas = horas.filter(hora__lt=fin)
+        dias = dias.filter(fecha__lte=hasta)
+
+    dinero = DecimalField(max_digits=14, decimal_places=2)
+    activo = ~Q(estado='cancelado')
+    filas = defaultdict(dict)
+    for fila in pedidos.annotate(h=TruncHour('fecha_pedido')).values('h').annotate(
+        pedidos=Count('id'),
+        pedidos_cancelados=Count('id', filter=Q(estado='cancelado')),
+        ventas=Coalesce(Sum('total', filter=activo), 0, output_field=dinero),
+        descuentos=Coalesce(Sum('descuento_aplicado', filter=activo), 0, output_field=dinero),
+        monto_cancelado=Coalesce(Sum('total', filter=Q(estado='cancelado')), 0, output_field=dinero),
+    ).order_by():
+        filas[hora_de(fila.pop('h'))].update(fila)
+    for hora, unidades in items.exclude(pedido__estado='cancelado').annotate(
+        h=TruncHour('pedido__fecha_pedido')
+    ).values('h').annotate(u=Sum('cantidad')).order_by().values_list('h', 'u'):
+        filas[hora_de(hora)]['unidades'] = unidades
+    for hora, monto in devoluciones.annotate(h=TruncHour('pedido__fecha_pedido')).values('h').annotate(
+        m=Sum('monto_reembolso')
+    ).order_by().values_list('h', 'm'):
+        filas[hora_de(hora)]['reembolsos'] = monto
+
+    # Un producto renombrado trae varios nombres el mismo día (se unen en Python, queda el
+    # primero); los productos eliminados ya no tienen id y se agrupan por nombre
+    por_producto = {}
+    for fecha, nombre, producto_id, categoria_id, cantidad, ventas in items.exclude(
+        pedido__estado='cancelado'
+    ).annotate(fecha=TruncDate('pedido__fecha_pedido')).values(
+        'fecha', 'nombre_producto', 'producto_id', 'producto__categoria_id'
+    ).annotate(
+        unidades=Sum('cantidad'),
+        total=Sum(F('cantidad') * F('precio_unitario'), output_field=dinero),
+    ).order_by().values_list('fecha', 'nombre_producto', 'producto_id', 'producto__categoria_id', 'unidades', 'total'):
+        clave = (fecha, producto_id if producto_id is not None else nombre)
+        anterior = por_producto.get(clave, (nombre, categoria_id, 0, Decimal('0')))
+        por_producto[clave] = (anterior[0], anterior[1] or categoria_id, anterior[2] + cantidad, anterior[3] + ventas)
+
+    with transaction.atomic():
+        horas.delete()
+        dias.delete()
+        VentaHoraria.objects.bulk_create(
+            [VentaHoraria(hora=hora, **valores) for hora, valores in filas.items()], batch_size=LOTE
+        )
+        VentaDiariaProducto.objects.bulk_create([
+            VentaDiariaProducto(fecha=fecha, nombre_producto=nombre,
+                                producto_id=clave if isinstance(clave, int) else None,
+                                categoria_id=categoria_id, unidades=unidades, ventas=ventas)
+            for (fecha, clave), (nombre, categoria_id, unidades, ventas) in por_producto.items()
+        ], batch_size=LOTE)
+        transaction.on_commit(series_service.invalidar_todo)
+    return len(filas), len(por_producto)
+
+
+def resumen(desde=None, hasta=None):
+    """Totales de un rango de horas (datetimes aware, hasta exclusivo) en una consulta"""
+    filas = VentaHoraria.objects.all()
+    if desde:
+        filas = filas.filter(hora__gte=desde)
+    if hasta:
+        filas = filas.filter(hora__lt=hasta)
+    dinero = DecimalField(max_digits=14, decimal_places=2)
+    return filas.aggregate(
+        pedidos=Coalesce(Sum('pedidos'), 0),
+        unidades=Coalesce(Sum('unidades'), 0),
+        ventas=Coalesce(Sum(F('ventas') - F('reembolsos'), output_field=dinero), 0, output_field=dinero),
+    )
+
+
+def mas_vendidos(desde=None, limite=5):
+    """Productos con más unidades vendidas desde una fecha local (None = todo el historial)"""
+    filas = VentaDiariaProducto.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    return list(
+        filas.values('producto_id', 'nombre_producto').annotate(total_vendido=Sum('unidades'))
+        .filter(total_vendido__gt=0).order_by('-total_vendido')[:limite]
+    )
+
+
+def ventas_por_dia(desde=None, hasta=None):
+    """Resumen por día local (fechas inclusive), agregando las filas por hora"""
+    filas = VentaHoraria.objects.all()
+    if desde:
+        filas = filas.filter(hora__gte=inicio_del_dia(desde))
+    if hasta:
+        filas = filas.filter(hora__lt=inicio_del_dia(hasta + timedelta(days=1)))
+    return filas.annotate(fecha=TruncDate('hora')).values('fecha').annotate(
+        pedidos=Sum('pedidos'),
+        pedidos_cancelados=Sum('pedidos_cancelados'),
+        unidades=Sum('unidades'),
+        ventas=Sum('ventas'),
+        descuentos=Sum('descuentos'),
+        reembolsos=Sum('reembolsos'),
+    ).order_by('fecha')
@@ -0,0 +1,108 @@
+"""
+Señales de la app gestion
+Mantienen sincronizados los índices derivados de Producto/Categoria,
+la marca de cambios del catálogo (ETag / Last-Modified), la foto de
+métricas del panel de administración, el kardex de stock y el historial
+de precios.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Producto, Categoria, Resena, Pedido, Solicitud
+from .services import busqueda_service, autocompletado_service, validadores_service, dashboard_service, kardex_service, historial_precios_service
+
+
+# Índice de búsqueda full-text
+@receiver(post_save, sender=Producto)
+def indexar_producto_busqueda(sender, instance, **kwargs):
+    busqueda_service.indexar_producto(instance)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto_busqueda(sender, instance, **kwargs):
+    busqueda_service.eliminar_producto(instance.id)
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_categoria_busqueda(sender, instance, created, **kwargs):
+    # Una categoría nueva todavía no tiene productos
+    if not created:
+        busqueda_service.reindexar_categoria(instance.id)
+
+
+# Autocompletado en memoria (búsqueda en vivo)
+@receiver(post_save, sender=Producto)
+def actualizar_autocompletado(sender, instance, created, **kwargs):
+    autocompletado_service.actualizar_producto(instance, created)
+
+
+@receiver(post_delete, sender=Producto)
+def quitar_autocompletado(sender, instance, **kwargs):
+    autocompletado_service.eliminar_producto(instance.id)
+
+
+@receiver(post_save, sender=Categoria)
+def reconstruir_autocompletado_categoria(sender, instance, created, **kwargs):
+    # El nombre de la categoría está indexado en sus productos: reconstrucción completa
+    if not created:
+        autocompletado_service.marcar_catalogo_modificado()
+
+
+# Marca de cambios del catálogo (validadores HTTP)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def marcar_producto_modificado(sender, instance, update_fields=None, **kwargs):
+    # Un save() que solo cambia el stock (compra directa, solicitud completada) marca el
+    # catálogo solo si se nota. Va antes del kardex, que pisa _stock_guardado.
+    if update_fields is not None and set(update_fields) == {'stock'}:
+        antes = getattr(instance, '_stock_guardado', None)
+        if antes is not None and not validadores_service.stock_visible(antes, instance.stock):
+            return
+    validadores_service.registrar_cambio('producto')
+
+
+@receiver(post_save, sender=Resena)
+@receiver(post_delete, sender=Resena)
+def marcar_resena_modificada(sender, **kwargs):
+    validadores_service.registrar_cambio('resena')
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def marcar_categoria_modificada(sender, **kwargs):
+    validadores_service.registrar_cambio('categoria')
+
+
+# Marca de usuarios (firma de los reportes exportados)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def marcar_usuario_modificado(sender, update_fields=None, **kwargs):
+    # El inicio de sesión solo guarda last_login, que no sale en ningún reporte
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        validadores_service.registrar_cambio('usuario')
+
+
+# Foto de métricas del panel (pedidos, stock y solicitudes)
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Solicitud)
+@receiver(post_delete, sender=Solicitud)
+def invalidar_dashboard(sender, **kwargs):
+    dashboard_service.invalidar()
+
+
+# Kardex: los save() de Producto registran la diferencia de stock
+@receiver(post_save, sender=Producto)
+def registrar_movimiento_stock(sender, instance, created, raw=False, **kwargs):
+    if not raw:  # loaddata trae su propio stock
+        kardex_service.registrar_guardado(instance, created)
+
+
+# Historial de precios: los save() de Producto registran el precio si cambió
+@receiver(post_save, sender=Producto)
+def registrar_cambio_precio(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        historial_precios_service.registrar_guardado(instance, created)
@@ -0,0 +1,183 @@
+"""
+Tareas en segundo plano de BitForge
+Trabajo pesado del panel de staff que antes corría dentro del request; las
+vistas lo encolan con tareas_service.encolar() y lo ejecuta el comando
+`python manage.py procesar_tareas`.
+
+Cada tarea recibe el contexto (para reportar progreso) y sus parámetros, y
+devuelve un dict JSON con al menos la clave 'mensaje'.
+"""
+import json
+import os
+
+from .models import Categoria, Producto
+from .services import (
+    hardware_api_service, historial_precios_service, kardex_service, precios_masivos_service, reportes_service,
+)
+from .services.tareas_service import tarea
+
+
+@tarea('importar_precios')
+def importar_precios(contexto, simular=False):
+    """Actualiza precios de productos con fluctuaciones de mercado realistas (±5%)."""
+    resultado = precios_masivos_service.aplicar_fluctuacion(0.95, 1.05, simular=simular, progreso=contexto.progreso)
+    accion = 'simulados (sin guardar)' if simular else 'actualizados'
+    return {
+        'mensaje': (
+            f'✅ Precios {accion} (fluctuación de mercado). {resultado.productos} productos sincronizados '
+            f'en {resultado.segundos:.1f}s ({resultado.filas_por_segundo:,.0f} filas/s).'
+        ),
+        **resultado.como_dict(),
+    }
+
+
+@tarea('importar_pcpartpicker')
+def importar_pcpartpicker(contexto, categoria='cpu', cantidad=5):
+    """Importa productos de hardware usando APIs reales (DummyJSON + Pixabay)"""
+    contexto.progreso(0, 1, f'Consultando APIs ({categoria})...')
+    # Sin agrupar: el bloque hace llamadas HTTP y no debe quedar en una transacción
+    with kardex_service.lote(kardex_service.IMPORTACION, f'Tarea #{contexto.tarea.id}', agrupar=False), \
+            historial_precios_service.origen(historial_precios_service.IMPORTACION):
+        creados, actualizados = hardware_api_service.importar_productos_api(
+            Producto,
+            Categoria,
+            tipo=categoria,
+            limite=cantidad
+        )
+    if creados > 0 or actualizados > 0:
+        mensaje = (
+            f'✅ Importación completada: {creados} nuevos productos, {actualizados} actualizados. '
+            f'Imágenes obtenidas de Pixabay/DummyJSON.'
+        )
+    else:
+        mensaje = '⚠️ No se importaron productos. Intenta con otra categoría.'
+    return {'mensaje': mensaje, 'creados': creados, 'actualizados': actualizados}
+
+
+@tarea('cargar_productos_demo')
+def cargar_productos_demo(contexto):
+    """Carga productos desde el fixture JSON (o un catálogo de hardware por defecto)"""
+    # Ruta del fixture JSON
+    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'productos_hardware.json')
+
+    # Intentar cargar desde fixture JSON
+    if os.path.exists(fixture_path):
+        with open(fixture_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        categorias_count = 0
+        productos_count = 0
+        total = len(data)
+
+        # Procesar categorías primero
+        for item in data:
+            if item['model'] == 'gestion.categoria':
+                Categoria.objects.update_or_create(
+                    pk=item['pk'],
+                    defaults=item['fields']
+                )
+                categorias_count += 1
+
+        # Luego procesar productos (los cambios de stock van al kardex en un solo INSERT)
+        with kardex_service.lote(kardex_service.IMPORTACION, f'Tarea #{contexto.tarea.id}'), \
+                historial_precios_service.origen(historial_precios_service.IMPORTACION):
+            for item in data:
+                if item['model'] == 'gestion.producto':
+                    fields = item['fields'].copy()
+                    categoria_id = fields.pop('categoria')
+                    fields['categoria'] = Categoria.objects.get(pk=categoria_id)
+                    if fields.get('proveedor') is None:
+                        fields['proveedor'] = None
+
+                    Producto.objects.update_or_create(
+                        pk=item['pk'],
+                        defaults=fields
+                    )
+                    productos_count += 1
+                    contexto.progreso(categorias_count + productos_count, total)
+
+        return {
+            'mensaje': f'✅ Cargados desde JSON: {categorias_count} categorías y {productos_count} productos',
+            'categorias': categorias_count,
+            'productos': productos_count,
+        }
+
+    # Si no existe el JSON, crear datos por defecto
+    cat_gpu, _ = Categoria.objects.get_or_create(nombre='Tarjetas Gráficas', defaults={'descripcion': 'GPUs de alto rendimiento'})
+    cat_cpu, _ = Categoria.objects.get_or_create(nombre='Procesadores', defaults={'descripcion': 'CPUs Intel y AMD'})
+    cat_ram, _ = Categoria.objects.get_or_create(nombre='Memoria RAM', defaults={'descripcion': 'Módulos DDR4 y DDR5'})
+    cat_ssd, _ = Categoria.objects.get_or_create(nombre='Almacenamiento', defaults={'descripcion': 'SSD y HDD'})
+    cat_kit, _ = Categoria.objects.get_or_create(nombre='Kits', defaults={'descripcion': 'Combos de actualización'})
+    cat_pc, _ = Categoria.objects.get_or_create(nombre='PCs Armadas', defaults={'descripcion': 'Equipos listos para usar'})
+
+    productos_hardware = [
+        {'nombre': 'NVIDIA RTX 4090 24GB', 'precio': 1599.99, 'stock': 5, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
+        {'nombre': 'NVIDIA RTX 4070 Ti 12GB', 'precio': 799.99, 'stock': 8, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
+        {'nombre': 'AMD Radeon RX 7900 XTX', 'precio': 999.99, 'stock': 3, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
+        {'nombre': 'Intel Core i9-14900K', 'precio': 589.99, 'stock': 10, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
+        {'nombre': 'Intel Core i7-14700K', 'precio': 409.99, 'stock': 12, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
+        {'nombre': 'AMD Ryzen 9 7950X3D', 'precio': 699.99, 'stock': 4, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
+        {'nombre': 'AMD Ryzen 7 7800X3D', 'precio': 449.99, 'stock': 7, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
+        {'nombre': 'Corsair Vengeance DDR5 32GB', 'precio': 149.99, 'stock': 20, 'categoria': cat_ram, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1562976540-1502c2145186?w=400'},
+        {'nombre': 'G.Skill Trident Z5 64GB DDR5', 'precio': 299.99, 'stock': 6, 'categoria': cat_ram, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1562976540-1502c2145186?w=400'},
+        {'nombre': 'Samsung 990 Pro 2TB NVMe', 'precio': 179.99, 'stock': 15, 'categoria': cat_ssd, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1597872200969-2b65d56bd16b?w=400'},
+        {'nombre': 'WD Black SN850X 1TB', 'precio': 89.99, 'stock': 25, 'categoria': cat_ssd, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1597872200969-2b65d56bd16b?w=400'},
+        {'nombre': 'Kit Gamer AMD Ryzen 7 + B650', 'precio': 699.99, 'stock': 3, 'categoria': cat_kit, 'tipo': 'kit', 'imagen_url': 'https://images.unsplash.com/photo-1587202372775-e229f172b9d7?w=400'},
+        {'nombre': 'Kit Intel i5 + Z790 + 32GB', 'precio': 849.99, 'stock': 0, 'categoria': cat_kit, 'tipo': 'kit', 'imagen_url': 'https://images.unsplash.com/photo-1587202372775-e229f172b9d7?w=400'},
+        {'nombre': 'PC Gamer BitForge TITAN', 'precio': 2499.99, 'stock': 2, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
+        {'nombre': 'PC Gamer BitForge PHOENIX', 'precio': 1799.99, 'stock': 4, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
+        {'nombre': 'PC Workstation BitForge PRO', 'precio': 3299.99, 'stock': 1, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
+    ]
+
+    count = 0
+    with kardex_service.lote(kardex_service.IMPORTACION, f'Tarea #{contexto.tarea.id}'), \
+            historial_precios_service.origen(historial_precios_service.IMPORTACION):
+        for p in productos_hardware:
+            Producto.objects.update_or_create(
+                nombre=p['nombre'],
+                defaults={
+                    'descripcion': f"Hardware de alto rendimiento - {p['categoria'].nombre}",
+                    'precio': p['precio'],
+                    'stock': p['stock'],
+                    'categoria': p['categoria'],
+                    'tipo': p['tipo'],
+                    'imagen_url': p['imagen_url'],
+                    'disponible': True
+                }
+            )
+            count += 1
+            contexto.progreso(count, len(productos_hardware))
+
+    return {'mensaje': f'✅ {count} productos de hardware cargados correctamente', 'productos': count}
+
+
+@tarea('limpiar_productos')
+def limpiar_productos(contexto):
+    """Elimina productos y categorías que no son hardware real"""
+    # Categorías permitidas (Hardware real)
+    categorias_permitidas = [
+        'Tarjetas Gráficas', 'Procesadores', 'Memoria RAM',
+        'Almacenamiento', 'Kits', 'PCs Armadas'
+    ]
+
+    # Borrar productos de categorías no permitidas
+    productos_basura = Producto.objects.exclude(categoria__nombre__in=categorias_permitidas)
+    count = productos_basura.count()
+    productos_basura.delete()
+
+    # Eliminar categorías vacías o basura
+    Categoria.objects.exclude(nombre__in=categorias_permitidas).delete()
+
+    return {'mensaje': f'🗑️ {count} productos incorrectos eliminados. Base de datos limpia.', 'eliminados': count}
+
+
+@tarea('exportar_reporte')
+def exportar_reporte(contexto, tipo='pedidos', formato='csv.gz'):
+    """Genera el archivo de un reporte en EXPORTACIONES_DIR (o reutiliza el de la misma firma)"""
+    contexto.progreso(0, 1, f'Exportando {tipo} ({formato})...')
+    resultado = reportes_service.exportar(tipo, formato, progreso=contexto.progreso)
+    if resultado['reutilizado']:
+        mensaje = f'♻️ Los datos no cambiaron: se reutiliza {resultado["archivo"]}'
+    else:
+        mensaje = f'✅ Reporte exportado: {resultado["filas"]} filas en {resultado["archivo"]}'
+    return {'mensaje': mensaje, **resultado}
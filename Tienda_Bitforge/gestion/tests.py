@@ -1,3 +1,1856 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls as gestion_urls
+from .models import (
+    Producto, CarritoItem, Solicitud, Categoria, Proveedor,
+    Pedido, PedidoItem, Resena, ListaDeseos,
+    Cupon, PerfilUsuario, SuscripcionNewsletter, ProductoComparado,
+    Devolucion, ReservaStock, Tarea, VentaHoraria, VentaDiariaProducto, MovimientoStock, FotoStock,
+    HistorialPrecio, MarcaCatalogo, WorkerNumeracion,
+)
+from .services import (
+    paginacion_service, busqueda_service, carrito_service, validadores_service, autocompletado_service, facetas_service, precios_service, checkout_service, reservas_service, numeracion_service, tareas_service,
+    pedidos_service, dashboard_service, ventas_service, series_service, reportes_service,
+    inventario_service, kardex_service, precios_masivos_service, historial_precios_service,
+)
+
+
+# ============================================
+# PRESUPUESTO DE CONSULTAS POR RUTA
+# ============================================
+
+# Máximo de consultas SQL por ruta (GET). Las rutas que no aparecen usan PRESUPUESTO_DEFECTO.
+PRESUPUESTO_DEFECTO = 12
+PRESUPUESTOS = {
+    'admin_clientes': 14,
+}
+
+ROLES = ['cliente', 'bodeguero', 'supervisor', 'admin']
+
+
+class DatosPrueba:
+    """Siembra un conjunto de datos realista de tamaño configurable"""
+
+    def __init__(self):
+        self.usuarios = {}
+        self.contador = 0
+
+    def _usuario(self, username, rol):
+        user = User.objects.create_user(username=username, password='clave-prueba-123', email=f'{username}@bitforge.com')
+        if rol != 'cliente':
+            user.is_staff = True
+            user.save()
+        PerfilUsuario.objects.create(usuario=user, rol=rol)
+        return user
+
+    def sembrar(self, escala):
+        """Agrega `escala` filas de cada entidad (se puede llamar varias veces)"""
+        self.contador += 1
+        n = self.contador
+        hoy = timezone.now().date()
+
+        if not self.usuarios:
+            for rol in ROLES:
+                self.usuarios[rol] = self._usuario(f'usuario_{rol}', rol)
+
+        proveedor = Proveedor.objects.create(
+            nombre=f'Proveedor {n}', email=f'proveedor{n}@bitforge.com', telefono='0999999999', direccion='Quito'
+        )
+        categorias = [
+            Categoria.objects.get_or_create(nombre=nombre)[0]
+            for nombre in ['Tarjetas Gráficas', 'Procesadores', 'Memoria RAM', 'Almacenamiento', 'Kits', 'PCs Armadas']
+        ]
+        productos = [
+            Producto.objects.create(
+                nombre=f'Producto {n}-{i}',
+                descripcion=f'Hardware de prueba {i}',
+                precio=Decimal('10.00') * (i + 1),
+                stock=i % 6,
+                categoria=categorias[i % len(categorias)],
+                proveedor=proveedor,
+                tipo='componente',
+            )
+            for i in range(escala)
+        ]
+        clientes = [self._usuario(f'cliente_{n}_{i}', 'cliente') for i in range(escala)]
+        cupones = [
+            Cupon.objects.create(
+                codigo=f'CUPON{n}X{i}', descripcion='Cupón de prueba', descuento_porcentaje=10,
+                fecha_expiracion=hoy + timedelta(days=30)
+            )
+            for i in range(escala)
+        ]
+
+        # Todos los usuarios (también los de cada rol) tienen carrito, pedidos, etc.
+        for user in clientes + list(self.usuarios.values()):
+            for i, producto in enumerate(productos):
+                CarritoItem.objects.create(usuario=user, producto=producto, cantidad=1)
+                ListaDeseos.objects.create(usuario=user, producto=producto)
+                Solicitud.objects.create(cliente=user, producto=producto, cantidad=2)
+                Resena.objects.create(
+                    usuario=user, producto=producto, calificacion=(i % 5) + 1,
+                    titulo='Muy bueno', comentario='Funciona perfecto'
+                )
+            for producto in productos[:4]:
+                ProductoComparado.objects.get_or_create(usuario=user, producto=producto)
+
+            for i in range(escala):
+                pedido = Pedido.objects.create(
+                    usuario=user, total=Decimal('0'), estado=['pendiente', 'entregado'][i % 2],
+                    nombre_completo=user.username, telefono='0999999999',
+                    direccion='Av. Siempre Viva', ciudad='Guayaquil', cupon_aplicado=cupones[0]
+                )
+                for producto in productos:
+                    PedidoItem.objects.create(
+                        pedido=pedido, producto=producto, nombre_producto=producto.nombre,
+                        cantidad=1, precio_unitario=producto.precio
+                    )
+                Devolucion.objects.create(
+                    pedido=pedido, usuario=user, motivo='defectuoso', descripcion='No enciende'
+                )
+
+        for i in range(escala):
+            SuscripcionNewsletter.objects.create(email=f'news{n}_{i}@bitforge.com')
+
+    def kwargs_ruta(self, nombre_param, user):
+        """Id de un objeto real para cada parámetro de URL (siempre el más antiguo, estable entre escalas)"""
+        if nombre_param == 'producto_id':
+            return Producto.objects.filter(disponible=True).order_by('id').first().id
+        if nombre_param == 'item_id':
+            item = CarritoItem.objects.filter(usuario=user).order_by('id').first() if user else None
+            return item.id if item else Producto.objects.order_by('id').first().id
+        if nombre_param == 'pedido_id':
+            pedidos = Pedido.objects.filter(usuario=user) if user else Pedido.objects.all()
+            return pedidos.order_by('id').first().id
+        if nombre_param == 'solicitud_id':
+            return Solicitud.objects.order_by('id').first().id
+        if nombre_param == 'cupon_id':
+            return Cupon.objects.order_by('id').first().id
+        if nombre_param == 'devolucion_id':
+            return Devolucion.objects.order_by('id').first().id
+        if nombre_param == 'tarea_id':
+            tarea = Tarea.objects.order_by('id').first() or Tarea.objects.create(tipo='limpiar_productos')
+            return tarea.id
+        raise AssertionError(f'Parámetro de URL sin dato de prueba: {nombre_param}')
+
+
+class CronometroSQL:
+    """execute_wrapper que cuenta consultas y mide su tiempo con perf_counter"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def tomar_worker_numeracion(caso):
+    """
+    Deja tomado el id de worker de la numeración de pedidos (lo toma el primer
+    pedido del proceso) para que no cuente en las mediciones de consultas.
+    En un TestCase los on_commit no corren solos: se ejecutan aquí.
+    """
+    with caso.captureOnCommitCallbacks(execute=True):
+        numeracion_service.siguiente_numero()
+
+
+class PresupuestoConsultasTest(TestCase):
+    """
+    Recorre todas las rutas con nombre de gestion/urls.py como usuario anónimo
+    y como usuario de cada rol, midiendo consultas SQL, tiempo SQL y tiempo total.
+    Falla si una ruta supera su presupuesto o si sus consultas crecen con las filas.
+    Con BITFORGE_REPORTE_SQL=1 imprime la tabla de mediciones.
+    """
+
+    ESCALA_BASE = 3
+    ESCALA_GRANDE = 9
+
+    def _rutas(self):
+        for patron in gestion_urls.urlpatterns:
+            if patron.name:
+                yield patron.name, list(patron.pattern.converters.keys())
+
+    def _cliente(self, user, productos_sesion):
+        client = Client()
+        if user is None:
+            # El anónimo usa el carrito de sesión con todos los productos
+            session = client.session
+            session['carrito'] = {str(pid): 1 for pid in productos_sesion}
+            session.save()
+        else:
+            client.force_login(user)
+        return client
+
+    def _medir(self, datos):
+        """Devuelve {(ruta, usuario): (consultas, ms_sql, ms_total)}"""
+        mediciones = {}
+        productos_sesion = list(Producto.objects.values_list('id', flat=True))
+        actores = [('anonimo', None)] + [(rol, datos.usuarios[rol]) for rol in ROLES]
+
+        for etiqueta, user in actores:
+            client = self._cliente(user, productos_sesion)
+            for nombre, params in self._rutas():
+                url = reverse(nombre, kwargs={p: datos.kwargs_ruta(p, user) for p in params})
+                cache.clear()  # Presupuesto en frío (sin facetas ni índices cacheados)
+                cronometro = CronometroSQL()
+                with transaction.atomic():
+                    inicio = time.perf_counter()
+                    with connection.execute_wrapper(cronometro):
+                        response = client.get(url)
+                        if response.streaming:
+                            b''.join(response.streaming_content)  # Las consultas corren al consumirlo
+                    total_ms = (time.perf_counter() - inicio) * 1000
+                    transaction.set_rollback(True)  # Cada GET no deja rastro para el siguiente
+
+                self.assertLess(response.status_code, 500, f'{nombre} ({etiqueta}) respondió {response.status_code}')
+                mediciones[(nombre, etiqueta)] = (cronometro.consultas, cronometro.segundos * 1000, total_ms)
+        return mediciones
+
+    def _reportar(self, titulo, mediciones):
+        if not os.environ.get('BITFORGE_REPORTE_SQL'):
+            return
+        print(f'\n{titulo}')
+        print(f'{"ruta":28} {"usuario":11} {"consultas":>9} {"sql ms":>8} {"render ms":>9}')
+        for (nombre, etiqueta), (consultas, sql_ms, total_ms) in sorted(mediciones.items()):
+            print(f'{nombre:28} {etiqueta:11} {consultas:9d} {sql_ms:8.2f} {total_ms - sql_ms:9.2f}')
+
+    def test_presupuesto_y_escala_de_todas_las_rutas(self):
+        datos = DatosPrueba()
+        datos.sembrar(self.ESCALA_BASE)
+        base = self._medir(datos)
+        self._reportar(f'Escala {self.ESCALA_BASE}', base)
+
+        datos.sembrar(self.ESCALA_GRANDE - self.ESCALA_BASE)
+        grande = self._medir(datos)
+        self._reportar(f'Escala {self.ESCALA_GRANDE}', grande)
+
+        errores = []
+        for (nombre, etiqueta), (consultas, _, _) in grande.items():
+            presupuesto = PRESUPUESTOS.get(nombre, PRESUPUESTO_DEFECTO)
+            consultas_base = base[(nombre, etiqueta)][0]
+            if max(consultas, consultas_base) > presupuesto:
+                errores.append(f'{nombre} ({etiqueta}): {max(consultas, consultas_base)} consultas > presupuesto {presupuesto}')
+            if consultas > consultas_base:
+                errores.append(f'{nombre} ({etiqueta}): escala con las filas ({consultas_base} -> {consultas} consultas)')
+
+        self.assertFalse(errores, '\n' + '\n'.join(errores))
+
+
+class CarritoSesionTest(TestCase):
+    """carrito_service: carrito de invitado en la sesión, resuelto con una consulta"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Memorias')
+        self.productos = [
+            Producto.objects.create(nombre=f'RAM {i}', descripcion='DDR5', precio=Decimal('40.00') + i,
+                                    stock=2, categoria=self.categoria)
+            for i in range(5)
+        ]
+
+    def _agregar(self, producto):
+        return self.client.get(reverse('agregar_carrito', args=[producto.id]))
+
+    def test_invitado_agrega_a_la_sesion_hasta_el_stock(self):
+        ram = self.productos[0]
+        self._agregar(ram)
+        self._agregar(ram)
+        self._agregar(ram)  # Stock 2: la tercera no suma
+        self.assertEqual(self.client.session['carrito'], {str(ram.id): 2})
+        self.assertFalse(CarritoItem.objects.exists())
+
+        respuesta = self.client.get(reverse('ver_carrito'))
+        self.assertEqual(respuesta.context['total'], Decimal('80.00'))
+        self.assertEqual(respuesta.context['total_items'], 2)
+        self.assertTrue(respuesta.context['requiere_login'])
+
+    def test_una_consulta_sin_importar_las_lineas(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(carrito_service.items_sesion({}), [])
+        with self.assertNumQueries(1):
+            uno = carrito_service.items_sesion({str(self.productos[0].id): 1})
+        with self.assertNumQueries(1):
+            todos = carrito_service.items_sesion({str(p.id): 3 for p in self.productos})
+        self.assertEqual(len(uno), 1)
+        self.assertEqual([item.producto for item in todos], self.productos)
+        self.assertEqual(sum(item.subtotal() for item in todos), Decimal('630.00'))
+
+        self._agregar(self.productos[0])
+        with CaptureQueriesContext(connection) as pocas:
+            self.client.get(reverse('ver_carrito'))
+        for producto in self.productos[1:]:
+            self._agregar(producto)
+        with CaptureQueriesContext(connection) as muchas:
+            self.client.get(reverse('ver_carrito'))
+        self.assertEqual(len(pocas), len(muchas))
+
+    def test_lineas_invalidas_o_borradas_se_omiten(self):
+        borrado = self.productos[1]
+        carrito = {
+            str(self.productos[0].id): 2,
+            str(borrado.id): 1,
+            'abc': 1,
+            str(self.productos[2].id): 'x',
+            '999999': 4,
+        }
+        borrado.delete()
+        items = carrito_service.items_sesion(carrito)
+        self.assertEqual([(item.producto, item.cantidad) for item in items], [(self.productos[0], 2)])
+
+        sesion = self.client.session
+        sesion['carrito'] = carrito
+        sesion.save()
+        respuesta = self.client.get(reverse('ver_carrito'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['total'], Decimal('80.00'))
+
+
+class PaginacionKeysetTest(TestCase):
+    """paginacion_service: cursores hacia adelante y atrás, con empates y cursores manipulados"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Almacenamiento')
+        precios = ['100.00', '100.00', '100.00', '200.00', '200.00', '50.00', '50.00', '300.00', '300.00', '300.00']
+        for i, precio in enumerate(precios):
+            Producto.objects.create(nombre=f'SSD {i:02d}', precio=Decimal(precio), stock=1, categoria=categoria)
+
+    def _paginas(self, orden, direccion='cursor_siguiente', cursor=None):
+        paginas = []
+        while True:
+            pagina = paginacion_service.paginar_keyset(Producto.objects.all(), orden=orden, cursor=cursor, por_pagina=3)
+            paginas.append(pagina)
+            cursor = getattr(pagina, direccion)
+            if not cursor:
+                return paginas
+
+    def test_adelante_y_atras_con_empates(self):
+        Producto.objects.update(fecha_creacion=timezone.now())  # Empate total en el orden por defecto
+        esperados = {
+            'precio_asc': list(Producto.objects.order_by('precio', 'id').values_list('id', flat=True)),
+            'precio_desc': list(Producto.objects.order_by('-precio', '-id').values_list('id', flat=True)),
+            'nombre': list(Producto.objects.order_by('nombre', 'id').values_list('id', flat=True)),
+            None: list(Producto.objects.order_by('-id').values_list('id', flat=True)),
+        }
+        for orden, ids in esperados.items():
+            adelante = self._paginas(orden)
+            self.assertEqual([p.id for pagina in adelante for p in pagina], ids, orden)
+            self.assertEqual([len(pagina) for pagina in adelante], [3, 3, 3, 1])
+            self.assertFalse(adelante[0].tiene_anterior)
+
+            atras = self._paginas(orden, 'cursor_anterior', adelante[-1].cursor_anterior)
+            self.assertEqual([[p.id for p in pagina] for pagina in atras],
+                             [[p.id for p in pagina] for pagina in reversed(adelante[:-1])], orden)
+            self.assertTrue(all(pagina.tiene_siguiente for pagina in atras))
+            self.assertFalse(atras[-1].tiene_anterior)
+
+        cursor = self._paginas('precio_asc')[1].cursor_siguiente
+        with self.assertNumQueries(1):  # Una página del medio cuesta lo mismo que la primera
+            paginacion_service.paginar_keyset(Producto.objects.all(), orden='precio_asc', cursor=cursor, por_pagina=3)
+
+    def test_paginas_del_catalogo_usan_indice(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan de consulta de SQLite')
+        categoria = Producto.objects.first().categoria_id
+        for filtro in ({}, {'categoria_id': categoria}):
+            catalogo = Producto.objects.filter(disponible=True, **filtro)
+            for orden in (None, 'precio_asc', 'precio_desc', 'nombre'):
+                cursor = paginacion_service.paginar_keyset(catalogo, orden=orden, por_pagina=3).cursor_siguiente
+                with CaptureQueriesContext(connection) as consultas:
+                    paginacion_service.paginar_keyset(catalogo, orden=orden, cursor=cursor, por_pagina=3)
+                with connection.cursor() as cursor_bd:
+                    cursor_bd.execute(f'EXPLAIN QUERY PLAN {consultas[0]["sql"]}')
+                    plan = ' '.join(fila[-1] for fila in cursor_bd.fetchall())
+                self.assertIn('USING INDEX producto_cat_', plan, (orden, filtro))
+                self.assertNotIn('TEMP B-TREE', plan, (orden, filtro))  # Sin ordenar la tabla filtrada
+
+    def test_cursor_manipulado_vuelve_a_la_primera_pagina(self):
+        primera = [p.id for p in paginacion_service.paginar_keyset(Producto.objects.all(), orden='precio_asc', por_pagina=3)]
+        manipulados = [
+            'basura',
+            '%%%',
+            base64.urlsafe_b64encode(b'{"d":"sig"}').decode(),
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            base64.urlsafe_b64encode(b'{"d":"sig","id":1}').decode(),  # Sin orden ni valor
+            paginacion_service.codificar_cursor('nombre', 'SSD 03', 1, 'sig'),  # De otro orden
+            paginacion_service.codificar_cursor('precio_asc', 'no-es-precio', 1, 'sig'),
+            paginacion_service.codificar_cursor('precio_asc', '100.00', 1, 'lateral'),
+        ]
+        for cursor in manipulados:
+            pagina = paginacion_service.paginar_keyset(Producto.objects.all(), orden='precio_asc', cursor=cursor,
+                                                       por_pagina=3)
+            self.assertEqual([p.id for p in pagina], primera, cursor)
+            self.assertFalse(pagina.tiene_anterior)
+
+        for cursor in manipulados:
+            respuesta = self.client.get(reverse('catalogo'), {'orden': 'precio_asc', 'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertFalse(respuesta.context['pagina'].tiene_anterior)
+
+
+class BusquedaFullTextTest(TestCase):
+    """busqueda_service: índice FTS5 sincronizado por señales y consultas MATCH seguras"""
+
+    def setUp(self):
+        if not busqueda_service.fts_disponible():
+            self.skipTest('La base de datos de pruebas no tiene FTS5')
+        self.gpu = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.rtx = Producto.objects.create(nombre='RTX 4070 Super', descripcion='Ray tracing y DLSS 3',
+                                           precio=Decimal('650.00'), stock=3, categoria=self.gpu)
+        self.monitor = Producto.objects.create(nombre='Monitor 27"', descripcion='Ideal para una RTX 4070',
+                                               precio=Decimal('300.00'), stock=3, categoria=self.gpu)
+
+    def _ids(self, texto):
+        return [p.id for p in busqueda_service.buscar_productos(texto)]
+
+    def test_construir_consulta(self):
+        self.assertEqual(busqueda_service.construir_consulta('RTX 40'), '"rtx" "40"*')
+        self.assertEqual(busqueda_service.construir_consulta('rtx" OR nombre:*'), '"rtx" "or" "nombre"*')
+        self.assertIsNone(busqueda_service.construir_consulta('"*-()'))
+        terminos = busqueda_service.construir_consulta(' '.join(f't{i}' for i in range(20))).split()
+        self.assertEqual(len(terminos), busqueda_service.MAX_TERMINOS)
+        self.assertEqual(self._ids('") OR ("'), [])  # Sin términos: sin resultados, sin error
+
+    def test_relevancia_y_prefijo(self):
+        self.assertEqual(self._ids('rtx 40'), [self.rtx.id, self.monitor.id])  # El nombre pesa más
+        self.assertEqual(self._ids('dls'), [self.rtx.id])
+        self.assertEqual(sorted(self._ids('graficas')), sorted([self.rtx.id, self.monitor.id]))  # Por categoría
+        respuesta = self.client.get(reverse('catalogo'), {'q': 'monitor 2'})
+        self.assertEqual([p.id for p in respuesta.context['productos']], [self.monitor.id])
+
+    def test_senales_mantienen_el_indice(self):
+        self.rtx.nombre = 'GeForce 4080'
+        self.rtx.save()
+        self.assertEqual(self._ids('super'), [])
+        self.assertEqual(self._ids('geforce'), [self.rtx.id])
+
+        self.gpu.nombre = 'Video'
+        self.gpu.save()
+        self.assertEqual(sorted(self._ids('video')), sorted([self.rtx.id, self.monitor.id]))
+
+        self.monitor.disponible = False
+        self.monitor.save()
+        self.assertEqual(self._ids('video'), [self.rtx.id])
+
+        rtx_id = self.rtx.id
+        self.rtx.delete()
+        self.assertEqual(self._ids('geforce'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {busqueda_service.TABLA_FTS} WHERE rowid = %s', [rtx_id])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+        # Cambios masivos sin señales: el comando de reconstrucción los recoge
+        Producto.objects.filter(id=self.monitor.id).update(nombre='Pantalla curva', disponible=True)
+        self.assertEqual(busqueda_service.reconstruir_indice(), 1)
+        self.assertEqual(self._ids('curva'), [self.monitor.id])
+
+
+class AutocompletadoTest(TestCase):
+    """autocompletado_service: índice en memoria con versión compartida en la base de datos"""
+
+    def setUp(self):
+        autocompletado_service._indice = None
+        autocompletado_service.olvidar_version()
+        self.gpu = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.rtx = Producto.objects.create(nombre='RTX 4070', descripcion='Ideal para juegos en 1440p',
+                                           precio=Decimal('600.00'), stock=5, categoria=self.gpu)
+        self.radeon = Producto.objects.create(nombre='Radeon RX 7800', precio=Decimal('500.00'), stock=5,
+                                              categoria=self.gpu)
+        Producto.objects.create(nombre='RTX 3060 usada', precio=Decimal('200.00'), stock=0, categoria=self.gpu,
+                                disponible=False)
+
+    def tearDown(self):
+        autocompletado_service._indice = None
+        autocompletado_service.olvidar_version()
+
+    def _nombres(self, texto):
+        return [p['nombre'] for p in autocompletado_service.buscar(texto)]
+
+    def test_nombre_descripcion_y_categoria(self):
+        self.assertEqual(self._nombres('rtx'), ['RTX 4070'])
+        self.assertEqual(self._nombres('juego'), ['RTX 4070'])
+        self.assertEqual(self._nombres('grafica'), ['RTX 4070', 'Radeon RX 7800'])
+        self.assertEqual(self._nombres('radeon grafi'), ['Radeon RX 7800'])
+        with self.assertNumQueries(0):  # La versión ya se leyó dentro del TTL
+            self.assertEqual(self._nombres('rx'), ['Radeon RX 7800'])
+        respuesta = self.client.get(reverse('busqueda_ajax'), {'q': 'juegos'})
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [self.rtx.id])
+
+    def test_cambios_incrementales_y_stock_sin_invalidar(self):
+        self._nombres('rtx')
+        indice = autocompletado_service._indice
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rtx.nombre = 'GeForce RTX 4070'
+            self.rtx.save()
+            self.radeon.disponible = False
+            self.radeon.save()
+        self.assertIs(autocompletado_service._indice, indice)
+        self.assertEqual(indice.version, autocompletado_service.version_catalogo())
+        self.assertEqual(self._nombres('geforce'), ['GeForce RTX 4070'])
+        self.assertEqual(self._nombres('radeon'), [])
+
+        version = autocompletado_service.version_catalogo()
+        self.rtx.stock = 2
+        self.rtx.save()
+        inventario_service.aplicar_cambios([inventario_service.CambioStock(self.rtx.id, inventario_service.SUMAR, 4)])
+        self.assertEqual(autocompletado_service.version_catalogo(), version)
+
+        with transaction.atomic():
+            self.rtx.delete()
+        self.assertEqual(self._nombres('geforce'), [])
+        self.assertIsNot(autocompletado_service._indice, indice)  # Sin on_commit: se reconstruyó
+
+    def test_cambios_de_otro_proceso(self):
+        self._nombres('rtx')
+        # Un comando (otro proceso) cambia el catálogo sin señales y sube la versión en la BD
+        Producto.objects.filter(id=self.radeon.id).update(nombre='Radeon RX 9070', precio=Decimal('550.00'))
+        self.assertEqual(self._nombres('9070'), [])
+        autocompletado_service.marcar_catalogo_modificado()
+        self.assertEqual(autocompletado_service.buscar('9070')[0]['precio'], '550.00')
+
+        self.gpu.nombre = 'GPU'
+        self.gpu.save()
+        self.assertEqual(self._nombres('gpu'), ['RTX 4070', 'Radeon RX 9070'])
+
+        # Versión subida por otro proceso: se ve al vencer el TTL, no antes
+        Producto.objects.filter(id=self.rtx.id).update(nombre='RTX 5070')
+        MarcaCatalogo.objects.filter(entidad=autocompletado_service.ENTIDAD).update(version=F('version') + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._nombres('5070'), [])
+        version, leida = autocompletado_service._version_leida
+        autocompletado_service._version_leida = (version, leida - autocompletado_service.TTL_VERSION)
+        self.assertEqual(self._nombres('5070'), ['RTX 5070'])
+
+    def test_busquedas_concurrentes_con_cambios(self):
+        indice = autocompletado_service.construir_indice((0, None))
+        errores = []
+
+        def cambiar():
+            try:
+                for i in range(3000):
+                    indice.aplicar(10_000 + i % 50, (f'RTX extra {i}', '1.00', '', 'rtx', 'GPU'))
+                    indice.aplicar(10_000 + (i + 25) % 50, None)
+            except Exception as error:  # Solo si hay una carrera
+                errores.append(error)
+
+        hilo = threading.Thread(target=cambiar)
+        hilo.start()
+        try:
+            while hilo.is_alive():
+                indice.buscar('rtx ex', limite=5)
+                indice.buscar('r')
+        except Exception as error:
+            errores.append(error)
+        hilo.join()
+        self.assertEqual(errores, [])
+
+    def test_sobre_el_presupuesto_de_memoria_usa_full_text(self):
+        memoria = autocompletado_service.MEMORIA_MAX_MB
+        autocompletado_service.MEMORIA_MAX_MB = 0
+        try:
+            self.assertIsNone(autocompletado_service.buscar('rtx'))
+            self.assertTrue(autocompletado_service._indice.excedido)
+            respuesta = self.client.get(reverse('busqueda_ajax'), {'q': 'radeon'})
+        finally:
+            autocompletado_service.MEMORIA_MAX_MB = memoria
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [self.radeon.id])
+
+
+class FacetasCatalogoTest(TestCase):
+    """facetas_service: conteos del sidebar iguales a lo que lista cada enlace, cacheados por versión"""
+
+    def setUp(self):
+        cache.clear()
+        self.gpu = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.ram = Categoria.objects.create(nombre='Memoria RAM')
+        for precio, stock, categoria in [('50.00', 1, self.ram), ('100.00', 0, self.ram), ('249.99', 2, self.gpu),
+                                         ('250.00', 3, self.gpu), ('1200.00', 0, self.gpu)]:
+            Producto.objects.create(nombre=f'Producto {precio}', precio=Decimal(precio), stock=stock, categoria=categoria)
+
+    def test_conteos_y_enlaces_coinciden_en_los_bordes(self):
+        respuesta = self.client.get(reverse('catalogo'))
+        facetas = respuesta.context['facetas']
+        self.assertEqual([r['total'] for r in facetas['rangos']], [1, 2, 1, 0, 1])
+        self.assertEqual((facetas['total'], facetas['en_stock']), (5, 3))
+        self.assertEqual(facetas['categorias'], {self.gpu.id: 3, self.ram.id: 2})
+        self.assertContains(respuesta, 'precio_min=100&amp;precio_hasta=250')
+
+        for rango in facetas['rangos']:
+            parametros = {'precio_min': rango['minimo']}
+            if rango['maximo'] is not None:
+                parametros['precio_hasta'] = rango['maximo']
+            listados = self.client.get(reverse('catalogo'), parametros).context['productos'].items
+            self.assertEqual(len(listados), rango['total'], rango['etiqueta'])
+
+        # El máximo escrito a mano sigue incluyendo el borde
+        listados = self.client.get(reverse('catalogo'), {'precio_max': 250}).context['productos'].items
+        self.assertEqual(len(listados), 4)
+
+    def test_filtro_de_categoria_y_cache_por_version(self):
+        facetas = self.client.get(reverse('catalogo'), {'categoria': self.gpu.id, 'solo_stock': 1}).context['facetas']
+        self.assertEqual([r['total'] for r in facetas['rangos']], [0, 1, 1, 0, 0])
+        self.assertEqual(facetas['categorias'], {self.gpu.id: 2, self.ram.id: 1})
+
+        queryset = Producto.objects.filter(disponible=True)
+        filtros = {'q': '', 'solo_stock': False}
+        facetas_service.calcular_facetas(queryset, filtros)
+        with self.assertNumQueries(1):  # Solo la versión del catálogo
+            facetas_service.calcular_facetas(queryset, filtros)
+
+        # Un cambio de stock cambia la versión: la faceta en_stock no queda vieja
+        producto = Producto.objects.get(precio=Decimal('1200.00'))
+        producto.stock = 4
+        producto.save()
+        self.assertEqual(facetas_service.calcular_facetas(queryset, filtros)['en_stock'], 4)
+
+
+class ValidadoresCatalogoTest(TestCase):
+    """ETag / Last-Modified: 304 sin ejecutar la vista mientras el catálogo no cambie"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Procesadores')
+        self.producto = Producto.objects.create(
+            nombre='Ryzen 7 7800X3D', descripcion='CPU', precio=Decimal('449.00'),
+            stock=3, categoria=categoria, tipo='componente'
+        )
+
+    def test_304_con_etag_vigente_y_200_tras_un_cambio(self):
+        url = reverse('catalogo')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Resena.objects.create(
+            usuario=User.objects.create_user('cliente_etag', password='clave-prueba-123'),
+            producto=self.producto, calificacion=5, titulo='Excelente', comentario='Muy rápido'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_ventas_solo_cambian_la_version_si_se_nota_el_stock(self):
+        def version():
+            return validadores_service.versiones('producto')[0]
+
+        Producto.objects.filter(id=self.producto.id).update(stock=10)
+        usuario = User.objects.create_user('cliente_version', password='clave-prueba-123')
+        envio = {'nombre_completo': 'Cliente', 'telefono': '1', 'direccion': 'x', 'ciudad': 'Quito'}
+        tomar_worker_numeracion(self)
+        inicial = version()
+
+        CarritoItem.objects.create(usuario=usuario, producto=self.producto, cantidad=2)
+        pedido = checkout_service.procesar_pedido(usuario, envio)  # 10 -> 8
+        pedidos_service.cambiar_estado([pedido.id], 'cancelado')  # 8 -> 10
+        inventario_service.aplicar_cambios([inventario_service.CambioStock(self.producto.id, inventario_service.SUMAR, -4)])
+        self.producto.refresh_from_db()
+        self.producto.stock += 1
+        self.producto.save(update_fields=['stock'])  # 6 -> 7
+        self.assertEqual((self.producto.stock, version()), (7, inicial))
+
+        CarritoItem.objects.create(usuario=usuario, producto=self.producto, cantidad=4)
+        checkout_service.procesar_pedido(usuario, envio)  # 7 -> 3: "últimas unidades"
+        self.assertEqual(version(), inicial + 1)
+        inventario_service.aplicar_cambios([inventario_service.CambioStock(self.producto.id, inventario_service.FIJAR, 0)])
+        self.assertEqual(version(), inicial + 2)  # Agotado
+        Producto.objects.filter(id=self.producto.id).update(stock=50)
+        self.producto.refresh_from_db()
+        self.producto.precio = Decimal('399.00')
+        self.producto.save()
+        self.assertEqual(version(), inicial + 3)  # El precio siempre se nota
+
+    def test_etag_distinto_por_usuario(self):
+        url = reverse('detalle_producto', kwargs={'producto_id': self.producto.id})
+        etag_anonimo = self.client.get(url).headers['ETag']
+        self.client.force_login(User.objects.create_user('cliente_etag', password='clave-prueba-123'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag_anonimo)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag_anonimo)
+
+
+class GenerarDatosTest(TestCase):
+    """generar_datos: una semilla ya cargada se rechaza o se regenera con --limpiar"""
+
+    OPCIONES = dict(productos=30, proveedores=3, usuarios=12, pedidos=20, resenas=10, deseos=10,
+                    carritos=3, cupones=3, semilla=7, lote=8)
+
+    def _generar(self, **extra):
+        call_command('generar_datos', stdout=io.StringIO(), **self.OPCIONES, **extra)
+        return (sorted(Producto.objects.values_list('nombre', flat=True)),
+                sorted(Pedido.objects.values_list('numero_pedido', 'total')))
+
+    def test_misma_semilla_se_rechaza_o_se_limpia(self):
+        primera = self._generar()
+        categorias = Categoria.objects.count()
+        with self.assertRaisesMessage(CommandError, '--limpiar'):
+            self._generar()
+        self.assertEqual(self._generar(limpiar=True), primera)  # Mismos datos, sin duplicar
+        self.assertEqual(Categoria.objects.count(), categorias)
+        self.assertEqual(Proveedor.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 12)
+
+    def test_otra_semilla_convive(self):
+        self._generar()
+        call_command('generar_datos', stdout=io.StringIO(), **{**self.OPCIONES, 'semilla': 8})
+        self.assertEqual(Producto.objects.count(), 60)
+        self.assertEqual(Categoria.objects.count(), 12)  # Categorías compartidas
+
+
+class CotizacionTest(TestCase):
+    """precios_service: una consulta agregada y las mismas reglas de cupón en todo el flujo"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Memoria RAM')
+        self.usuario = User.objects.create_user('cliente_cotizacion', password='clave-prueba-123')
+        for i, precio in enumerate(['79.90', '120.10']):
+            producto = Producto.objects.create(
+                nombre=f'DDR5 {i}', precio=Decimal(precio), stock=10, categoria=categoria
+            )
+            CarritoItem.objects.create(usuario=self.usuario, producto=producto, cantidad=2)
+
+    def _cupon(self, **kwargs):
+        datos = {'codigo': 'RAM10', 'descripcion': 'Cupón', 'descuento_porcentaje': 10,
+                 'fecha_expiracion': timezone.now().date() + timedelta(days=5)}
+        datos.update(kwargs)
+        return Cupon.objects.create(**datos)
+
+    def test_subtotal_agregado_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            cotizacion = precios_service.cotizar_carrito_usuario(self.usuario)
+        self.assertEqual(cotizacion.subtotal, Decimal('400.00'))
+        self.assertEqual(cotizacion.total_items, 4)
+        self.assertEqual(cotizacion.total, Decimal('400.00'))
+
+    def test_reglas_del_cupon(self):
+        cotizacion = precios_service.cotizar_carrito_usuario(self.usuario, self._cupon(descuento_maximo=Decimal('25')))
+        self.assertEqual(cotizacion.descuento, Decimal('25'))
+        self.assertEqual(cotizacion.total, Decimal('375.00'))
+
+        cupon = self._cupon(codigo='MINIMO', compra_minima=Decimal('500'))
+        cotizacion = precios_service.cotizar_carrito_usuario(self.usuario, cupon)
+        self.assertEqual(cotizacion.descuento, Decimal('0'))
+        self.assertIsNone(cotizacion.cupon_aplicado)
+
+
+class CheckoutTransaccionalTest(TestCase):
+    """checkout_service: consultas constantes y sin sobreventa de la última unidad"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.datos_envio = {'nombre_completo': 'Cliente', 'telefono': '0999999999',
+                            'direccion': 'Av. 9 de Octubre', 'ciudad': 'Guayaquil', 'notas': ''}
+        tomar_worker_numeracion(self)
+
+    def _carrito(self, username, productos, cantidad=1):
+        usuario = User.objects.create_user(username, password='clave-prueba-123')
+        for producto in productos:
+            CarritoItem.objects.create(usuario=usuario, producto=producto, cantidad=cantidad)
+        return usuario
+
+    def _productos(self, cantidad, stock=10):
+        return [
+            Producto.objects.create(nombre=f'RTX {i}', precio=Decimal('300.00'), stock=stock, categoria=self.categoria)
+            for i in range(cantidad)
+        ]
+
+    def _consultas(self, usuario):
+        cronometro = CronometroSQL()
+        with connection.execute_wrapper(cronometro):
+            checkout_service.procesar_pedido(usuario, self.datos_envio)
+        return cronometro.consultas
+
+    def test_consultas_constantes_segun_tamano_del_carrito(self):
+        productos = self._productos(8)
+        pequeno = self._consultas(self._carrito('cliente_1', productos[:1]))
+        grande = self._consultas(self._carrito('cliente_8', productos))
+        self.assertEqual(pequeno, grande)
+        self.assertEqual(PedidoItem.objects.count(), 9)
+        self.assertFalse(CarritoItem.objects.exists())
+
+    def test_la_ultima_unidad_se_vende_una_sola_vez(self):
+        disponible, ultima = self._productos(2, stock=1)
+        compradores = [self._carrito(f'comprador_{i}', [disponible, ultima]) for i in range(3)]
+
+        checkout_service.procesar_pedido(compradores[0], self.datos_envio)
+        for comprador in compradores[1:]:
+            with self.assertRaisesMessage(checkout_service.ErrorCheckout, 'No hay suficiente stock'):
+                checkout_service.procesar_pedido(comprador, self.datos_envio)
+
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(list(Producto.objects.order_by('id').values_list('stock', flat=True)), [0, 0])
+        # Los compradores sin stock conservan su carrito completo
+        self.assertEqual(CarritoItem.objects.filter(usuario=compradores[1]).count(), 2)
+
+    def test_cupon_agotado_revierte_el_pedido(self):
+        producto, = self._productos(1)
+        cupon = Cupon.objects.create(
+            codigo='ULTIMO', descripcion='Un uso', descuento_porcentaje=10, usos_maximos=1,
+            fecha_expiracion=timezone.now().date() + timedelta(days=5)
+        )
+        usuario = self._carrito('cliente_cupon', [producto])
+        Cupon.objects.filter(id=cupon.id).update(usos_actuales=1)  # Otro comprador usó el último
+
+        cupon.usos_actuales = 0  # Copia desactualizada que tenía la sesión
+        with self.assertRaises(checkout_service.ErrorCheckout):
+            checkout_service.procesar_pedido(usuario, self.datos_envio, cupon=cupon)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 10)
+        self.assertFalse(Pedido.objects.exists())
+
+
+class ReservasStockTest(TestCase):
+    """reservas_service: la última unidad reservada en el checkout no se le vende a otro cliente"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Procesadores')
+        self.producto = Producto.objects.create(
+            nombre='Core i9 14900K', precio=Decimal('589.00'), stock=1, categoria=categoria
+        )
+        self.datos_envio = {'nombre_completo': 'Cliente', 'telefono': '0999999999',
+                            'direccion': 'Av. Amazonas', 'ciudad': 'Quito', 'notas': ''}
+        self.clientes = []
+        for i in range(2):
+            usuario = User.objects.create_user(f'cliente_reserva_{i}', password='clave-prueba-123')
+            CarritoItem.objects.create(usuario=usuario, producto=self.producto, cantidad=1)
+            self.clientes.append(usuario)
+        cache.clear()
+
+    def _items(self, usuario):
+        return list(CarritoItem.objects.filter(usuario=usuario).select_related('producto'))
+
+    def test_reserva_bloquea_a_otros_compradores(self):
+        primero, segundo = self.clientes
+        _, faltantes, agotados = reservas_service.reservar_carrito(primero, self._items(primero))
+        self.assertEqual((faltantes, agotados), ([], []))
+
+        _, faltantes, agotados = reservas_service.reservar_carrito(segundo, self._items(segundo))
+        self.assertEqual(([p.id for p in faltantes], agotados), ([self.producto.id], []))
+        producto, = reservas_service.anotar_disponible([Producto.objects.get(id=self.producto.id)])
+        self.assertEqual(producto.stock_disponible, 0)
+        self.assertEqual(producto.get_estado_stock(), 'Agotado')
+
+        with self.assertRaises(checkout_service.ErrorCheckout):
+            checkout_service.procesar_pedido(segundo, self.datos_envio)
+        checkout_service.procesar_pedido(primero, self.datos_envio)
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_barrido_de_reservas_vencidas(self):
+        primero, segundo = self.clientes
+        reservas_service.reservar_carrito(primero, self._items(primero))
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(reservas_service.expirar_reservas(), 1)
+        _, faltantes, _ = reservas_service.reservar_carrito(segundo, self._items(segundo))
+        self.assertEqual(faltantes, [])
+
+    def test_sin_stock_no_culpa_a_otros_clientes(self):
+        primero, _ = self.clientes
+        CarritoItem.objects.filter(usuario=primero).update(cantidad=2)  # Stock 1
+        self.client.force_login(primero)
+        respuesta = self.client.get(reverse('checkout'), follow=True)
+        avisos = [str(m) for m in respuesta.context['messages']]
+        self.assertEqual(len(avisos), 1)
+        self.assertIn('No hay stock suficiente de: Core i9 14900K', avisos[0])
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_reservas_no_invalidan_el_catalogo(self):
+        primero, segundo = self.clientes
+        ttl = reservas_service.CACHE_TTL_MAX
+        reservas_service.CACHE_TTL_MAX = 10 ** 6  # La ventana no cambia durante el test
+        self.addCleanup(setattr, reservas_service, 'CACHE_TTL_MAX', ttl)
+        version = validadores_service.estado_catalogo()
+        sin_reservas = self.client.get(reverse('catalogo'))['ETag']
+        self.assertEqual(self.client.get(reverse('catalogo'), HTTP_IF_NONE_MATCH=sin_reservas).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservas_service.reservar_carrito(primero, self._items(primero))
+        self.assertEqual(validadores_service.estado_catalogo(), version)  # Ni ETag global ni facetas
+        con_reservas = self.client.get(reverse('catalogo'), HTTP_IF_NONE_MATCH=sin_reservas)
+        self.assertEqual(con_reservas.status_code, 200)  # Muestra el stock descontando la reserva
+
+        # Otro checkout en la misma ventana: la página sigue validando
+        with self.captureOnCommitCallbacks(execute=True):
+            reservas_service.reservar_carrito(segundo, self._items(segundo))
+        respuesta = self.client.get(reverse('catalogo'), HTTP_IF_NONE_MATCH=con_reservas['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+
+class NumeracionPedidoTest(TestCase):
+    """numeracion_service: números únicos, crecientes y de ancho fijo sin consultar la BD"""
+
+    def test_numeros_unicos_y_crecientes(self):
+        generador = numeracion_service.GeneradorSnowflake(worker_id=7)
+        numeros = [generador.siguiente() for _ in range(20000)]  # Varias vueltas de la secuencia por ms
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertEqual(numeros, sorted(numeros))
+        self.assertTrue(all(len(n) == 20 and n.startswith('BF') for n in numeros))
+        self.assertEqual(numeracion_service.descomponer(numeros[-1])[1], 7)
+
+    def test_pedido_sin_consultas_extra(self):
+        usuario = User.objects.create_user('cliente_numeracion', password='clave-prueba-123')
+        datos = {'usuario': usuario, 'total': Decimal('10'), 'nombre_completo': 'Cliente',
+                 'telefono': '0999999999', 'direccion': 'Av. Quito', 'ciudad': 'Guayaquil'}
+        tomar_worker_numeracion(self)
+        with self.assertNumQueries(1):
+            pedido = Pedido.objects.create(**datos)
+        self.assertNotEqual(pedido.numero_pedido, Pedido.objects.create(**datos).numero_pedido)
+
+    def _generador(self):
+        """Generador sin id fijo, como el de un proceso recién iniciado"""
+        with self.captureOnCommitCallbacks(execute=True):
+            generador = numeracion_service.GeneradorSnowflake()
+            generador.siguiente()
+        return generador
+
+    def test_cada_proceso_toma_un_worker_id_distinto(self):
+        generadores = [self._generador() for _ in range(3)]
+        self.assertEqual(len({g.worker_id for g in generadores}), 3)
+        with self.assertNumQueries(0):
+            numeros = [g.siguiente() for g in generadores for _ in range(100)]
+        self.assertEqual(len(set(numeros)), 300)
+
+        # Lease vencido (proceso caído): otro proceso lo retoma y el anterior, al renovar, toma otro id
+        primero = generadores[0]
+        WorkerNumeracion.objects.filter(worker_id=primero.worker_id).update(vence=timezone.now() - timedelta(seconds=1))
+        nuevo = self._generador()
+        self.assertEqual(nuevo.worker_id, primero.worker_id)
+        primero.renovar_en = 0
+        primero.siguiente()
+        self.assertNotIn(primero.worker_id, {g.worker_id for g in generadores[1:] + [nuevo]})
+
+    def test_lease_revertido_se_vuelve_a_tomar(self):
+        generador = numeracion_service.GeneradorSnowflake()
+        try:
+            with transaction.atomic():
+                generador.siguiente()
+                raise IntegrityError('pedido revertido')
+        except IntegrityError:
+            pass
+        self.assertFalse(WorkerNumeracion.objects.exists())
+        generador.siguiente()  # La renovación no encuentra el lease: lo toma de nuevo
+        self.assertEqual(WorkerNumeracion.objects.get().propietario, generador.propietario)
+
+    def test_sin_ids_libres_falla(self):
+        vence = timezone.now() + timedelta(minutes=5)
+        WorkerNumeracion.objects.bulk_create([
+            WorkerNumeracion(worker_id=i, propietario='otro', vence=vence) for i in range(numeracion_service.MAX_WORKER + 1)
+        ])
+        with self.assertRaises(numeracion_service.ErrorNumeracion):
+            numeracion_service.GeneradorSnowflake().siguiente()
+        with override_settings(PEDIDO_WORKER_ID=300), self.assertRaises(ImproperlyConfigured):
+            numeracion_service.GeneradorSnowflake()
+
+
+class PagoIdempotenteTest(TestCase):
+    """procesar_pago: reenviar el formulario con la misma clave no crea otro pedido"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Almacenamiento')
+        self.producto = Producto.objects.create(
+            nombre='NVMe 2TB', precio=Decimal('150.00'), stock=5, categoria=categoria
+        )
+        self.usuario = User.objects.create_user('cliente_idempotente', password='clave-prueba-123')
+        CarritoItem.objects.create(usuario=self.usuario, producto=self.producto, cantidad=1)
+        self.client.force_login(self.usuario)
+        self.formulario = {'nombre_completo': 'Cliente', 'telefono': '0999999999', 'direccion': 'Av. Loja',
+                           'ciudad': 'Cuenca', 'clave_idempotencia': 'a1b2c3d4'}
+
+    def test_reintento_devuelve_el_mismo_pedido(self):
+        primera = self.client.post(reverse('procesar_pago'), self.formulario)
+        pedido = Pedido.objects.get()
+
+        with self.assertNumQueries(3):  # sesión, usuario y la clave
+            segunda = self.client.post(reverse('procesar_pago'), self.formulario)
+        self.assertEqual(primera.url, segunda.url)
+        self.assertEqual(segunda.url, reverse('confirmacion_pedido', kwargs={'pedido_id': pedido.id}))
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 4)
+
+    def test_reintento_concurrente_choca_con_la_clave(self):
+        self.client.post(reverse('procesar_pago'), self.formulario)
+        # Un segundo proceso que ya pasó la verificación rápida llega a la inserción de la clave
+        CarritoItem.objects.create(usuario=self.usuario, producto=self.producto, cantidad=1)
+        pedido = checkout_service.procesar_pedido(
+            self.usuario, {'nombre_completo': 'Cliente', 'telefono': '1', 'direccion': 'x', 'ciudad': 'y'},
+            clave='a1b2c3d4'
+        )
+        self.assertEqual(pedido, Pedido.objects.get())
+        self.assertTrue(CarritoItem.objects.filter(usuario=self.usuario).exists())
+
+
+class TareasTest(TestCase):
+    """tareas_service: las vistas encolan y el worker ejecuta, reintenta o marca fallida"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Procesadores')
+        self.producto = Producto.objects.create(
+            nombre='Ryzen 5 7600', precio=Decimal('200.00'), stock=3, categoria=self.categoria
+        )
+        self.staff = User.objects.create_user('staff_tareas', password='clave-prueba-123', is_staff=True)
+
+    def test_vista_encola_y_worker_completa(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('limpiar_productos'))
+        self.assertRedirects(respuesta, reverse('admin_tareas'))
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.tipo, tarea.estado, tarea.creada_por), ('limpiar_productos', 'pendiente', self.staff))
+
+        self.assertTrue(tareas_service.procesar_siguiente('test'))
+        self.assertFalse(tareas_service.procesar_siguiente('test'))
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.progreso, tarea.intentos), ('completada', 100, 1))
+        self.assertEqual(tarea.resultado['eliminados'], 0)
+
+        estado = self.client.get(reverse('estado_tarea', kwargs={'tarea_id': tarea.id})).json()
+        self.assertEqual(estado['estado'], 'completada')
+
+    def test_reintento_y_fallo(self):
+        llamadas = []
+
+        @tareas_service.tarea('prueba_falla')
+        def falla(contexto):
+            llamadas.append(1)
+            raise RuntimeError('API caída')
+
+        self.addCleanup(tareas_service.REGISTRO.pop, 'prueba_falla')
+        tarea = tareas_service.encolar('prueba_falla', max_intentos=2)
+
+        with self.assertLogs('gestion.services.tareas_service', 'ERROR'):
+            tareas_service.procesar_siguiente('test')
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'pendiente')
+        self.assertGreater(tarea.disponible_desde, timezone.now())  # Espera antes del reintento
+        self.assertFalse(tareas_service.procesar_siguiente('test'))
+
+        Tarea.objects.filter(id=tarea.id).update(disponible_desde=timezone.now())
+        with self.assertLogs('gestion.services.tareas_service', 'ERROR'):
+            tareas_service.procesar_siguiente('test')
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos, len(llamadas)), ('fallida', 2, 2))
+        self.assertIn('API caída', tarea.mensaje)
+
+    def test_lease_vencido_se_retoma(self):
+        tarea = tareas_service.encolar('limpiar_productos')
+        self.assertEqual(tareas_service.reclamar('worker-caido').id, tarea.id)
+        self.assertIsNone(tareas_service.reclamar('otro'))  # Ya está tomada
+
+        Tarea.objects.filter(id=tarea.id).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        retomada = tareas_service.reclamar('otro')
+        self.assertEqual((retomada.id, retomada.worker, retomada.intentos), (tarea.id, 'otro', 2))
+
+    def test_worker_con_lease_vencido_no_pisa_al_nuevo_dueno(self):
+        @tareas_service.tarea('prueba_worker')
+        def informar_worker(contexto):
+            return {'mensaje': contexto.tarea.worker}
+
+        self.addCleanup(tareas_service.REGISTRO.pop, 'prueba_worker')
+        tarea = tareas_service.encolar('prueba_worker')
+        lenta = tareas_service.reclamar('worker-lento')
+        Tarea.objects.filter(id=tarea.id).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        retomada = tareas_service.reclamar('worker-nuevo')
+
+        with self.assertLogs('gestion.services.tareas_service', 'WARNING'):
+            with self.assertRaises(tareas_service.LeasePerdido):
+                tareas_service.Contexto(lenta).progreso(1, 2)
+            self.assertFalse(tareas_service.ejecutar(lenta))  # Termina tarde: no guarda nada
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.worker, tarea.resultado), ('en_proceso', 'worker-nuevo', None))
+
+        self.assertTrue(tareas_service.ejecutar(retomada))
+        with self.assertLogs('gestion.services.tareas_service', 'WARNING'):
+            self.assertFalse(tareas_service.ejecutar(lenta))  # Ni después de que el nuevo terminó
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.resultado), ('completada', {'mensaje': 'worker-nuevo'}))
+
+
+class LatidoTareasTest(TransactionTestCase):
+    """tareas_service: el latido (otro hilo, otra conexión) mantiene el lease sin reportes de progreso"""
+
+    def setUp(self):
+        intervalo = tareas_service.INTERVALO_LATIDO
+        tareas_service.INTERVALO_LATIDO = timedelta(milliseconds=20)
+        self.addCleanup(setattr, tareas_service, 'INTERVALO_LATIDO', intervalo)
+
+    def test_tarea_sin_progreso_conserva_el_lease(self):
+        @tareas_service.tarea('prueba_http_lenta')
+        def http_lenta(contexto):
+            Tarea.objects.filter(id=contexto.tarea.id).update(bloqueada_hasta=timezone.now())
+            time.sleep(0.2)  # Llamada externa larga, sin progreso
+            restante = Tarea.objects.get(id=contexto.tarea.id).bloqueada_hasta - timezone.now()
+            return {'restante': restante.total_seconds()}
+
+        self.addCleanup(tareas_service.REGISTRO.pop, 'prueba_http_lenta')
+        tarea = tareas_service.encolar('prueba_http_lenta')
+        self.assertTrue(tareas_service.procesar_siguiente('worker-http'))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'completada')
+        self.assertGreater(tarea.resultado['restante'], 60)  # El latido lo renovó durante la llamada
+
+    def test_latido_detecta_el_lease_perdido(self):
+        tareas_service.encolar('limpiar_productos')
+        tomada = tareas_service.reclamar('worker-http')
+        with tareas_service.Latido(tomada) as latido:
+            Tarea.objects.filter(id=tomada.id).update(worker='worker-nuevo')  # Otro worker la retomó
+            self.assertTrue(latido.perdido.wait(2))
+            with self.assertRaises(tareas_service.LeasePerdido):
+                tareas_service.Contexto(tomada, latido).progreso(1, 2)
+        self.assertEqual(Tarea.objects.get(id=tomada.id).worker, 'worker-nuevo')
+
+
+class EstadoPedidosMasivoTest(TestCase):
+    """pedidos_service: transiciones validadas en lote y stock repuesto al cancelar"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Memoria RAM')
+        self.ram = Producto.objects.create(nombre='DDR5 32GB', precio=Decimal('120.00'), stock=10, categoria=categoria)
+        self.ssd = Producto.objects.create(nombre='SSD 1TB', precio=Decimal('80.00'), stock=10, categoria=categoria)
+        self.usuario = User.objects.create_user('cliente_estados', password='clave-prueba-123')
+
+    def _pedidos(self, cantidad, estado='pendiente'):
+        pedidos = []
+        for _ in range(cantidad):
+            pedido = Pedido.objects.create(usuario=self.usuario, total=Decimal('280'), estado=estado,
+                                           nombre_completo='Cliente', telefono='1', direccion='x', ciudad='Quito')
+            PedidoItem.objects.create(pedido=pedido, producto=self.ram, nombre_producto='DDR5', cantidad=2,
+                                      precio_unitario=Decimal('120.00'))
+            PedidoItem.objects.create(pedido=pedido, producto=self.ssd, nombre_producto='SSD', cantidad=1,
+                                      precio_unitario=Decimal('80.00'))
+            pedidos.append(pedido)
+        return pedidos
+
+    def test_transiciones_validas_e_invalidas(self):
+        pendiente, = self._pedidos(1)
+        enviado, = self._pedidos(1, 'enviado')
+        resultados = pedidos_service.cambiar_estado([pendiente.id, enviado.id, 999999], 'procesando')
+        self.assertEqual([r.resultado for r in resultados], ['actualizado', 'invalida', 'no_existe'])
+        self.assertEqual(Pedido.objects.get(id=pendiente.id).estado, 'procesando')
+        self.assertEqual(Pedido.objects.get(id=enviado.id).estado, 'enviado')
+
+    def test_cancelar_repone_stock_con_consultas_constantes(self):
+        pocos = [p.id for p in self._pedidos(2)] + [p.id for p in self._pedidos(1, 'enviado')]
+        with CaptureQueriesContext(connection) as pocas_consultas:
+            resultados = pedidos_service.cambiar_estado(pocos, 'cancelado')
+        self.assertTrue(all(r.ok for r in resultados))
+        self.ram.refresh_from_db()
+        self.ssd.refresh_from_db()
+        self.assertEqual((self.ram.stock, self.ssd.stock), (16, 13))
+
+        # Cancelar dos veces no repone dos veces
+        self.assertEqual(pedidos_service.cambiar_estado(pocos, 'cancelado')[0].resultado, 'sin_cambio')
+        self.ram.refresh_from_db()
+        self.assertEqual(self.ram.stock, 16)
+
+        muchos = [p.id for p in self._pedidos(20)] + [p.id for p in self._pedidos(10, 'enviado')]
+        with CaptureQueriesContext(connection) as muchas_consultas:
+            pedidos_service.cambiar_estado(muchos, 'cancelado')
+        self.assertEqual(len(muchas_consultas), len(pocas_consultas))
+        self.ram.refresh_from_db()
+        self.assertEqual(self.ram.stock, 76)
+
+    def test_vista_masiva(self):
+        staff = User.objects.create_user('staff_pedidos', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(staff)
+        pedidos = self._pedidos(3)
+        respuesta = self.client.post(reverse('admin_pedidos_estado_masivo'), {
+            'estado': 'procesando', 'pedidos': [p.id for p in pedidos], 'estado_filtro': 'pendiente',
+        })
+        self.assertRedirects(respuesta, reverse('admin_pedidos') + '?estado=pendiente', fetch_redirect_response=False)
+        self.assertEqual(Pedido.objects.filter(estado='procesando').count(), 3)
+
+
+class ListadoPedidosPaginadoTest(TestCase):
+    """admin_pedidos y mis_pedidos: páginas por cursor sin repetir ni saltar pedidos"""
+
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user('cliente_listado', password='clave-prueba-123')
+        ahora = timezone.now()
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(usuario=self.cliente, numero_pedido=f'LP{i:06d}', total=Decimal('10'), nombre_completo='C',
+                   telefono='1', direccion='x', ciudad='Loja', estado='enviado' if i % 3 else 'pendiente')
+            for i in range(60)
+        ])
+        # Varios pedidos en el mismo instante: el id desempata
+        for i, pedido in enumerate(pedidos):
+            Pedido.objects.filter(id=pedido.id).update(fecha_pedido=ahora - timedelta(minutes=i // 4))
+
+    def _recorrer(self, url, nombre):
+        vistos, cursor = [], None
+        while True:
+            respuesta = self.client.get(url, {'cursor': cursor} if cursor else {})
+            pagina = respuesta.context[nombre]
+            vistos += [p.id for p in pagina]
+            if not pagina.tiene_siguiente:
+                return vistos
+            cursor = pagina.cursor_siguiente
+
+    def test_staff_recorre_todos_los_pedidos_en_orden(self):
+        staff = User.objects.create_user('staff_listado', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(staff)
+        vistos = self._recorrer(reverse('admin_pedidos'), 'pedidos')
+        esperado = list(Pedido.objects.order_by('-fecha_pedido', '-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperado)
+        respuesta = self.client.get(reverse('admin_pedidos'), {'estado': 'pendiente'})
+        self.assertEqual(respuesta.context['total_pedidos'], 20)
+        self.assertEqual(len(respuesta.context['pedidos']), 20)
+
+    def test_cliente_pagina_sus_pedidos(self):
+        self.client.force_login(self.cliente)
+        vistos = self._recorrer(reverse('mis_pedidos'), 'pedidos')
+        self.assertEqual(len(vistos), 60)
+        self.assertEqual(len(set(vistos)), 60)
+
+
+class DashboardMetricasTest(TestCase):
+    """dashboard_service: métricas con agregación condicional y foto en caché"""
+
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.producto = Producto.objects.create(nombre='RTX 4070', precio=Decimal('600'), stock=2, categoria=categoria)
+        Producto.objects.create(nombre='RTX 3060', precio=Decimal('300'), stock=0, categoria=categoria)
+        self.usuario = User.objects.create_user('cliente_dashboard', password='clave-prueba-123')
+
+    def _pedido(self, total):
+        pedido = Pedido.objects.create(usuario=self.usuario, total=Decimal(total), nombre_completo='C',
+                                       telefono='1', direccion='x', ciudad='Ambato')
+        ventas_service.registrar_pedido(pedido, [])  # Como el checkout
+        return pedido
+
+    def test_metricas_y_foto_en_cache(self):
+        self._pedido('100.00')
+        with self.assertNumQueries(7):
+            metricas = dashboard_service.obtener_metricas()
+        self.assertEqual(
+            (metricas['total_productos'], metricas['productos_agotados'], metricas['productos_bajo_stock']), (2, 1, 1)
+        )
+        self.assertEqual((metricas['total_pedidos'], metricas['pedidos_hoy']), (1, 1))
+        self.assertEqual(metricas['ventas_mes'], Decimal('100.00'))
+
+        with self.assertNumQueries(0):
+            dashboard_service.obtener_metricas()
+
+    def test_pedido_nuevo_invalida_la_foto(self):
+        dashboard_service.obtener_metricas()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._pedido('250.00')
+        metricas = dashboard_service.obtener_metricas()
+        self.assertEqual((metricas['total_pedidos'], metricas['ventas_totales']), (1, Decimal('250.00')))
+
+
+class ResumenVentasTest(TestCase):
+    """ventas_service: el resumen incremental coincide con reconstruirlo desde el historial"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Almacenamiento')
+        self.ssd = Producto.objects.create(nombre='SSD 2TB', precio=Decimal('150.00'), stock=20, categoria=categoria)
+        self.hdd = Producto.objects.create(nombre='HDD 4TB', precio=Decimal('90.00'), stock=20, categoria=categoria)
+        self.usuario = User.objects.create_user('cliente_ventas', password='clave-prueba-123')
+        self.envio = {'nombre_completo': 'Cliente', 'telefono': '1', 'direccion': 'x', 'ciudad': 'Manta'}
+
+    def _comprar(self, *lineas):
+        for producto, cantidad in lineas:
+            CarritoItem.objects.create(usuario=self.usuario, producto=producto, cantidad=cantidad)
+        return checkout_service.procesar_pedido(self.usuario, self.envio)
+
+    def _foto(self):
+        horas = list(VentaHoraria.objects.order_by('hora').values_list(
+            'hora', 'pedidos', 'pedidos_cancelados', 'unidades', 'ventas', 'monto_cancelado', 'reembolsos'))
+        productos = list(VentaDiariaProducto.objects.order_by('fecha', 'nombre_producto').values_list(
+            'fecha', 'nombre_producto', 'producto_id', 'categoria_id', 'unidades', 'ventas'))
+        return horas, productos
+
+    def test_incremental_igual_a_reconstruido(self):
+        self._comprar((self.ssd, 2), (self.hdd, 1))
+        cancelado = self._comprar((self.ssd, 1))
+        entregado = self._comprar((self.hdd, 3))
+        pedidos_service.cambiar_estado([cancelado.id], 'cancelado')
+
+        Pedido.objects.filter(id=entregado.id).update(estado='entregado')
+        devolucion = Devolucion.objects.create(pedido=entregado, usuario=self.usuario, motivo='defectuoso',
+                                               descripcion='No enciende')
+        staff = User.objects.create_user('staff_ventas', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(staff)
+        self.client.post(reverse('gestionar_devolucion', kwargs={'devolucion_id': devolucion.id}),
+                         {'accion': 'aprobar', 'monto_reembolso': '90.00'})
+        self.client.post(reverse('gestionar_devolucion', kwargs={'devolucion_id': devolucion.id}),
+                         {'accion': 'completar'})  # No vuelve a contar el reembolso
+
+        incremental = self._foto()
+        fila = VentaHoraria.objects.get()
+        self.assertEqual((fila.pedidos, fila.pedidos_cancelados, fila.unidades), (3, 1, 6))
+        self.assertEqual((fila.ventas, fila.monto_cancelado, fila.reembolsos),
+                         (Decimal('660.00'), Decimal('150.00'), Decimal('90.00')))
+        self.assertEqual(ventas_service.mas_vendidos()[0],
+                         {'producto_id': self.hdd.id, 'nombre_producto': 'HDD 4TB', 'total_vendido': 4})
+
+        ventas_service.reconstruir()
+        self.assertEqual(self._foto(), incremental)
+
+    def test_productos_con_el_mismo_nombre_no_se_mezclan(self):
+        gemelo = Producto.objects.create(nombre='SSD 2TB', precio=Decimal('120.00'), stock=20,
+                                         categoria=Categoria.objects.create(nombre='Portátiles'))
+        self._comprar((self.ssd, 2), (gemelo, 1))
+        cancelado = self._comprar((gemelo, 3))
+        self.assertEqual(sorted(VentaDiariaProducto.objects.values_list('producto_id', 'unidades', 'ventas')),
+                         sorted([(self.ssd.id, 2, Decimal('300.00')), (gemelo.id, 4, Decimal('480.00'))]))
+        self.assertEqual([(v['producto_id'], v['total_vendido']) for v in ventas_service.mas_vendidos()],
+                         [(gemelo.id, 4), (self.ssd.id, 2)])
+        incremental = self._foto()
+        ventas_service.reconstruir()
+        self.assertEqual(self._foto(), incremental)
+
+        # Eliminado el producto solo queda el nombre; la cancelación igual se descuenta
+        gemelo.delete()
+        pedidos_service.cambiar_estado([cancelado.id], 'cancelado')
+        vendidos = [(v['producto_id'], v['total_vendido']) for v in ventas_service.mas_vendidos()]
+        ventas_service.reconstruir()
+        self.assertEqual(vendidos, [(self.ssd.id, 2), (None, 1)])
+        self.assertEqual([(v['producto_id'], v['total_vendido']) for v in ventas_service.mas_vendidos()], vendidos)
+
+    def test_consultas_constantes_por_pedido(self):
+        pedido = self._comprar((self.ssd, 1))
+        items = list(pedido.items.select_related('producto'))
+        with CaptureQueriesContext(connection) as una_linea:
+            ventas_service.registrar_pedido(pedido, items)
+        pedido = self._comprar((self.ssd, 1), (self.hdd, 2))
+        items = list(pedido.items.select_related('producto'))
+        with CaptureQueriesContext(connection) as dos_lineas:
+            ventas_service.registrar_pedido(pedido, items)
+        self.assertEqual(len(una_linea), len(dos_lineas))
+
+
+class SerieVentasTest(TestCase):
+    """series_service: serie por intervalo con downsampling y segmentos en caché"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('cliente_serie', password='clave-prueba-123')
+        self.ahora = timezone.now()
+        for horas_atras, total in [(2, '100.00'), (30, '40.00'), (30, '60.00'), (24 * 10, '25.00')]:
+            pedido = Pedido.objects.create(usuario=self.usuario, total=Decimal(total), nombre_completo='C',
+                                           telefono='1', direccion='x', ciudad='Loja')
+            Pedido.objects.filter(id=pedido.id).update(fecha_pedido=self.ahora - timedelta(hours=horas_atras))
+        ventas_service.reconstruir()
+
+    def test_granularidades_y_downsampling_conservan_totales(self):
+        desde = self.ahora - timedelta(days=14)
+        for granularidad in ('minuto', 'hora', 'dia', 'semana'):
+            serie = series_service.serie_ventas(desde, self.ahora, granularidad)
+            self.assertEqual((sum(serie['ingresos']), sum(serie['pedidos'])), (225.0, 4), granularidad)
+            self.assertLessEqual(len(serie['t']), series_service.MAX_PUNTOS)
+
+        serie = series_service.serie_ventas(desde, self.ahora, 'hora', max_puntos=10)
+        self.assertLessEqual(len(serie['t']), 10)
+        self.assertEqual(serie['paso_segundos'] % 3600, 0)
+        self.assertEqual(sum(serie['ingresos']), 225.0)
+
+        with self.assertNumQueries(0):  # Segmentos en caché
+            series_service.serie_ventas(desde, self.ahora, 'dia')
+
+    def test_rango_largo_en_frio_una_consulta(self):
+        desde = self.ahora - timedelta(days=365 * 5)
+        with self.assertNumQueries(1):  # ~260 segmentos de 7 días, un solo rango
+            serie = series_service.serie_ventas(desde, self.ahora, 'dia')
+        self.assertEqual((sum(serie['ingresos']), sum(serie['pedidos'])), (225.0, 4))
+
+        # Solo faltan los del medio: se recalculan juntos y el resultado no cambia
+        series_service.invalidar([self.ahora - timedelta(days=400), self.ahora - timedelta(days=10)])
+        with self.assertNumQueries(1):
+            self.assertEqual(series_service.serie_ventas(desde, self.ahora, 'dia'), serie)
+        with self.assertNumQueries(0):
+            series_service.serie_ventas(desde, self.ahora, 'semana')
+
+    def test_pedido_nuevo_invalida_el_segmento(self):
+        desde = self.ahora - timedelta(days=3)
+        series_service.serie_ventas(desde, self.ahora, 'hora')
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.create(usuario=self.usuario, total=Decimal('10.00'), nombre_completo='C',
+                                           telefono='1', direccion='x', ciudad='Loja')
+            ventas_service.registrar_pedido(pedido, [])
+        serie = series_service.serie_ventas(desde, timezone.now() + timedelta(minutes=1), 'hora')
+        self.assertEqual(sum(serie['ingresos']), 210.0)
+
+    def test_vista_solo_para_graficas(self):
+        supervisor = User.objects.create_user('supervisor_serie', password='clave-prueba-123', is_staff=True)
+        PerfilUsuario.objects.create(usuario=supervisor, rol='supervisor')
+        bodeguero = User.objects.create_user('bodeguero_serie', password='clave-prueba-123', is_staff=True)
+        PerfilUsuario.objects.create(usuario=bodeguero, rol='bodeguero')
+
+        self.client.force_login(bodeguero)
+        self.assertEqual(self.client.get(reverse('serie_ventas')).status_code, 403)
+
+        self.client.force_login(supervisor)
+        respuesta = self.client.get(reverse('serie_ventas'), {'granularidad': 'semana'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(sum(respuesta.json()['pedidos']), 4)
+        self.assertEqual(self.client.get(reverse('serie_ventas'), {'granularidad': 'anio'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('serie_ventas'), {'desde': 'ayer'}).status_code, 400)
+        for parametros in ({'hasta': 'zzz'}, {'hasta': 'zzz', 'desde': '2024-01-01'}):
+            respuesta = self.client.get(reverse('serie_ventas'), parametros)
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('Fechas inválidas', respuesta.json()['error'])
+
+
+class ExportarReportesTest(TestCase):
+    """reportes_service: CSV en streaming con una consulta por reporte"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Fuentes')
+        self.staff = User.objects.create_user('staff_reportes', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def _sembrar(self, desde, hasta):
+        for i in range(desde, hasta):
+            cliente = User.objects.create_user(f'cliente_reporte_{i}', password='clave-prueba-123')
+            Producto.objects.create(nombre=f'Fuente {i}', precio=Decimal('50.00'), stock=i, categoria=self.categoria)
+            for _ in range(2):
+                Pedido.objects.create(usuario=cliente, total=Decimal('50.00'), nombre_completo='C',
+                                      telefono='1', direccion='x', ciudad='Cuenca')
+
+    def _exportar(self, tipo):
+        respuesta = self.client.get(reverse('admin_exportar'), {'tipo': tipo})
+        self.assertTrue(respuesta.streaming)
+        with CaptureQueriesContext(connection) as consultas:
+            lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        return lineas, len(consultas)
+
+    def test_una_consulta_por_reporte_sin_importar_las_filas(self):
+        self._sembrar(0, 2)
+        pocos = {tipo: self._exportar(tipo) for tipo in reportes_service.REPORTES}
+        self._sembrar(2, 10)
+        for tipo in reportes_service.REPORTES:
+            lineas, consultas = self._exportar(tipo)
+            self.assertEqual(consultas, 1, tipo)
+            self.assertEqual(consultas, pocos[tipo][1], tipo)
+
+        lineas, _ = self._exportar('clientes')
+        self.assertEqual(len(lineas), 11)
+        self.assertTrue(all(linea.endswith(',2') for linea in lineas[1:]))
+        lineas, _ = self._exportar('productos')
+        self.assertIn('Fuente 0,50.00,0,Fuentes,Sí', lineas)
+        self.assertEqual(self.client.get(reverse('admin_exportar'), {'tipo': 'otro'}).status_code, 404)
+
+
+class ExportacionEnFondoTest(TestCase):
+    """reportes_service: exportaciones en segundo plano reutilizadas mientras los datos no cambien"""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        ajustes = override_settings(EXPORTACIONES_DIR=self.directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.cliente = User.objects.create_user('cliente_exportacion', password='clave-prueba-123')
+        for total in ('10.00', '20.00'):
+            Pedido.objects.create(usuario=self.cliente, total=Decimal(total), nombre_completo='C',
+                                  telefono='1', direccion='x', ciudad='Quito')
+        self.staff = User.objects.create_user('staff_exportacion', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def _exportar(self, formato):
+        self.client.post(reverse('admin_exportar_fondo'), {'tipo': 'pedidos', 'formato': formato})
+        while tareas_service.procesar_siguiente('test'):
+            pass
+        return Tarea.objects.filter(tipo='exportar_reporte').latest('id')
+
+    def test_jsonl_gz_y_descarga(self):
+        tarea = self._exportar('jsonl.gz')
+        self.assertEqual((tarea.estado, tarea.resultado['filas']), ('completada', 2))
+        respuesta = self.client.get(reverse('descargar_exportacion', kwargs={'tarea_id': tarea.id}))
+        filas = [json.loads(linea) for linea in gzip.decompress(b''.join(respuesta.streaming_content)).splitlines()]
+        self.assertEqual(sorted(fila['total'] for fila in filas), [10.0, 20.0])
+        self.assertEqual(filas[0]['cliente'], 'cliente_exportacion')
+        self.assertEqual(len({reportes_service.firma(tipo) for tipo in reportes_service.REPORTES}), 4)
+
+    def test_misma_firma_no_se_regenera(self):
+        primera = self._exportar('csv.gz')
+        segunda = self._exportar('csv.gz')  # Nada cambió: la tarea reutiliza el archivo
+        self.assertTrue(segunda.resultado['reutilizado'])
+        self.assertEqual(segunda.resultado['archivo'], primera.resultado['archivo'])
+
+        Pedido.objects.create(usuario=self.cliente, total=Decimal('5.00'), nombre_completo='C',
+                              telefono='1', direccion='x', ciudad='Quito')
+        tercera = self._exportar('csv.gz')
+        self.assertNotEqual(tercera.resultado['archivo'], primera.resultado['archivo'])
+        self.assertEqual(tercera.resultado['filas'], 3)
+        self.assertEqual(len(os.listdir(self.directorio.name)), 2)
+
+    def test_solicitud_no_lee_los_datos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post(reverse('admin_exportar_fondo'), {'tipo': 'pedidos', 'formato': 'csv.gz'})
+        self.assertFalse([c['sql'] for c in consultas if 'gestion_pedido' in c['sql']])
+        # Mismos parámetros en cola: no se encola otra
+        self.client.post(reverse('admin_exportar_fondo'), {'tipo': 'pedidos', 'formato': 'csv.gz'})
+        self.assertEqual(Tarea.objects.filter(tipo='exportar_reporte').count(), 1)
+
+    def test_firma_cubre_las_columnas_exportadas(self):
+        primera = self._exportar('csv.gz')
+        clientes = reportes_service.firma('clientes')
+
+        # Sin tocar Pedido: el username sale en el reporte de pedidos
+        self.cliente.username = 'cliente_renombrado'
+        self.cliente.save()
+        segunda = self._exportar('csv.gz')
+        self.assertFalse(segunda.resultado['reutilizado'])
+        self.assertNotEqual(reportes_service.firma('clientes'), clientes)
+        with open(os.path.join(self.directorio.name, segunda.resultado['archivo']), 'rb') as archivo:
+            self.assertIn(b'cliente_renombrado', gzip.decompress(archivo.read()))
+
+        clientes = reportes_service.firma('clientes')
+        self.cliente.email = 'nuevo@bitforge.test'
+        self.cliente.save()
+        self.assertNotEqual(reportes_service.firma('clientes'), clientes)
+
+        # Iniciar sesión solo guarda last_login: la firma no cambia
+        clientes = reportes_service.firma('clientes')
+        self.assertTrue(Client().login(username='cliente_renombrado', password='clave-prueba-123'))
+        self.assertEqual(reportes_service.firma('clientes'), clientes)
+
+        # Cambio masivo de estados (update sin señales): también cambia la firma
+        pedidos = reportes_service.firma('pedidos')
+        pedidos_service.cambiar_estado(list(Pedido.objects.values_list('id', flat=True)), 'procesando')
+        self.assertNotEqual(reportes_service.firma('pedidos'), pedidos)
+
+
+class InventarioMasivoTest(TestCase):
+    """inventario_service: muchos cambios de stock en una transacción, todo o nada"""
+
+    def setUp(self):
+        self.gpu = Categoria.objects.create(nombre='Tarjetas Gráficas')
+        self.ram = Categoria.objects.create(nombre='Memoria RAM')
+        self.productos = [
+            Producto.objects.create(nombre=f'Producto {i}', precio=Decimal('10.00'), stock=i,
+                                    categoria=self.gpu if i % 2 else self.ram)
+            for i in range(40)
+        ]
+        staff = User.objects.create_user('bodeguero_masivo', password='clave-prueba-123', is_staff=True)
+        self.client.force_login(staff)
+
+    def _stock(self, producto):
+        return Producto.objects.values_list('stock', flat=True).get(id=producto.id)
+
+    def test_consultas_constantes_con_la_cantidad_de_cambios(self):
+        def cambios(productos):
+            return [inventario_service.CambioStock(p.id, inventario_service.SUMAR, 3) for p in productos]
+
+        with CaptureQueriesContext(connection) as pocos:
+            inventario_service.aplicar_cambios(cambios(self.productos[:3]))
+        with CaptureQueriesContext(connection) as muchos:
+            actualizados = inventario_service.aplicar_cambios(cambios(self.productos[3:]))
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual(len(actualizados), 37)
+        self.assertEqual(self._stock(self.productos[10]), 13)
+
+    def test_todo_o_nada(self):
+        with self.assertRaises(inventario_service.ErrorInventario) as error:
+            inventario_service.aplicar_cambios([
+                inventario_service.CambioStock(self.productos[5].id, inventario_service.FIJAR, 50),
+                inventario_service.CambioStock(self.productos[2].id, inventario_service.SUMAR, -3),
+                inventario_service.CambioStock(999999, inventario_service.FIJAR, 1),
+            ])
+        self.assertEqual(len(error.exception.errores), 2)
+        self.assertEqual(self._stock(self.productos[5]), 5)
+
+    def test_grilla_csv_y_api(self):
+        p1, p2, p3 = self.productos[1], self.productos[2], self.productos[3]
+        self.client.post(reverse('gestion_stock'), {
+            f'original_{p1.id}': '1', f'nuevo_{p1.id}': '8', f'delta_{p1.id}': '',
+            f'original_{p2.id}': '2', f'nuevo_{p2.id}': '2', f'delta_{p2.id}': '-2',
+            f'original_{p3.id}': '3', f'nuevo_{p3.id}': '3', f'delta_{p3.id}': '',  # Sin cambios
+        })
+        self.assertEqual((self._stock(p1), self._stock(p2), self._stock(p3)), (8, 0, 3))
+        respuesta = self.client.get(reverse('gestion_stock'))
+        self.assertEqual(len(respuesta.context['cambios']), 2)
+
+        archivo = SimpleUploadedFile('conteo.csv', f'producto_id,stock,delta\n{p1.id},,5\n{p3.id},30,\n'.encode())
+        self.client.post(reverse('gestion_stock'), {'archivo': archivo})
+        self.assertEqual((self._stock(p1), self._stock(p3)), (13, 30))
+
+        respuesta = self.client.post(reverse('stock_masivo_api'), {'cambios': [{'producto_id': p2.id, 'stock': 4}]},
+                                     content_type='application/json')
+        self.assertEqual(respuesta.json()['actualizados'][0]['stock_nuevo'], 4)
+        respuesta = self.client.post(reverse('stock_masivo_api'), {'cambios': [{'producto_id': p2.id, 'delta': -9}]},
+                                     content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_actualizar_stock_muestra_la_causa(self):
+        respuesta = self.client.post(reverse('actualizar_stock', args=[999999]), {'stock': '3'}, follow=True)
+        self.assertIn('Producto 999999: no existe', [str(m) for m in respuesta.context['messages']][0])
+        respuesta = self.client.post(reverse('actualizar_stock', args=[self.productos[4].id]), {'stock': '-2'},
+                                     follow=True)
+        self.assertIn('el stock quedaría en -2', [str(m) for m in respuesta.context['messages']][0])
+        self.assertEqual(self._stock(self.productos[4]), 4)
+
+    def test_un_solo_umbral_de_bajo_stock(self):
+        self.assertEqual(inventario_service.UMBRAL_BAJO_STOCK, Producto.UMBRAL_BAJO_STOCK)
+        self.assertEqual(dashboard_service.UMBRAL_BAJO_STOCK, Producto.UMBRAL_BAJO_STOCK)
+        self.productos[3].stock_disponible = Producto.UMBRAL_BAJO_STOCK
+        self.assertEqual(self.productos[3].get_estado_stock(), 'ultimas unidades')
+
+    def test_listado_paginado_y_filtrado(self):
+        respuesta = self.client.get(reverse('gestion_stock'), {'categoria': self.gpu.id, 'umbral': 9})
+        self.assertEqual([p.stock for p in respuesta.context['productos']], [1, 3, 5, 7, 9])
+        self.assertEqual(respuesta.context['resumen']['total'], 5)
+
+        vistos = []
+        cursor = None
+        while True:
+            datos = self.client.get(reverse('stock_masivo_api'), {'cursor': cursor or ''}).json()
+            vistos += [p['stock'] for p in datos['productos']]
+            cursor = datos['cursor_siguiente']
+            if not cursor:
+                break
+        self.assertEqual(vistos, list(range(40)))
+
+
+class KardexStockTest(TestCase):
+    """kardex_service: cada cambio de stock queda como movimiento y el stock histórico sale de foto + delta"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Procesadores')
+        self.cpu = Producto.objects.create(nombre='Ryzen 7', precio=Decimal('300.00'), stock=10, categoria=self.categoria)
+        self.staff = User.objects.create_user('bodega_kardex', password='clave-prueba-123', is_staff=True)
+        self.datos_envio = {'nombre_completo': 'Cliente', 'telefono': '1', 'direccion': 'x', 'ciudad': 'Quito', 'notas': ''}
+
+    def _marca(self):
+        """Instante entre dos operaciones (los movimientos siguientes quedan después)"""
+        time.sleep(0.002)
+        momento = timezone.now()
+        time.sleep(0.002)
+        return momento
+
+    def test_stock_historico_igual_a_reproducir_movimientos(self):
+        cliente = User.objects.create_user('cliente_kardex', password='clave-prueba-123')
+        esperado = [(self._marca(), 10)]
+
+        CarritoItem.objects.create(usuario=cliente, producto=self.cpu, cantidad=3)
+        pedido = checkout_service.procesar_pedido(cliente, self.datos_envio)
+        esperado.append((self._marca(), 7))
+        self.assertEqual(kardex_service.tomar_fotos(), 1)
+
+        pedidos_service.cambiar_estado([pedido.id], 'cancelado')
+        esperado.append((self._marca(), 10))
+        inventario_service.aplicar_cambios([inventario_service.CambioStock(self.cpu.id, inventario_service.FIJAR, 4)])
+        esperado.append((self._marca(), 4))
+        self.assertEqual(kardex_service.tomar_fotos(), 1)
+        self.assertEqual(kardex_service.tomar_fotos(), 0)  # Sin movimientos nuevos no hay foto nueva
+
+        self.cpu.refresh_from_db()
+        self.cpu.stock += 6
+        self.cpu.save()
+        esperado.append((self._marca(), 10))
+
+        for momento, stock in esperado:
+            self.assertEqual(kardex_service.stock_en(momento, [self.cpu.id])[self.cpu.id], stock)
+        tipos = list(MovimientoStock.objects.order_by('id').values_list('tipo', 'cantidad'))
+        self.assertEqual(tipos, [('inicial', 10), ('venta', -3), ('cancelacion', 3), ('conteo', -6), ('ajuste', 6)])
+        self.assertEqual(
+            MovimientoStock.objects.get(tipo='venta').referencia, f'Pedido #{pedido.numero_pedido}'
+        )
+
+    def test_la_foto_acota_los_movimientos_leidos(self):
+        for _ in range(5):
+            inventario_service.aplicar_cambios([inventario_service.CambioStock(self.cpu.id, inventario_service.SUMAR, 2)])
+        kardex_service.tomar_fotos()
+        inventario_service.aplicar_cambios([inventario_service.CambioStock(self.cpu.id, inventario_service.SUMAR, -1)])
+        # Los movimientos anteriores a la foto ya no se leen: sin ellos el resultado no cambia
+        foto = FotoStock.objects.get()
+        MovimientoStock.objects.filter(id__lte=foto.ultimo_movimiento).delete()
+        self.assertEqual(kardex_service.stock_en(timezone.now(), [self.cpu.id]), {self.cpu.id: 19})
+
+    def test_consultas_constantes_y_movimientos_agrupados(self):
+        otros = [Producto.objects.create(nombre=f'CPU {i}', precio=Decimal('1.00'), stock=i, categoria=self.categoria)
+                 for i in range(20)]
+        with CaptureQueriesContext(connection) as uno:
+            kardex_service.stock_en(timezone.now(), [self.cpu.id])
+        with CaptureQueriesContext(connection) as muchos:
+            historico = kardex_service.stock_en(timezone.now())
+        self.assertEqual(len(uno), len(muchos))
+        self.assertEqual(historico[otros[7].id], 7)
+
+        # Los save() dentro de un lote se insertan juntos al final
+        with CaptureQueriesContext(connection) as consultas:
+            with kardex_service.lote(kardex_service.ENTRADA, 'Recepción'):
+                for producto in Producto.objects.all():
+                    producto.stock += 1
+                    producto.save()
+        inserts = [q for q in consultas.captured_queries if 'INSERT INTO "gestion_movimientostock"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(MovimientoStock.objects.filter(tipo='entrada', referencia='Recepción').count(), 21)
+
+    def test_vista_kardex_con_saldos(self):
+        solicitud = Solicitud.objects.create(cliente=self.staff, producto=self.cpu, cantidad=5)
+        self.client.force_login(self.staff)
+        self.client.get(reverse('marcar_completada', args=[solicitud.id]))
+        respuesta = self.client.get(reverse('kardex_producto', args=[self.cpu.id]))
+        kardex = respuesta.context['kardex']
+        self.assertEqual(kardex['saldo_inicial'], 0)
+        self.assertEqual([(m.tipo, m.saldo) for m in kardex['movimientos']], [('inicial', 10), ('entrada', 15)])
+        self.assertEqual(kardex['movimientos'][1].referencia, f'Solicitud #{solicitud.id}')
+        self.assertEqual(kardex['saldo_final'], 15)
+
+
+class PreciosMasivosTest(TestCase):
+    """precios_masivos_service: precios nuevos por lotes con UPDATE ... CASE, sin save() por producto"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Almacenamiento')
+        self.staff = User.objects.create_user('staff_precios', password='clave-prueba-123', is_staff=True)
+
+    def _productos(self, cantidad, precio='100.00'):
+        return Producto.objects.bulk_create([
+            Producto(nombre=f'SSD {i}', precio=Decimal(precio), stock=1, categoria=self.categoria)
+            for i in range(cantidad)
+        ])
+
+    def _precios(self):
+        return dict(Producto.objects.values_list('id', 'precio'))
+
+    def test_consultas_constantes_con_la_cantidad_de_productos(self):
+        self._productos(3)
+        precios_masivos_service.aplicar_fluctuacion(0.9, 1.1, semilla=1)  # Calienta la caché de versiones
+        with CaptureQueriesContext(connection) as pocos:
+            precios_masivos_service.aplicar_fluctuacion(0.9, 1.1, semilla=1)
+        nuevos = {p.id for p in self._productos(200)}
+        with CaptureQueriesContext(connection) as muchos:
+            resultado = precios_masivos_service.aplicar_fluctuacion(0.9, 1.1, semilla=1)
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual(resultado.productos, 203)
+        for pid, precio in self._precios().items():
+            if pid in nuevos:  # Una sola fluctuación
+                self.assertTrue(Decimal('90.00') <= precio <= Decimal('110.00'))
+            self.assertEqual(precio, precio.quantize(Decimal('0.01')))
+
+    def test_simular_no_escribe_y_la_semilla_repite(self):
+        self._productos(50, precio='19.99')
+        Producto.objects.filter(id=Producto.objects.order_by('id').first().id).update(disponible=False)
+        antes = self._precios()
+
+        simulado = precios_masivos_service.aplicar_fluctuacion(0.95, 1.05, simular=True, semilla=7)
+        self.assertEqual(self._precios(), antes)
+        self.assertEqual(simulado.productos, 49)  # Solo disponibles
+        self.assertTrue(simulado.muestra)
+
+        real = precios_masivos_service.aplicar_fluctuacion(0.95, 1.05, semilla=7)
+        self.assertEqual(real.modificados, simulado.modificados)
+        despues = self._precios()
+        for pid, anterior, nuevo in simulado.muestra:
+            self.assertEqual((antes[pid], despues[pid]), (anterior, nuevo))
+
+        with self.assertRaises(precios_masivos_service.ErrorPrecios):
+            precios_masivos_service.aplicar_fluctuacion(1.1, 0.9)
+
+    def test_tarea_informa_filas_por_segundo(self):
+        self._productos(10)
+        self.client.force_login(self.staff)
+        self.client.get(reverse('importar_precios'))
+        self.assertTrue(tareas_service.procesar_siguiente('test'))
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.resultado['productos']), ('completada', 10))
+        self.assertIn('filas_por_segundo', tarea.resultado)
+
+
+class HistorialPreciosTest(TestCase):
+    """historial_precios_service: una fila por cambio real y consultas por rango sin N+1"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Memoria RAM')
+        self.ahora = timezone.now()
+
+    def _producto(self, nombre, precio):
+        return Producto.objects.create(nombre=nombre, precio=Decimal(precio), stock=5, categoria=self.categoria)
+
+    def _historial(self, producto):
+        return list(HistorialPrecio.objects.filter(producto=producto).order_by('id').values_list('origen', 'precio'))
+
+    def test_solo_registra_cambios_reales(self):
+        ram = self._producto('DDR5 16GB', '80.00')
+        ram.stock = 3
+        ram.save()  # El precio no cambió
+        ram.precio = 75.5  # Float desde un importador
+        ram.save()
+        with historial_precios_service.origen(historial_precios_service.IMPORTACION):
+            ram.precio = Decimal('75.50')
+            ram.save()  # Mismo precio: nada
+            ram.precio = Decimal('70.00')
+            ram.save()
+        resultado = precios_masivos_service.aplicar_fluctuacion(2, 2)
+        self.assertEqual(resultado.modificados, 1)
+        self.assertEqual(self._historial(ram), [
+            ('inicial', Decimal('80.00')), ('edicion', Decimal('75.50')),
+            ('importacion', Decimal('70.00')), ('fluctuacion', Decimal('140.00')),
+        ])
+
+    def test_precio_en_y_series_con_una_consulta(self):
+        productos = [self._producto(f'RAM {i}', '100.00') for i in range(30)]
+        HistorialPrecio.objects.update(fecha=self.ahora - timedelta(days=60))
+        ids = [p.id for p in productos]
+        historial_precios_service.registrar([(pid, Decimal('90.00')) for pid in ids],
+                                            fecha=self.ahora - timedelta(days=20))
+        historial_precios_service.registrar([(ids[0], Decimal('95.00'))], fecha=self.ahora - timedelta(days=5))
+
+        with self.assertNumQueries(1):
+            precios = historial_precios_service.precio_en(ids, self.ahora - timedelta(days=30))
+        self.assertEqual(set(precios.values()), {Decimal('100.00')})
+        self.assertEqual(historial_precios_service.precio_en(ids[:1], self.ahora)[ids[0]], Decimal('95.00'))
+        self.assertEqual(historial_precios_service.precio_en(ids[:1], self.ahora - timedelta(days=90)), {})
+
+        desde = self.ahora - timedelta(days=30)
+        with self.assertNumQueries(1):
+            series = historial_precios_service.series(ids, desde, self.ahora)
+        self.assertEqual(series[ids[0]], [
+            (desde, Decimal('100.00')),
+            (self.ahora - timedelta(days=20), Decimal('90.00')),
+            (self.ahora - timedelta(days=5), Decimal('95.00')),
+        ])
+        self.assertEqual(len(series[ids[29]]), 2)
+
+    def test_tendencia_en_catalogo_y_api(self):
+        ram = self._producto('DDR5 32GB', '100.00')
+        HistorialPrecio.objects.update(fecha=self.ahora - timedelta(days=60))
+        ram.precio = Decimal('80.00')
+        ram.save()
+
+        respuesta = self.client.get(reverse('catalogo'))
+        producto, = respuesta.context['productos']
+        self.assertEqual((producto.precio_anterior, producto.variacion_precio), (Decimal('100.00'), Decimal('-20.0')))
+
+        datos = self.client.get(reverse('historial_precios_api'), {'ids': str(ram.id)}).json()
+        self.assertEqual(datos['series'][str(ram.id)]['precio'], ['100.00', '80.00'])
+        momento = (self.ahora - timedelta(days=30)).isoformat()
+        datos = self.client.get(reverse('historial_precios_api'), {'ids': str(ram.id), 'momento': momento}).json()
+        self.assertEqual(datos['precios'], {str(ram.id): '100.00'})
+        self.assertEqual(self.client.get(reverse('historial_precios_api'), {'ids': 'x'}).status_code, 400)
@@ -66,6 +66,7 @@ urlpatterns = [
     path('importar-precios/', views.importar_precios, name='importar_precios'),
     path('producto/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
     path('catalogo/', views.catalogo, name='catalogo'),
+    path('api/precios/historial/', views.historial_precios_api, name='historial_precios_api'),
 
     # Admin/Staff (USANDO staff/ EN VEZ DE admin/ PARA EVITAR CONFLICTO)
     path('staff/solicitudes/', views.ver_solicitudes_admin, name='solicitudes_admin'),
@@ -73,17 +74,23 @@ urlpatterns = [
     path('staff/panel/', views.panel_admin_mejorado, name='panel_admin'),
     path('staff/pedidos/', views.admin_pedidos, name='admin_pedidos'),
     path('staff/pedido/actualizar/<int:pedido_id>/', views.admin_actualizar_pedido, name='admin_actualizar_pedido'),
+    path('staff/pedidos/estado-masivo/', views.admin_pedidos_estado_masivo, name='admin_pedidos_estado_masivo'),
     path('staff/cupones/', views.admin_cupones, name='admin_cupones'),
     path('staff/cupon/toggle/<int:cupon_id>/', views.admin_toggle_cupon, name='admin_toggle_cupon'),
 
     # Bodega/Stock
     path('staff/stock/', views.gestion_stock, name='gestion_stock'),
     path('staff/stock/actualizar/<int:producto_id>/', views.actualizar_stock, name='actualizar_stock'),
+    path('staff/api/stock/', views.stock_masivo_api, name='stock_masivo_api'),
+    path('staff/stock/kardex/<int:producto_id>/', views.kardex_producto, name='kardex_producto'),
     
     # Utilidades Admin
     path('staff/cargar-productos/', views.cargar_productos_demo, name='cargar_productos'),
     path('staff/limpiar-productos/', views.limpiar_productos, name='limpiar_productos'),
     path('staff/importar-pcpartpicker/', views.importar_pcpartpicker, name='importar_pcpartpicker'),
+    path('staff/tareas/', views.admin_tareas, name='admin_tareas'),
+    path('staff/tarea/<int:tarea_id>/', views.estado_tarea, name='estado_tarea'),
+    path('staff/api/ventas/serie/', views.serie_ventas, name='serie_ventas'),
     
     # Búsqueda PCPartPicker (AJAX)
     path('buscar-pcpartpicker/', views.buscar_pcpartpicker, name='buscar_pcpartpicker'),
@@ -91,6 +98,8 @@ urlpatterns = [
     # Nuevas funcionalidades Admin
     path('staff/clientes/', views.admin_clientes, name='admin_clientes'),
     path('staff/exportar/', views.admin_exportar_reporte, name='admin_exportar'),
+    path('staff/exportar/fondo/', views.admin_exportar_fondo, name='admin_exportar_fondo'),
+    path('staff/exportar/descargar/<int:tarea_id>/', views.descargar_exportacion, name='descargar_exportacion'),
     
     # Devoluciones (Cliente)
     path('devolucion/solicitar/<int:pedido_id>/', views.solicitar_devolucion, name='solicitar_devolucion'),
@@ -1,28 +1,70 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Avg, Count, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from .models import (
     Producto, CarritoItem, Solicitud, Categoria, 
     Pedido, PedidoItem, Resena, ListaDeseos, 
     Cupon, PerfilUsuario, SuscripcionNewsletter, ProductoComparado,
-    Devolucion
+    Devolucion, Tarea
 )
 from django.contrib.admin.views.decorators import staff_member_required
+import json
 import requests
-import random
+import uuid
+from datetime import timedelta
 from decimal import Decimal
 
 # Servicio de APIs de Hardware
 from .services import hardware_api_service
+# Paginación por cursor del catálogo
+from .services import paginacion_service
+# Búsqueda full-text (FTS5)
+from .services import busqueda_service
+# Autocompletado en memoria para la búsqueda en vivo
+from .services import autocompletado_service
+# Facetas del sidebar del catálogo
+from .services import facetas_service
+# Validadores ETag / Last-Modified (respuestas 304)
+from .services import validadores_service
+# Carrito unificado (autenticado / sesión)
+from .services import carrito_service
+# Cotización única del carrito (subtotal, cupón, total)
+from .services import precios_service
+# Checkout transaccional (stock, cupón, pedido)
+from .services import checkout_service
+# Reservas temporales de stock (checkout -> pago)
+from .services import reservas_service
+# Cola de tareas en segundo plano (importaciones y cargas masivas del staff)
+from .services import tareas_service
+# Cambios de estado de pedidos (individuales y masivos)
+from .services import pedidos_service
+# Métricas del panel de administración (foto en caché)
+from .services import dashboard_service
+# Resúmenes de ventas por hora y por producto (rollups)
+from .services import ventas_service
+# Series de tiempo de ventas para las gráficas del panel
+from .services import series_service
+# Reportes CSV del panel (una consulta por reporte, en streaming)
+from .services import reportes_service
+# Cambios de stock masivos (bodega)
+from .services import inventario_service
+# Kardex: movimientos y fotos de stock
+from .services import kardex_service
+# Historial de precios (precio en una fecha, series y tendencias)
+from .services import historial_precios_service
 
 # Vista principal - Página de inicio
 def home(request):
     productos = Producto.objects.filter(disponible=True)
-    return render(request, 'index.html', {'productos': productos})
+    pagina = paginacion_service.paginar_keyset(productos, cursor=request.GET.get('cursor'))
+    return render(request, 'index.html', {'productos': pagina, 'pagina': pagina})
 
 
 # Vista de registro con roles
@@ -134,52 +176,12 @@ def registro(request):
 # Vista del carrito (AHORA SIN LOGIN REQUERIDO - usa sesión)
 def ver_carrito(request):
     """Vista del carrito que funciona para usuarios autenticados y no autenticados"""
-    items = []
-    subtotal = Decimal('0')
-    total_items = 0
-    
-    if request.user.is_authenticated:
-        # Usuario autenticado - usar modelo CarritoItem
-        items = CarritoItem.objects.filter(usuario=request.user).select_related('producto')
-        subtotal = sum(item.subtotal() for item in items)
-        total_items = sum(item.cantidad for item in items)
-    else:
-        # Usuario no autenticado - usar sesión
-        carrito_sesion = request.session.get('carrito', {})
-        for producto_id, cantidad in carrito_sesion.items():
-            try:
-                producto = Producto.objects.get(id=producto_id)
-                item_data = {
-                    'id': producto_id,
-                    'producto': producto,
-                    'cantidad': cantidad,
-                    'subtotal': lambda p=producto, c=cantidad: p.precio * c
-                }
-                items.append(type('CarritoItemSesion', (), item_data)())
-                subtotal += producto.precio * cantidad
-                total_items += cantidad
-            except Producto.DoesNotExist:
-                pass
-    
-    # Verificar cupón en sesión
-    descuento = Decimal('0')
-    cupon = None
-    cupon_codigo = request.session.get('cupon_codigo')
-    
-    if cupon_codigo:
-        try:
-            cupon = Cupon.objects.get(codigo=cupon_codigo)
-            if cupon.esta_vigente() and subtotal >= cupon.compra_minima:
-                descuento = subtotal * Decimal(cupon.descuento_porcentaje) / 100
-                if cupon.descuento_maximo and descuento > cupon.descuento_maximo:
-                    descuento = cupon.descuento_maximo
-        except Cupon.DoesNotExist:
-            del request.session['cupon_codigo']
-    
-    total_final = subtotal - descuento
+    # CarritoItem (autenticado) o items de sesión resueltos en una sola consulta (invitado)
+    items = carrito_service.obtener_items(request)
+    cotizacion = precios_service.cotizar(request, items=items)
     
     # Productos sugeridos
-    productos_en_carrito = [item.producto.id if hasattr(item, 'producto') else item.id for item in items]
+    productos_en_carrito = [item.producto.id for item in items]
     sugerencias = Producto.objects.filter(
         disponible=True, 
         stock__gt=0
@@ -187,11 +189,12 @@ def ver_carrito(request):
     
     return render(request, 'carrito.html', {
         'items': items,
-        'total': subtotal,
-        'total_items': total_items,
-        'cupon': cupon,
-        'descuento': descuento,
-        'total_final': total_final,
+        'total': cotizacion.subtotal,
+        'total_items': cotizacion.total_items,
+        'cupon': cotizacion.cupon,
+        'descuento': cotizacion.descuento,
+        'total_final': cotizacion.total,
+        'cotizacion': cotizacion,
         'sugerencias': sugerencias,
         'requiere_login': not request.user.is_authenticated
     })
@@ -310,10 +313,11 @@ def finalizar_compra(request):
             messages.error(request, f'No hay suficiente stock de {item.producto.nombre}')
             return redirect('ver_carrito')
     
-    # Procesar compra - restar stock
-    for item in items:
-        item.producto.stock -= item.cantidad
-        item.producto.save()
+    # Procesar compra - restar stock (un solo INSERT de movimientos en el kardex)
+    with kardex_service.lote(kardex_service.VENTA, 'Compra directa', request.user):
+        for item in items:
+            item.producto.stock -= item.cantidad
+            item.producto.save(update_fields=['stock'])
     
     # Limpiar carrito
     items.delete()
@@ -369,13 +373,13 @@ def crear_solicitud(request, producto_id):
 # Vista de mis solicitudes
 @login_required
 def mis_solicitudes(request):
-    solicitudes = Solicitud.objects.filter(cliente=request.user)
+    solicitudes = Solicitud.objects.filter(cliente=request.user).select_related('producto')
     return render(request, 'mis_solicitudes.html', {'solicitudes': solicitudes})
 
 # Vista de solicitudes admin
 @staff_member_required
 def ver_solicitudes_admin(request):
-    solicitudes = Solicitud.objects.all()
+    solicitudes = Solicitud.objects.select_related('cliente', 'producto')
     return render(request, 'admin/solicitudes_admin.html', {'solicitudes': solicitudes})
 
 # Vista de marcar solicitud como completada
@@ -386,8 +390,9 @@ def marcar_completada(request, solicitud_id):
     solicitud.save()
     
     # Aumentar stock del producto
-    solicitud.producto.stock += solicitud.cantidad
-    solicitud.producto.save()
+    with kardex_service.lote(kardex_service.ENTRADA, f'Solicitud #{solicitud.id}', request.user, agrupar=False):
+        solicitud.producto.stock += solicitud.cantidad
+        solicitud.producto.save(update_fields=['stock'])
     
     messages.success(request, f'Solicitud #{solicitud.id} completada y stock actualizado')
     return redirect('solicitudes_admin')
@@ -395,18 +400,12 @@ def marcar_completada(request, solicitud_id):
 # Vista de actualizar precios (simulación de mercado)
 @staff_member_required
 def importar_precios(request):
-    """Actualiza precios de productos con fluctuaciones de mercado realistas."""
-    productos = Producto.objects.filter(disponible=True)
-    count = 0
-    for prod in productos:
-        # Fluctuación aleatoria entre -5% y +5% (simula mercado real)
-        fluctuacion = Decimal(str(random.uniform(0.95, 1.05)))
-        nuevo_precio = prod.precio * fluctuacion
-        prod.precio = round(nuevo_precio, 2)
-        prod.save()
-        count += 1
-    messages.success(request, f'✅ Precios actualizados (fluctuación de mercado). {count} productos sincronizados.')
-    return redirect('panel_admin')
+    """Encola la actualización de precios con fluctuaciones de mercado realistas (?simular=1 solo calcula)."""
+    simular = bool(request.GET.get('simular'))
+    tarea = tareas_service.encolar('importar_precios', {'simular': simular}, usuario=request.user)
+    accion = 'Simulación' if simular else 'Actualización'
+    messages.info(request, f'⏳ {accion} de precios en cola (tarea #{tarea.id}). Puedes seguir su avance aquí.')
+    return redirect('admin_tareas')
 
 
 # Vista de importar productos desde APIs (DummyJSON + Pixabay)
@@ -428,28 +427,13 @@ def importar_pcpartpicker(request):
         categoria = request.POST.get('categoria', 'cpu')
         cantidad = int(request.POST.get('cantidad', 5))
         
-        try:
-            # Usar el nuevo servicio de hardware API
-            creados, actualizados = hardware_api_service.importar_productos_api(
-                Producto, 
-                Categoria,
-                tipo=categoria,
-                limite=cantidad
-            )
-            
-            if creados > 0 or actualizados > 0:
-                messages.success(
-                    request, 
-                    f'✅ Importación completada: {creados} nuevos productos, {actualizados} actualizados. '
-                    f'Imágenes obtenidas de Pixabay/DummyJSON.'
-                )
-            else:
-                messages.warning(request, '⚠️ No se importaron productos. Intenta con otra categoría.')
-                
-        except Exception as e:
-            messages.error(request, f'❌ Error al importar: {str(e)}')
-        
-        return redirect('panel_admin')
+        tarea = tareas_service.encolar(
+            'importar_pcpartpicker',
+            {'categoria': categoria, 'cantidad': cantidad},
+            usuario=request.user,
+        )
+        messages.info(request, f'⏳ Importación de {CATEGORIAS_DISPONIBLES.get(categoria, categoria)} en cola (tarea #{tarea.id}).')
+        return redirect('admin_tareas')
     
     # GET: Mostrar formulario
     return render(request, 'admin/importar_pcpartpicker.html', {
@@ -484,18 +468,21 @@ def buscar_pcpartpicker(request):
 
 
 # Vista del catalogo
+@validadores_service.condicional_catalogo(con_reservas=True)
 def catalogo(request):
-    productos = Producto.objects.filter(disponible=True)
+    productos = Producto.objects.filter(disponible=True).select_related('categoria')
     categorias = Categoria.objects.all()
     
     # Filtros básicos
     categoria_id = request.GET.get('categoria')
     busqueda = request.GET.get('q')
     
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
+    # Filtros normalizados (clave de caché de las facetas)
+    filtros = {'q': (busqueda or '').strip().lower(), 'precio_min': None, 'precio_max': None, 'precio_hasta': None,
+               'solo_stock': False}
+    
     if busqueda:
-        productos = productos.filter(nombre__icontains=busqueda)
+        productos = busqueda_service.filtrar_queryset(productos, busqueda)
     
     # Filtros de precio
     precio_min = request.GET.get('precio_min')
@@ -504,188 +491,254 @@ def catalogo(request):
     if precio_min:
         try:
             productos = productos.filter(precio__gte=Decimal(precio_min))
+            filtros['precio_min'] = str(Decimal(precio_min).normalize())
         except:
             pass
     if precio_max:
         try:
             productos = productos.filter(precio__lte=Decimal(precio_max))
+            filtros['precio_max'] = str(Decimal(precio_max).normalize())
+        except:
+            pass
+    # Tope exclusivo de los rangos del histograma: [mínimo, máximo) como en facetas_service
+    precio_hasta = request.GET.get('precio_hasta')
+    if precio_hasta:
+        try:
+            productos = productos.filter(precio__lt=Decimal(precio_hasta))
+            filtros['precio_hasta'] = str(Decimal(precio_hasta).normalize())
         except:
             pass
     
     # Solo con stock
     if request.GET.get('solo_stock'):
         productos = productos.filter(stock__gt=0)
+        filtros['solo_stock'] = True
     
-    # Ordenamiento
+    # Facetas del sidebar: se calculan sin el filtro de categoría (conteo de cada una)
+    try:
+        categoria_seleccionada = int(categoria_id) if categoria_id else None
+    except ValueError:
+        categoria_seleccionada = None
+    facetas = facetas_service.calcular_facetas(productos, filtros, categoria_seleccionada)
+    for cat in categorias:
+        cat.num_productos = facetas['categorias'].get(cat.id, 0)
+    
+    if categoria_seleccionada is not None:
+        productos = productos.filter(categoria_id=categoria_seleccionada)
+    
+    # Ordenamiento y paginación por cursor (precio_asc, precio_desc, nombre o más recientes)
     orden = request.GET.get('orden')
-    if orden == 'precio_asc':
-        productos = productos.order_by('precio')
-    elif orden == 'precio_desc':
-        productos = productos.order_by('-precio')
-    elif orden == 'nombre':
-        productos = productos.order_by('nombre')
-    else:
-        productos = productos.order_by('-fecha_creacion')
+    pagina = paginacion_service.paginar_keyset(productos, orden=orden, cursor=request.GET.get('cursor'))
+    reservas_service.anotar_disponible(pagina.items)
+    historial_precios_service.anotar_tendencia(pagina.items)
     
     return render(request, 'catalogo.html', {
-        'productos': productos,
+        'productos': pagina,
+        'pagina': pagina,
         'categorias': categorias,
         'categoria_actual': categoria_id,
-        'busqueda': busqueda
+        'busqueda': busqueda,
+        'facetas': facetas
     })
 
-# Vista de gestion de stock
+# Vista de gestion de stock (grilla masiva, CSV y filtros)
 @staff_member_required
 def gestion_stock(request):
-    productos = Producto.objects.all().order_by('stock')
-    return render(request, 'admin/gestion_stock.html', {'productos': productos})
+    if request.method == 'POST':
+        try:
+            if request.FILES.get('archivo'):
+                cambios = inventario_service.leer_csv(request.FILES['archivo'])
+                referencia = f'CSV {request.FILES["archivo"].name}'
+            else:
+                cambios = inventario_service.leer_grilla(request.POST)
+                referencia = 'Grilla de stock'
+            actualizados = inventario_service.aplicar_cambios(cambios, usuario=request.user, referencia=referencia)
+        except inventario_service.ErrorInventario as error:
+            for mensaje in error.errores[:10]:
+                messages.error(request, f'❌ {mensaje}')
+            if len(error.errores) > 10:
+                messages.error(request, f'❌ ... y {len(error.errores) - 10} errores más. No se aplicó ningún cambio.')
+        else:
+            if actualizados:
+                messages.success(request, f'✅ Stock actualizado en {len(actualizados)} productos')
+                request.session['stock_cambios'] = actualizados  # Se muestran una vez en la siguiente visita
+            else:
+                messages.info(request, 'No había cambios de stock para aplicar')
+        return redirect(request.get_full_path())
+
+    categoria = request.GET.get('categoria', '')
+    umbral = request.GET.get('umbral', '')
+    productos = inventario_service.filtrar(Producto.objects.select_related('categoria'), categoria, umbral)
+    # Página por cursor sobre el índice (stock, id): menos stock primero
+    pagina = paginacion_service.paginar_keyset(
+        productos, cursor=request.GET.get('cursor'), por_pagina=50, orden_fijo=('stock', False)
+    )
+    return render(request, 'admin/gestion_stock.html', {
+        'productos': pagina,
+        'resumen': inventario_service.resumen(productos),
+        'categorias': Categoria.objects.order_by('nombre'),
+        'categoria_filtro': categoria,
+        'umbral': umbral,
+        'umbral_bajo': inventario_service.UMBRAL_BAJO_STOCK,
+        'cambios': request.session.pop('stock_cambios', None),
+    })
 
-# Vista de actualizar stock
+# Vista de actualizar stock (un producto)
 @staff_member_required
 def actualizar_stock(request, producto_id):
     if request.method == 'POST':
-        producto = Producto.objects.get(id=producto_id)
-        nuevo_stock = int(request.POST.get('stock', 0))
-        producto.stock = nuevo_stock
-        producto.save()
-        messages.success(request, f'Stock de {producto.nombre} actualizado a {nuevo_stock}')
+        try:
+            nuevo_stock = int(request.POST.get('stock', 0))
+        except ValueError:
+            messages.error(request, '❌ El stock debe ser un número entero mayor o igual a 0')
+            return redirect('gestion_stock')
+        try:
+            cambios = inventario_service.aplicar_cambios([
+                inventario_service.CambioStock(producto_id, inventario_service.FIJAR, nuevo_stock)
+            ], usuario=request.user, referencia='Gestión de stock')
+        except inventario_service.ErrorInventario as error:
+            messages.error(request, f'❌ {error}')  # Producto inexistente, stock negativo...
+        else:
+            if cambios:
+                messages.success(request, f'Stock de {cambios[0]["nombre"]} actualizado a {nuevo_stock}')
     return redirect('gestion_stock')
 
+# API de stock masivo: GET lista paginada, POST aplica cambios
+@staff_member_required
+def stock_masivo_api(request):
+    if request.method == 'POST':
+        try:
+            datos = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'errores': ['JSON inválido']}, status=400)
+        try:
+            actualizados = inventario_service.aplicar_cambios(
+                inventario_service.leer_json(datos), usuario=request.user, referencia='API de stock'
+            )
+        except inventario_service.ErrorInventario as error:
+            return JsonResponse({'errores': error.errores}, status=400)
+        return JsonResponse({'actualizados': actualizados})
+
+    productos = inventario_service.filtrar(
+        Producto.objects.only('id', 'nombre', 'categoria_id', 'stock'), request.GET.get('categoria'), request.GET.get('umbral')
+    )
+    pagina = paginacion_service.paginar_keyset(
+        productos, cursor=request.GET.get('cursor'), por_pagina=200, orden_fijo=('stock', False)
+    )
+    return JsonResponse({
+        'productos': [
+            {'id': p.id, 'nombre': p.nombre, 'categoria_id': p.categoria_id, 'stock': p.stock} for p in pagina
+        ],
+        'cursor_siguiente': pagina.cursor_siguiente,
+    })
+
+# Vista del kardex de un producto (movimientos con saldo entre dos fechas)
+@staff_member_required
+def kardex_producto(request, producto_id):
+    producto = get_object_or_404(Producto.objects.select_related('categoria'), id=producto_id)
+    hasta = _parsear_momento(request.GET.get('hasta', ''))
+    desde = _parsear_momento(request.GET.get('desde', ''))
+    if hasta is None:
+        hasta = timezone.now()
+    elif parse_date(request.GET['hasta']):
+        hasta += timedelta(days=1) - timedelta(microseconds=1)  # Fecha sola: incluye el día completo
+    if desde is None:
+        desde = hasta - timedelta(days=30)
+    return render(request, 'admin/kardex.html', {
+        'producto': producto,
+        'kardex': kardex_service.kardex(producto.id, desde, hasta),
+        'desde': timezone.localtime(desde),
+        'hasta': timezone.localtime(hasta),
+    })
+
 # Vista del panel admin
 @staff_member_required  
 def panel_admin(request):
     from django.db.models import Sum
     
-    total_productos = Producto.objects.count()
-    productos_agotados = Producto.objects.filter(stock=0).count()
-    solicitudes_pendientes = Solicitud.objects.filter(estado='pendiente').count()
+    metricas = dashboard_service.obtener_metricas()
     total_ventas = CarritoItem.objects.aggregate(Sum('cantidad'))['cantidad__sum'] or 0
     
     return render(request, 'admin/panel_admin.html', {
-        'total_productos': total_productos,
-        'productos_agotados': productos_agotados,
-        'solicitudes_pendientes': solicitudes_pendientes,
+        'total_productos': metricas['total_productos'],
+        'productos_agotados': metricas['productos_agotados'],
+        'solicitudes_pendientes': metricas['solicitudes_pendientes'],
         'total_ventas': total_ventas
     })
 
 # Vista para cargar productos desde JSON fixture
 @staff_member_required
 def cargar_productos_demo(request):
-    import json
-    import os
-    
-    # Ruta del fixture JSON
-    fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'productos_hardware.json')
-    
-    try:
-        # Intentar cargar desde fixture JSON
-        if os.path.exists(fixture_path):
-            with open(fixture_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            categorias_count = 0
-            productos_count = 0
-            
-            # Procesar categorías primero
-            for item in data:
-                if item['model'] == 'gestion.categoria':
-                    Categoria.objects.update_or_create(
-                        pk=item['pk'],
-                        defaults=item['fields']
-                    )
-                    categorias_count += 1
-            
-            # Luego procesar productos
-            for item in data:
-                if item['model'] == 'gestion.producto':
-                    fields = item['fields'].copy()
-                    categoria_id = fields.pop('categoria')
-                    fields['categoria'] = Categoria.objects.get(pk=categoria_id)
-                    if fields.get('proveedor') is None:
-                        fields['proveedor'] = None
-                    
-                    Producto.objects.update_or_create(
-                        pk=item['pk'],
-                        defaults=fields
-                    )
-                    productos_count += 1
-            
-            messages.success(request, f'✅ Cargados desde JSON: {categorias_count} categorías y {productos_count} productos')
-        else:
-            # Si no existe el JSON, crear datos por defecto
-            cat_gpu, _ = Categoria.objects.get_or_create(nombre='Tarjetas Gráficas', defaults={'descripcion': 'GPUs de alto rendimiento'})
-            cat_cpu, _ = Categoria.objects.get_or_create(nombre='Procesadores', defaults={'descripcion': 'CPUs Intel y AMD'})
-            cat_ram, _ = Categoria.objects.get_or_create(nombre='Memoria RAM', defaults={'descripcion': 'Módulos DDR4 y DDR5'})
-            cat_ssd, _ = Categoria.objects.get_or_create(nombre='Almacenamiento', defaults={'descripcion': 'SSD y HDD'})
-            cat_kit, _ = Categoria.objects.get_or_create(nombre='Kits', defaults={'descripcion': 'Combos de actualización'})
-            cat_pc, _ = Categoria.objects.get_or_create(nombre='PCs Armadas', defaults={'descripcion': 'Equipos listos para usar'})
-            
-            productos_hardware = [
-                {'nombre': 'NVIDIA RTX 4090 24GB', 'precio': 1599.99, 'stock': 5, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
-                {'nombre': 'NVIDIA RTX 4070 Ti 12GB', 'precio': 799.99, 'stock': 8, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
-                {'nombre': 'AMD Radeon RX 7900 XTX', 'precio': 999.99, 'stock': 3, 'categoria': cat_gpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1591488320449-011701bb6704?w=400'},
-                {'nombre': 'Intel Core i9-14900K', 'precio': 589.99, 'stock': 10, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
-                {'nombre': 'Intel Core i7-14700K', 'precio': 409.99, 'stock': 12, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
-                {'nombre': 'AMD Ryzen 9 7950X3D', 'precio': 699.99, 'stock': 4, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
-                {'nombre': 'AMD Ryzen 7 7800X3D', 'precio': 449.99, 'stock': 7, 'categoria': cat_cpu, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1555618568-9b1686616012?w=400'},
-                {'nombre': 'Corsair Vengeance DDR5 32GB', 'precio': 149.99, 'stock': 20, 'categoria': cat_ram, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1562976540-1502c2145186?w=400'},
-                {'nombre': 'G.Skill Trident Z5 64GB DDR5', 'precio': 299.99, 'stock': 6, 'categoria': cat_ram, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1562976540-1502c2145186?w=400'},
-                {'nombre': 'Samsung 990 Pro 2TB NVMe', 'precio': 179.99, 'stock': 15, 'categoria': cat_ssd, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1597872200969-2b65d56bd16b?w=400'},
-                {'nombre': 'WD Black SN850X 1TB', 'precio': 89.99, 'stock': 25, 'categoria': cat_ssd, 'tipo': 'componente', 'imagen_url': 'https://images.unsplash.com/photo-1597872200969-2b65d56bd16b?w=400'},
-                {'nombre': 'Kit Gamer AMD Ryzen 7 + B650', 'precio': 699.99, 'stock': 3, 'categoria': cat_kit, 'tipo': 'kit', 'imagen_url': 'https://images.unsplash.com/photo-1587202372775-e229f172b9d7?w=400'},
-                {'nombre': 'Kit Intel i5 + Z790 + 32GB', 'precio': 849.99, 'stock': 0, 'categoria': cat_kit, 'tipo': 'kit', 'imagen_url': 'https://images.unsplash.com/photo-1587202372775-e229f172b9d7?w=400'},
-                {'nombre': 'PC Gamer BitForge TITAN', 'precio': 2499.99, 'stock': 2, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
-                {'nombre': 'PC Gamer BitForge PHOENIX', 'precio': 1799.99, 'stock': 4, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
-                {'nombre': 'PC Workstation BitForge PRO', 'precio': 3299.99, 'stock': 1, 'categoria': cat_pc, 'tipo': 'pc_armada', 'imagen_url': 'https://images.unsplash.com/photo-1593640408182-31c70c8268f5?w=400'},
-            ]
-            
-            count = 0
-            for p in productos_hardware:
-                Producto.objects.update_or_create(
-                    nombre=p['nombre'],
-                    defaults={
-                        'descripcion': f"Hardware de alto rendimiento - {p['categoria'].nombre}",
-                        'precio': p['precio'],
-                        'stock': p['stock'],
-                        'categoria': p['categoria'],
-                        'tipo': p['tipo'],
-                        'imagen_url': p['imagen_url'],
-                        'disponible': True
-                    }
-                )
-                count += 1
-            
-            messages.success(request, f'✅ {count} productos de hardware cargados correctamente')
-    except Exception as e:
-        messages.error(request, f'Error al cargar productos: {str(e)}')
-    
-    return redirect('panel_admin')
+    tarea = tareas_service.encolar('cargar_productos_demo', usuario=request.user)
+    messages.info(request, f'⏳ Carga de productos demo en cola (tarea #{tarea.id}).')
+    return redirect('admin_tareas')
 
 
 # Vista para limpiar productos basura
 @staff_member_required
 def limpiar_productos(request):
-    # Categorías permitidas (Hardware real)
-    categorias_permitidas = [
-        'Tarjetas Gráficas', 'Procesadores', 'Memoria RAM', 
-        'Almacenamiento', 'Kits', 'PCs Armadas'
-    ]
-    
-    # Eliminar productos que no sean de estas categorías
+    tarea = tareas_service.encolar('limpiar_productos', usuario=request.user)
+    messages.info(request, f'⏳ Limpieza de productos en cola (tarea #{tarea.id}).')
+    return redirect('admin_tareas')
+
+
+# Vista de tareas en segundo plano (staff)
+@staff_member_required
+def admin_tareas(request):
+    tareas = Tarea.objects.select_related('creada_por')[:50]
+    return render(request, 'admin/tareas.html', {
+        'tareas': tareas,
+        'reportes': list(reportes_service.REPORTES),
+        'formatos': reportes_service.formatos_disponibles(),
+        'hay_activas': any(t.estado in ('pendiente', 'en_proceso') for t in tareas),
+    })
+
+
+# Estado de una tarea en JSON (para la barra de progreso)
+@staff_member_required
+def estado_tarea(request, tarea_id):
+    tarea = get_object_or_404(Tarea, id=tarea_id)
+    return JsonResponse({
+        'id': tarea.id,
+        'tipo': tarea.tipo,
+        'estado': tarea.estado,
+        'estado_display': tarea.get_estado_display(),
+        'progreso': tarea.progreso,
+        'mensaje': tarea.mensaje,
+        'intentos': tarea.intentos,
+        'resultado': tarea.resultado,
+        'descarga': reverse('descargar_exportacion', args=[tarea.id])
+        if tarea.tipo == 'exportar_reporte' and tarea.estado == 'completada' else None,
+    })
+
+
+# Exportación de un reporte en segundo plano (archivo comprimido o columnar)
+@staff_member_required
+def admin_exportar_fondo(request):
+    if request.method != 'POST':
+        return redirect('admin_tareas')
     try:
-        # Borrar productos de categorías no permitidas
-        productos_basura = Producto.objects.exclude(categoria__nombre__in=categorias_permitidas)
-        count = productos_basura.count()
-        productos_basura.delete()
-        
-        # Eliminar categorías vacías o basura
-        Categoria.objects.exclude(nombre__in=categorias_permitidas).delete()
-        
-        messages.success(request, f'🗑️ {count} productos incorrectos eliminados. Base de datos limpia.')
-    except Exception as e:
-        messages.error(request, f'Error al limpiar: {str(e)}')
-    
-    return redirect('panel_admin')
+        tarea, nueva = reportes_service.solicitar_exportacion(
+            request.POST.get('tipo', 'pedidos'), request.POST.get('formato', 'csv.gz'), usuario=request.user
+        )
+    except ValueError as error:
+        messages.error(request, f'❌ {error}')
+        return redirect('admin_tareas')
+    if nueva:
+        messages.info(request, f'⏳ Exportación en cola (tarea #{tarea.id}).')
+    else:
+        messages.info(request, f'♻️ Ya hay una exportación igual en curso (tarea #{tarea.id}).')
+    return redirect('admin_tareas')
+
+
+# Descarga del archivo de una exportación terminada
+@staff_member_required
+def descargar_exportacion(request, tarea_id):
+    tarea = get_object_or_404(Tarea, id=tarea_id)
+    ruta = reportes_service.ruta_descarga(tarea)
+    if ruta is None:
+        raise Http404('La exportación no existe o ya fue reemplazada')
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=ruta.name)
 
 
 # ============================================
@@ -695,29 +748,24 @@ def limpiar_productos(request):
 # Vista de Checkout
 @login_required
 def checkout(request):
-    items = CarritoItem.objects.filter(usuario=request.user)
+    items = CarritoItem.objects.filter(usuario=request.user).select_related('producto')
     
     if not items.exists():
         messages.warning(request, 'Tu carrito está vacío')
         return redirect('ver_carrito')
     
-    subtotal = sum(item.subtotal() for item in items)
-    descuento = Decimal('0')
-    cupon = None
-    
-    # Verificar si hay cupón en sesión
-    cupon_codigo = request.session.get('cupon_codigo')
-    if cupon_codigo:
-        try:
-            cupon = Cupon.objects.get(codigo=cupon_codigo)
-            if cupon.esta_vigente() and subtotal >= cupon.compra_minima:
-                descuento = subtotal * Decimal(cupon.descuento_porcentaje) / 100
-                if cupon.descuento_maximo and descuento > cupon.descuento_maximo:
-                    descuento = cupon.descuento_maximo
-        except Cupon.DoesNotExist:
-            del request.session['cupon_codigo']
+    # Reservar las unidades mientras el cliente completa el pago
+    reserva_expira, faltantes, agotados = reservas_service.reservar_carrito(request.user, items)
+    if agotados:
+        nombres = ', '.join(p.nombre for p in agotados)
+        messages.warning(request, f'❌ No hay stock suficiente de: {nombres}')
+    if faltantes:
+        nombres = ', '.join(p.nombre for p in faltantes)
+        messages.warning(request, f'⏳ Otros clientes están comprando las últimas unidades de: {nombres}')
+    if agotados or faltantes:
+        return redirect('ver_carrito')
     
-    total = subtotal - descuento
+    cotizacion = precios_service.cotizar(request)
     
     # Obtener perfil del usuario si existe
     try:
@@ -727,10 +775,13 @@ def checkout(request):
     
     return render(request, 'checkout.html', {
         'items': items,
-        'subtotal': subtotal,
-        'descuento': descuento,
-        'cupon': cupon,
-        'total': total,
+        'subtotal': cotizacion.subtotal,
+        'descuento': cotizacion.descuento,
+        'cupon': cotizacion.cupon,
+        'total': cotizacion.total,
+        'cotizacion': cotizacion,
+        'reserva_expira': reserva_expira,
+        'clave_idempotencia': uuid.uuid4().hex,
         'perfil': perfil
     })
 
@@ -741,76 +792,38 @@ def procesar_pago(request):
     if request.method != 'POST':
         return redirect('checkout')
     
-    items = CarritoItem.objects.filter(usuario=request.user)
-    if not items.exists():
-        messages.error(request, 'Tu carrito está vacío')
-        return redirect('ver_carrito')
+    # Reintento o doble clic: el pedido de esta clave ya existe, no se vuelve a procesar
+    clave = request.POST.get('clave_idempotencia', '')[:64]
+    pedido_id = checkout_service.pedido_de_clave(request.user, clave)
+    if pedido_id:
+        return redirect('confirmacion_pedido', pedido_id=pedido_id)
     
     # Obtener datos del formulario
-    nombre = request.POST.get('nombre_completo', '')
-    telefono = request.POST.get('telefono', '')
-    direccion = request.POST.get('direccion', '')
-    ciudad = request.POST.get('ciudad', '')
-    notas = request.POST.get('notas', '')
+    datos_envio = {
+        'nombre_completo': request.POST.get('nombre_completo', ''),
+        'telefono': request.POST.get('telefono', ''),
+        'direccion': request.POST.get('direccion', ''),
+        'ciudad': request.POST.get('ciudad', ''),
+        'notas': request.POST.get('notas', ''),
+    }
     
     # Validar campos requeridos
-    if not all([nombre, telefono, direccion, ciudad]):
+    if not all(datos_envio[campo] for campo in ('nombre_completo', 'telefono', 'direccion', 'ciudad')):
         messages.error(request, 'Por favor completa todos los campos requeridos')
         return redirect('checkout')
     
-    # Calcular totales
-    subtotal = sum(item.subtotal() for item in items)
-    descuento = Decimal('0')
-    cupon = None
-    
-    cupon_codigo = request.session.get('cupon_codigo')
-    if cupon_codigo:
-        try:
-            cupon = Cupon.objects.get(codigo=cupon_codigo)
-            if cupon.esta_vigente():
-                descuento = subtotal * Decimal(cupon.descuento_porcentaje) / 100
-                if cupon.descuento_maximo and descuento > cupon.descuento_maximo:
-                    descuento = cupon.descuento_maximo
-                cupon.usos_actuales += 1
-                cupon.save()
-        except Cupon.DoesNotExist:
-            pass
-    
-    total = subtotal - descuento
-    
-    # Validar stock antes de crear pedido
-    for item in items:
-        if item.producto.stock < item.cantidad:
-            messages.error(request, f'No hay suficiente stock de {item.producto.nombre}')
-            return redirect('checkout')
-    
-    # Crear pedido
-    pedido = Pedido.objects.create(
-        usuario=request.user,
-        total=total,
-        nombre_completo=nombre,
-        telefono=telefono,
-        direccion=direccion,
-        ciudad=ciudad,
-        notas=notas,
-        cupon_aplicado=cupon,
-        descuento_aplicado=descuento
-    )
-    
-    # Crear items del pedido y descontar stock
-    for item in items:
-        PedidoItem.objects.create(
-            pedido=pedido,
-            producto=item.producto,
-            nombre_producto=item.producto.nombre,
-            cantidad=item.cantidad,
-            precio_unitario=item.producto.precio
+    # Pedido en una sola transacción: stock, cupón, items y carrito (todo o nada)
+    try:
+        pedido = checkout_service.procesar_pedido(
+            request.user, datos_envio, cupon=precios_service.resolver_cupon(request), clave=clave
         )
-        item.producto.stock -= item.cantidad
-        item.producto.save()
+    except checkout_service.ErrorCheckout as error:
+        messages.error(request, str(error))
+        if not CarritoItem.objects.filter(usuario=request.user).exists():
+            return redirect('ver_carrito')
+        return redirect('checkout')
     
-    # Limpiar carrito y cupón de sesión
-    items.delete()
+    # Limpiar cupón de sesión
     if 'cupon_codigo' in request.session:
         del request.session['cupon_codigo']
     
@@ -828,14 +841,22 @@ def confirmacion_pedido(request, pedido_id):
 # Vista de Mis Pedidos
 @login_required
 def mis_pedidos(request):
-    pedidos = Pedido.objects.filter(usuario=request.user)
+    # Paginado por cursor sobre el índice (usuario, fecha_pedido, id)
+    pedidos = paginacion_service.paginar_keyset(
+        Pedido.objects.filter(usuario=request.user),
+        cursor=request.GET.get('cursor'),
+        por_pagina=20,
+        orden_fijo=('fecha_pedido', True),
+    )
     return render(request, 'mis_pedidos.html', {'pedidos': pedidos})
 
 
 # Vista de Detalle de Pedido
 @login_required
 def detalle_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id, usuario=request.user)
+    pedido = get_object_or_404(
+        Pedido.objects.prefetch_related('items__producto'), id=pedido_id, usuario=request.user
+    )
     return render(request, 'detalle_pedido.html', {'pedido': pedido})
 
 
@@ -1019,7 +1040,7 @@ def suscribir_newsletter(request):
 # Vista de Comparar Productos
 @login_required
 def comparar_productos(request):
-    comparados = ProductoComparado.objects.filter(usuario=request.user).select_related('producto')
+    comparados = ProductoComparado.objects.filter(usuario=request.user).select_related('producto__categoria', 'producto__proveedor')
     productos = [c.producto for c in comparados]
     
     return render(request, 'comparar.html', {'productos': productos})
@@ -1073,13 +1094,20 @@ def limpiar_comparar(request):
 @staff_member_required
 def admin_pedidos(request):
     estado_filtro = request.GET.get('estado', '')
-    pedidos = Pedido.objects.all()
+    if estado_filtro not in pedidos_service.TRANSICIONES:
+        estado_filtro = ''
+    pedidos = Pedido.objects.select_related('usuario')
     
     if estado_filtro:
         pedidos = pedidos.filter(estado=estado_filtro)
     
+    # Página por cursor (índice estado/fecha_pedido/id) y total cacheado: no recorre la tabla
+    pagina = paginacion_service.paginar_keyset(
+        pedidos, cursor=request.GET.get('cursor'), por_pagina=50, orden_fijo=('fecha_pedido', True)
+    )
     return render(request, 'admin/gestionar_pedidos.html', {
-        'pedidos': pedidos,
+        'pedidos': pagina,
+        'total_pedidos': paginacion_service.contar_cacheado(pedidos, f'pedidos:{estado_filtro or "todos"}'),
         'estado_filtro': estado_filtro
     })
 
@@ -1088,12 +1116,47 @@ def admin_pedidos(request):
 @staff_member_required
 def admin_actualizar_pedido(request, pedido_id):
     if request.method == 'POST':
-        pedido = get_object_or_404(Pedido, id=pedido_id)
         nuevo_estado = request.POST.get('estado')
-        if nuevo_estado:
-            pedido.estado = nuevo_estado
-            pedido.save()
-            messages.success(request, f'Pedido #{pedido.numero_pedido} actualizado a {pedido.get_estado_display()}')
+        if nuevo_estado in pedidos_service.TRANSICIONES:
+            resultado, = pedidos_service.cambiar_estado([pedido_id], nuevo_estado)
+            if resultado.resultado == pedidos_service.NO_EXISTE:
+                raise Http404('Pedido no encontrado')
+            if resultado.ok:
+                estado = dict(Pedido.ESTADO_CHOICES)[nuevo_estado]
+                messages.success(request, f'Pedido #{resultado.numero_pedido} actualizado a {estado}')
+            else:
+                messages.warning(request, f'⚠️ Pedido #{resultado.numero_pedido}: {resultado.descripcion}')
+    return redirect('admin_pedidos')
+
+
+# Vista Admin - Cambio de estado masivo de pedidos
+@staff_member_required
+def admin_pedidos_estado_masivo(request):
+    if request.method == 'POST':
+        nuevo_estado = request.POST.get('estado')
+        pedido_ids = [pid for pid in request.POST.getlist('pedidos') if pid.isdigit()]
+        if nuevo_estado not in pedidos_service.TRANSICIONES:
+            messages.error(request, '❌ Selecciona un estado válido')
+        elif not pedido_ids:
+            messages.warning(request, '⚠️ No seleccionaste ningún pedido')
+        else:
+            resultados = pedidos_service.cambiar_estado(pedido_ids, nuevo_estado)
+            actualizados = sum(1 for r in resultados if r.ok)
+            fallidos = [r for r in resultados if not r.ok]
+            estado = dict(Pedido.ESTADO_CHOICES)[nuevo_estado]
+            if actualizados:
+                messages.success(request, f'✅ {actualizados} pedidos actualizados a {estado}')
+            if fallidos:
+                detalle = ', '.join(
+                    f'#{r.numero_pedido or r.pedido_id} ({r.descripcion})' for r in fallidos[:20]
+                )
+                if len(fallidos) > 20:
+                    detalle += f' y {len(fallidos) - 20} más'
+                messages.warning(request, f'⚠️ {len(fallidos)} pedidos sin cambiar: {detalle}')
+    # Volver a la lista con el mismo filtro de estado
+    filtro = request.POST.get('estado_filtro', '')
+    if filtro in pedidos_service.TRANSICIONES:
+        return redirect(f"{reverse('admin_pedidos')}?estado={filtro}")
     return redirect('admin_pedidos')
 
 
@@ -1135,79 +1198,79 @@ def admin_toggle_cupon(request, cupon_id):
 # Vista Admin - Dashboard Mejorado
 @staff_member_required  
 def panel_admin_mejorado(request):
-    from django.db.models import Sum
-    from datetime import timedelta
-    
-    hoy = timezone.now().date()
-    hace_7_dias = hoy - timedelta(days=7)
-    hace_30_dias = hoy - timedelta(days=30)
-    
-    # Estadísticas generales
-    total_productos = Producto.objects.count()
-    productos_agotados = Producto.objects.filter(stock=0).count()
-    productos_bajo_stock = Producto.objects.filter(stock__gt=0, stock__lte=3).count()
-    solicitudes_pendientes = Solicitud.objects.filter(estado='pendiente').count()
-    
-    # Estadísticas de pedidos
-    total_pedidos = Pedido.objects.count()
-    pedidos_pendientes = Pedido.objects.filter(estado='pendiente').count()
-    pedidos_hoy = Pedido.objects.filter(fecha_pedido__date=hoy).count()
-    
-    # Ventas
-    ventas_totales = Pedido.objects.aggregate(total=Sum('total'))['total'] or 0
-    ventas_mes = Pedido.objects.filter(fecha_pedido__date__gte=hace_30_dias).aggregate(total=Sum('total'))['total'] or 0
-    
-    # Últimos pedidos
-    ultimos_pedidos = Pedido.objects.all()[:5]
-    
-    # Productos más vendidos
-    productos_vendidos = PedidoItem.objects.values('nombre_producto').annotate(
-        total_vendido=Sum('cantidad')
-    ).order_by('-total_vendido')[:5]
-    
-    # Suscriptores newsletter
-    suscriptores = SuscripcionNewsletter.objects.filter(activo=True).count()
-    
-    return render(request, 'admin/panel_admin.html', {
-        'total_productos': total_productos,
-        'productos_agotados': productos_agotados,
-        'productos_bajo_stock': productos_bajo_stock,
-        'solicitudes_pendientes': solicitudes_pendientes,
-        'total_pedidos': total_pedidos,
-        'pedidos_pendientes': pedidos_pendientes,
-        'pedidos_hoy': pedidos_hoy,
-        'ventas_totales': ventas_totales,
-        'ventas_mes': ventas_mes,
-        'ultimos_pedidos': ultimos_pedidos,
-        'productos_vendidos': productos_vendidos,
-        'suscriptores': suscriptores
-    })
+    # Foto de métricas en caché (agregación condicional, se invalida con pedidos y stock)
+    return render(request, 'admin/panel_admin.html', dashboard_service.obtener_metricas())
+
+
+def _parsear_momento(valor):
+    """Fecha (AAAA-MM-DD, medianoche local) o fecha y hora ISO; None si no es válida"""
+    momento = parse_datetime(valor)
+    if momento is None:
+        fecha = parse_date(valor)
+        if fecha is None:
+            return None
+        return ventas_service.inicio_del_dia(fecha)
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+# API de series de ventas para las gráficas (supervisores y administradores)
+@staff_member_required
+def serie_ventas(request):
+    try:
+        perfil = request.user.perfil
+    except PerfilUsuario.DoesNotExist:
+        perfil = None
+    if not request.user.is_superuser and (perfil is None or not perfil.puede_ver_graficas()):
+        return JsonResponse({'error': 'No tienes permiso para ver las gráficas'}, status=403)
+
+    ahora = timezone.now()
+    try:
+        hasta = _parsear_momento(request.GET['hasta']) if request.GET.get('hasta') else ahora
+        if hasta is None:
+            raise series_service.ErrorSerie('Fechas inválidas: usa AAAA-MM-DD o AAAA-MM-DDTHH:MM')
+        desde = _parsear_momento(request.GET['desde']) if request.GET.get('desde') else hasta - timedelta(days=30)
+        if desde is None:
+            raise series_service.ErrorSerie('Fechas inválidas: usa AAAA-MM-DD o AAAA-MM-DDTHH:MM')
+        max_puntos = int(request.GET.get('max_puntos', series_service.MAX_PUNTOS))
+        serie = series_service.serie_ventas(
+            desde, hasta, request.GET.get('granularidad', 'dia'), max_puntos=max_puntos
+        )
+    except series_service.ErrorSerie as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except ValueError:
+        return JsonResponse({'error': 'max_puntos debe ser un número'}, status=400)
+    return JsonResponse(serie)
 
 
 # ============== NUEVAS VISTAS UI ENHANCEMENT ==============
 
 # Vista AJAX para búsqueda en vivo
+@validadores_service.condicional_catalogo(por_usuario=False)
 def busqueda_ajax(request):
     query = request.GET.get('q', '')
     productos = []
     
     if query and len(query) >= 2:
-        resultado = Producto.objects.filter(
-            Q(nombre__icontains=query) | Q(descripcion__icontains=query),
-            disponible=True
-        )[:10]
+        # Primero el índice en memoria del worker (sin consultas a la BD)
+        productos = autocompletado_service.buscar(query, limite=10)
         
-        productos = [{
-            'id': p.id,
-            'nombre': p.nombre,
-            'precio': str(p.precio),
-            'imagen': p.imagen_url or ''
-        } for p in resultado]
+        if productos is None:
+            # Índice desactivado por memoria: resultados por relevancia desde el índice full-text
+            resultado = busqueda_service.buscar_productos(query, limite=10)
+            productos = [{
+                'id': p.id,
+                'nombre': p.nombre,
+                'precio': str(p.precio),
+                'imagen': p.imagen_url or ''
+            } for p in resultado]
     
     return JsonResponse({'productos': productos})
 
 
 # Vista de detalle de producto mejorada
+@validadores_service.condicional_catalogo(con_reservas=True)
 def detalle_producto(request, producto_id):
     producto = get_object_or_404(Producto, id=producto_id)
     
@@ -1217,8 +1280,13 @@ def detalle_producto(request, producto_id):
         disponible=True
     ).exclude(id=producto.id)[:4]
     
+    # Stock disponible (descontando reservas de otros clientes)
+    relacionados = list(relacionados)
+    reservas_service.anotar_disponible([producto] + relacionados)
+    historial_precios_service.anotar_tendencia([producto])
+    
     # Reseñas del producto
-    resenas = Resena.objects.filter(producto=producto).order_by('-fecha')
+    resenas = Resena.objects.filter(producto=producto).select_related('usuario').order_by('-fecha')
     
     return render(request, 'detalle_producto.html', {
         'producto': producto,
@@ -1227,13 +1295,49 @@ def detalle_producto(request, producto_id):
     })
 
 
+# API de historial de precios: precio en una fecha (?momento=) o series (?desde=&hasta=)
+def historial_precios_api(request):
+    try:
+        ids = [int(pid) for pid in request.GET.get('ids', '').split(',') if pid.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'ids debe ser una lista de números separados por coma'}, status=400)
+    if not ids:
+        return JsonResponse({'error': 'Indica los productos con ids=1,2,3'}, status=400)
+    if len(ids) > historial_precios_service.MAX_PRODUCTOS:
+        return JsonResponse({'error': f'Máximo {historial_precios_service.MAX_PRODUCTOS} productos'}, status=400)
+
+    if 'momento' in request.GET:
+        momento = _parsear_momento(request.GET['momento'])
+        if momento is None:
+            return JsonResponse({'error': 'momento inválido (AAAA-MM-DD o fecha y hora ISO)'}, status=400)
+        precios = historial_precios_service.precio_en(ids, momento)
+        return JsonResponse({'momento': momento.isoformat(), 'precios': {pid: str(p) for pid, p in precios.items()}})
+
+    ahora = timezone.now()
+    desde = _parsear_momento(request.GET.get('desde', '')) or ahora - timedelta(days=90)
+    hasta = _parsear_momento(request.GET.get('hasta', '')) or ahora
+    if hasta <= desde:
+        return JsonResponse({'error': 'El rango está vacío: "hasta" debe ser posterior a "desde"'}, status=400)
+    series = historial_precios_service.series(ids, desde, hasta)
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'series': {
+            pid: {'t': [fecha.isoformat() for fecha, _ in puntos], 'precio': [str(precio) for _, precio in puntos]}
+            for pid, puntos in series.items()
+        },
+    })
+
+
 # Página de ofertas (productos con bajo stock)
+@validadores_service.condicional_catalogo(con_reservas=True)
 def ofertas(request):
     productos = Producto.objects.filter(
         disponible=True,
         stock__gt=0,
         stock__lte=5
     ).order_by('stock')[:12]
+    productos = reservas_service.anotar_disponible(productos)
     
     return render(request, 'ofertas.html', {'productos': productos})
 
@@ -1291,47 +1395,13 @@ def admin_clientes(request):
 # Vista de exportación de reportes (Admin)
 @staff_member_required
 def admin_exportar_reporte(request):
-    import csv
-    from django.http import HttpResponse
-    
     tipo = request.GET.get('tipo', 'pedidos')
-    
-    response = HttpResponse(content_type='text/csv')
+    if tipo not in reportes_service.REPORTES:
+        raise Http404('Reporte desconocido')
+
+    # Se envía a medida que el cursor entrega filas: la memoria no crece con el reporte
+    response = StreamingHttpResponse(reportes_service.lineas_csv(tipo), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="reporte_{tipo}_{timezone.now().strftime("%Y%m%d")}.csv"'
-    
-    writer = csv.writer(response)
-    
-    if tipo == 'pedidos':
-        writer.writerow(['Número', 'Cliente', 'Total', 'Estado', 'Fecha'])
-        for pedido in Pedido.objects.all().order_by('-fecha_pedido'):
-            writer.writerow([
-                pedido.numero_pedido,
-                pedido.usuario.username,
-                pedido.total,
-                pedido.get_estado_display(),
-                pedido.fecha_pedido.strftime('%d/%m/%Y %H:%M')
-            ])
-    elif tipo == 'productos':
-        writer.writerow(['Nombre', 'Precio', 'Stock', 'Categoría', 'Disponible'])
-        for producto in Producto.objects.all():
-            writer.writerow([
-                producto.nombre,
-                producto.precio,
-                producto.stock,
-                producto.categoria.nombre if producto.categoria else 'N/A',
-                'Sí' if producto.disponible else 'No'
-            ])
-    elif tipo == 'clientes':
-        from django.contrib.auth.models import User
-        writer.writerow(['Username', 'Email', 'Fecha Registro', 'Total Pedidos'])
-        for user in User.objects.filter(is_staff=False):
-            writer.writerow([
-                user.username,
-                user.email,
-                user.date_joined.strftime('%d/%m/%Y'),
-                Pedido.objects.filter(usuario=user).count()
-            ])
-    
     return response
 
 
@@ -1374,15 +1444,21 @@ def solicitar_devolucion(request, pedido_id):
 # Vista de mis devoluciones (cliente)
 @login_required
 def mis_devoluciones(request):
-    devoluciones = Devolucion.objects.filter(usuario=request.user)
+    devoluciones = Devolucion.objects.filter(usuario=request.user).select_related('pedido')
     return render(request, 'mis_devoluciones.html', {'devoluciones': devoluciones})
 
 
 # Vista admin para gestionar devoluciones
 @staff_member_required
 def admin_devoluciones(request):
-    devoluciones = Devolucion.objects.all()
-    pendientes = devoluciones.filter(estado='pendiente').count()
+    devoluciones = paginacion_service.paginar_keyset(
+        Devolucion.objects.select_related('usuario', 'pedido'),
+        cursor=request.GET.get('cursor'),
+        por_pagina=50,
+        orden_fijo=('fecha_solicitud', True),
+    )
+    # COUNT sobre el índice (estado, fecha_solicitud, id)
+    pendientes = Devolucion.objects.filter(estado='pendiente').count()
     return render(request, 'admin/gestionar_devoluciones.html', {
         'devoluciones': devoluciones,
         'pendientes': pendientes
@@ -1392,9 +1468,10 @@ def admin_devoluciones(request):
 # Vista para aprobar/rechazar devolución (admin)
 @staff_member_required
 def gestionar_devolucion(request, devolucion_id):
-    devolucion = get_object_or_404(Devolucion, id=devolucion_id)
+    devolucion = get_object_or_404(Devolucion.objects.select_related('pedido'), id=devolucion_id)
     
     if request.method == 'POST':
+        reembolso_anterior = ventas_service.monto_reembolsable(devolucion)
         accion = request.POST.get('accion')
         respuesta = request.POST.get('respuesta', '')
         monto = request.POST.get('monto_reembolso')
@@ -1414,7 +1491,13 @@ def gestionar_devolucion(request, devolucion_id):
             devolucion.estado = 'completada'
             messages.success(request, f'✅ Devolución #{devolucion.id} completada')
         
-        devolucion.save()
+        with transaction.atomic():
+            devolucion.save()
+            # El resumen de ventas descuenta el reembolso (o lo corrige si cambió el monto)
+            ventas_service.registrar_reembolso(
+                devolucion.pedido, ventas_service.monto_reembolsable(devolucion) - reembolso_anterior
+            )
+        dashboard_service.invalidar()
         return redirect('admin_devoluciones')
     
     return render(request, 'admin/detalle_devolucion.html', {'devolucion': devolucion})